@@ -98,6 +98,93 @@ class ProjectSaveRequest(BaseModel):
     name: str
     files: List[ProjectFile]
     description: Optional[str] = None
+    # PUT only: reject with 409 unless the project is still at this version.
+    base_version: Optional[int] = None
+
+
+class ProjectFilesPatchRequest(BaseModel):
+    """Per-file changes; the write (and response) is proportional to the edit, not the project."""
+
+    base_version: Optional[int] = None
+    upsert: List[ProjectFile] = Field(default_factory=list)
+    delete: List[str] = Field(default_factory=list)
+
+
+class ProjectWriteResult(BaseModel):
+    id: str
+    version: int
+    file_count: int
+    total_bytes: int
+    updated_at: str
+
+
+class ProjectManifestFile(BaseModel):
+    path: str
+    hash: str  # SHA-256 of the content; also the file's ETag
+    size: int
+
+
+class ProjectManifest(BaseModel):
+    id: str
+    version: int
+    files: List[ProjectManifestFile]
+
+
+class ProjectSearchHit(BaseModel):
+    project_id: str
+    project_name: Optional[str] = None
+    path: str
+    line: int  # 1-based
+    column: int  # 1-based
+    snippet: str
+
+
+class ProjectSearchResponse(BaseModel):
+    query: str
+    results: List[ProjectSearchHit]
+    files_searched: int
+    truncated: bool
+
+
+class ProjectVersionInfo(BaseModel):
+    version: int
+    file_count: int
+    total_bytes: int
+    created_at: str
+
+
+class ProjectVersionListResponse(BaseModel):
+    versions: List[ProjectVersionInfo]
+
+
+class ProjectVersionFiles(BaseModel):
+    version: int
+    files: List[ProjectFile]
+
+
+class ProjectFileChange(BaseModel):
+    path: str
+    status: str  # "added" | "removed" | "modified"
+    old_size: Optional[int] = None
+    new_size: Optional[int] = None
+    # Only with ?content=true.
+    old_content: Optional[str] = None
+    new_content: Optional[str] = None
+
+
+class ProjectVersionDiff(BaseModel):
+    from_version: int
+    to_version: int
+    changes: List[ProjectFileChange]
+
+
+class ProjectRestoreRequest(BaseModel):
+    base_version: Optional[int] = None
+
+
+class ProjectForkRequest(BaseModel):
+    # Defaults to "<name> (v<version>)".
+    name: Optional[str] = None
 
 
 class ProjectUpdateRequest(BaseModel):
@@ -110,9 +197,22 @@ class ProjectInfo(BaseModel):
     name: str
     description: Optional[str] = None
     files: List[ProjectFile]
+    version: int = 1
+    created_at: str
+    updated_at: str
+
+
+class ProjectSummary(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    file_count: int
+    total_bytes: int
     created_at: str
     updated_at: str
 
 
 class ProjectListResponse(BaseModel):
-    projects: List[ProjectInfo]
+    projects: List[ProjectSummary]
+    # Pass back as ?cursor= for the next page; None on the last page.
+    next_cursor: Optional[str] = None
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import hmac
 import io
 import re
+import time
 import zipfile
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
-from fastapi.responses import StreamingResponse
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.api.models import (
     AIChatRequest,
@@ -15,10 +20,22 @@ from app.api.models import (
     AuthMeResponse,
     AuthRegisterRequest,
     ProjectFile,
+    ProjectFileChange,
+    ProjectFilesPatchRequest,
+    ProjectForkRequest,
     ProjectInfo,
     ProjectListResponse,
+    ProjectManifest,
+    ProjectSearchResponse,
     ProjectSaveRequest,
+    ProjectSummary,
+    ProjectRestoreRequest,
     ProjectUpdateRequest,
+    ProjectVersionDiff,
+    ProjectVersionFiles,
+    ProjectVersionInfo,
+    ProjectVersionListResponse,
+    ProjectWriteResult,
     RobloxGenerateRequest,
     RobloxGenerateResponse,
     RobloxRegenerateRequest,
@@ -26,22 +43,40 @@ from app.api.models import (
     UserPublic,
 )
 from app.database.database import (
-    authenticate_user,
     create_or_get_google_user,
     create_session,
     create_user,
     delete_session,
     get_db,
     get_project,
+    get_project_stored,
+    get_project_manifest,
+    search_projects,
+    get_project_file_ref,
+    get_blob_stored,
+    get_password_login,
     get_session,
-    list_projects,
+    list_project_summaries,
     update_project,
     delete_project,
+    diff_project_versions,
+    fork_project_version,
+    get_project_version,
+    list_project_versions,
+    patch_project_files,
+    restore_project_version,
+    storage_stats,
+    stored_text,
     replace_project,
     save_project,
     get_user_by_email,
     get_user_by_id,
+    import_projects,
+    iter_projects,
+    VersionConflict,
 )
+from app.services import code_search, google_oauth, json_body, project_transfer
+from app.services.auth_cache import auth_cache, last_seen_writer, revocations
 from app.services.fallback_templates import (
     coin_collector_pack,
     obby_pack,
@@ -52,18 +87,38 @@ from app.services.fallback_templates import (
 from app.services.openai_service import chat as ai_chat
 from app.services.openai_service import chat_stream as ai_chat_stream
 from app.services.openai_service import generate_json
+from app.services.password_pool import PasswordPoolBusy, password_pool
+from app.services.profiler import ProfilerBusy, collapsed, sample_stacks
 from app.services.repo_templates import seasonal_collector_pack
+from app.services.security import sign_token, verify_token
 from app.services.session_store import session_store
 from app.services.studio_plugin import generate_import_plugin_rbxmx
+from app.services.tracing import span, traced
 from app.settings import settings
 
 router = APIRouter()
 
 
-def _set_session_cookie(response: Response, sid: str) -> None:
+_SESSION_TOKEN_PURPOSE = "session"
+
+
+def _set_session_cookie(response: Response, sess: Dict[str, Any], user: Dict[str, Any]) -> None:
+    value = str(sess["id"])
+    if settings.auth_session_mode == "signed":
+        # The auth_sessions row still exists (logout/revocation); the cookie just
+        # carries enough to authenticate without reading it.
+        claims = {
+            "sid": value,
+            "uid": str(user["id"]),
+            "iat": int(time.time()),
+            "email": user.get("email"),
+            "name": user.get("name"),
+            "avatar_url": user.get("avatar_url"),
+        }
+        value = sign_token(_SESSION_TOKEN_PURPOSE, claims, settings.auth_session_ttl_seconds)
     response.set_cookie(
         key=settings.auth_cookie_name,
-        value=sid,
+        value=value,
         httponly=True,
         secure=bool(settings.auth_cookie_secure),
         samesite=str(settings.auth_cookie_samesite).lower(),
@@ -76,29 +131,125 @@ def _clear_session_cookie(response: Response) -> None:
     response.delete_cookie(key=settings.auth_cookie_name, path="/")
 
 
-def get_current_user(request: Request, db=Depends(get_db)) -> Dict[str, Any]:
-    sid = request.cookies.get(settings.auth_cookie_name) or ""
+def _session_id(cookie: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """(auth session id, signed claims or None) for a session cookie of either mode."""
+    if "." not in cookie:  # opaque ids are token_urlsafe, which never contains "."
+        return cookie, None
+    claims = verify_token(cookie, _SESSION_TOKEN_PURPOSE)
+    if claims is None:
+        return cookie, None
+    return str(claims.get("sid") or ""), claims
+
+
+def _resolve_user(db, cookie: str) -> Optional[Dict[str, Any]]:
+    """Session cookie -> user: fresh signed claims, then the per-worker auth cache, then the DB."""
+    sid, claims = _session_id(cookie)
+    if claims is not None and settings.auth_session_mode == "signed":
+        if revocations.is_revoked(sid):
+            return None
+        # The profile in the cookie is trusted only while fresh; older cookies take the
+        # cached DB path below, which also picks up profile changes and deleted users.
+        if time.time() - int(claims.get("iat") or 0) < settings.auth_claims_max_age_seconds:
+            last_seen_writer.touch(sid)
+            return {
+                "id": str(claims.get("uid")),
+                "email": claims.get("email"),
+                "name": claims.get("name"),
+                "avatar_url": claims.get("avatar_url"),
+            }
+    user = auth_cache.get(sid)
+    if user is not None:
+        last_seen_writer.touch(sid)
+        return user
     sess = get_session(db=db, sid=sid)
     if not sess:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        return None
     user = get_user_by_id(db=db, user_id=str(sess.get("user_id")))
     if not user:
         delete_session(db=db, sid=sid)
+        return None
+    auth_cache.put(sid, user, sess.get("expires_at"))
+    return user
+
+
+def get_current_user(request: Request, db=Depends(get_db)) -> Dict[str, Any]:
+    cookie = request.cookies.get(settings.auth_cookie_name) or ""
+    with span("auth"):
+        user = _resolve_user(db, cookie)
+    if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     return user
 
 
+_PLUGIN_TOKEN_PURPOSE = "plugin"
+
+
+def require_session_access(
+    session_id: str, request: Request, token: Optional[str] = None, db=Depends(get_db)
+) -> None:
+    """Allow a signed plugin capability (`?token=`) for this session, else a logged-in user.
+
+    The token path is a constant-time HMAC check with no database access, so Studio
+    polling stays cheap. The DB session from get_db is only used on the cookie path.
+    """
+    if token:
+        claims = verify_token(token, _PLUGIN_TOKEN_PURPOSE)
+        if claims is None or claims.get("sid") != session_id:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired plugin token")
+        return
+    get_current_user(request, db)
+
+
+def require_admin(request: Request) -> None:
+    """Admin/debug endpoints need ADMIN_TOKEN as a bearer token; without one they are not served.
+
+    Not tied to an account: registration does not prove email ownership, so an
+    email allowlist could be claimed by whoever signs up with the address first.
+    """
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    auth = request.headers.get("authorization") or ""
+    if not hmac.compare_digest(auth, f"Bearer {settings.admin_token}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else ""
+
+
+async def _run_password_job(job) -> Any:
+    """Await a password_pool job, mapping admission refusals to 503/429."""
+    try:
+        with span("password_hash"):
+            return await job
+    except PasswordPoolBusy as e:
+        if e.reason == "queue_full":
+            raise HTTPException(
+                status_code=503, detail="Too many sign-ins right now, retry shortly", headers={"Retry-After": "1"}
+            )
+        raise HTTPException(status_code=429, detail="Too many concurrent attempts", headers={"Retry-After": "1"})
+
+
 @router.post("/api/auth/register", response_model=AuthMeResponse)
-def auth_register(req: AuthRegisterRequest, response: Response, db=Depends(get_db)) -> AuthMeResponse:
+async def auth_register(
+    req: AuthRegisterRequest, request: Request, response: Response, db=Depends(get_db)
+) -> AuthMeResponse:
+    # Async so PBKDF2 waits on the password pool without holding a request thread;
+    # DB calls still run on the thread pool.
     email = (req.email or "").strip().lower()
     if not email or "@" not in email:
         raise HTTPException(status_code=400, detail="Invalid email")
-    existing = get_user_by_email(db=db, email=email)
+    if not req.password:
+        raise HTTPException(status_code=400, detail="Password required")
+    existing = await run_in_threadpool(get_user_by_email, db=db, email=email)
     if existing:
         raise HTTPException(status_code=409, detail="Email already registered")
-    user = create_user(db=db, email=email, password=req.password, name=req.name)
-    sess = create_session(db=db, user_id=str(user["id"]), ttl_seconds=settings.auth_session_ttl_seconds)
-    _set_session_cookie(response, sess["id"])
+    password_hash = await _run_password_job(password_pool.hash(req.password, ip=_client_ip(request), email=email))
+    user = await run_in_threadpool(create_user, db=db, email=email, name=req.name, password_hash=password_hash)
+    sess = await run_in_threadpool(
+        create_session, db=db, user_id=str(user["id"]), ttl_seconds=settings.auth_session_ttl_seconds
+    )
+    _set_session_cookie(response, sess, user)
     return AuthMeResponse(
         authenticated=True,
         user=UserPublic(
@@ -111,12 +262,23 @@ def auth_register(req: AuthRegisterRequest, response: Response, db=Depends(get_d
 
 
 @router.post("/api/auth/login", response_model=AuthMeResponse)
-def auth_login(req: AuthLoginRequest, response: Response, db=Depends(get_db)) -> AuthMeResponse:
-    user = authenticate_user(db=db, email=req.email, password=req.password)
-    if not user:
+async def auth_login(
+    req: AuthLoginRequest, request: Request, response: Response, db=Depends(get_db)
+) -> AuthMeResponse:
+    email = (req.email or "").strip().lower()
+    found = await run_in_threadpool(get_password_login, db=db, email=email)
+    ok = False
+    if found:
+        ok = await _run_password_job(
+            password_pool.verify(req.password, found[1], ip=_client_ip(request), email=email)
+        )
+    if not ok:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
-    sess = create_session(db=db, user_id=str(user["id"]), ttl_seconds=settings.auth_session_ttl_seconds)
-    _set_session_cookie(response, sess["id"])
+    user = found[0]
+    sess = await run_in_threadpool(
+        create_session, db=db, user_id=str(user["id"]), ttl_seconds=settings.auth_session_ttl_seconds
+    )
+    _set_session_cookie(response, sess, user)
     return AuthMeResponse(
         authenticated=True,
         user=UserPublic(
@@ -130,7 +292,7 @@ def auth_login(req: AuthLoginRequest, response: Response, db=Depends(get_db)) ->
 
 @router.post("/api/auth/logout")
 def auth_logout(request: Request, response: Response, db=Depends(get_db)):
-    sid = request.cookies.get(settings.auth_cookie_name) or ""
+    sid, _ = _session_id(request.cookies.get(settings.auth_cookie_name) or "")
     delete_session(db=db, sid=sid)
     _clear_session_cookie(response)
     return {"ok": True}
@@ -138,13 +300,10 @@ def auth_logout(request: Request, response: Response, db=Depends(get_db)):
 
 @router.get("/api/auth/me", response_model=AuthMeResponse)
 def auth_me(request: Request, db=Depends(get_db)) -> AuthMeResponse:
-    sid = request.cookies.get(settings.auth_cookie_name) or ""
-    sess = get_session(db=db, sid=sid)
-    if not sess:
-        return AuthMeResponse(authenticated=False, user=None)
-    user = get_user_by_id(db=db, user_id=str(sess.get("user_id")))
+    cookie = request.cookies.get(settings.auth_cookie_name) or ""
+    with span("auth"):
+        user = _resolve_user(db, cookie)
     if not user:
-        delete_session(db=db, sid=sid)
         return AuthMeResponse(authenticated=False, user=None)
     return AuthMeResponse(
         authenticated=True,
@@ -177,12 +336,12 @@ def auth_google_initiate(request: Request):
         "prompt": "select_account",
     }
     
-    auth_url = f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(params)}"
+    auth_url = f"{settings.google_auth_url}?{urlencode(params)}"
     return {"auth_url": auth_url}
 
 
 @router.get("/api/auth/google/callback")
-def auth_google_callback(
+async def auth_google_callback(
     request: Request,
     response: Response,
     code: Optional[str] = None,
@@ -207,60 +366,34 @@ def auth_google_callback(
         raise HTTPException(status_code=503, detail="Google OAuth not configured")
     
     try:
-        import httpx
-        
         redirect_uri = settings.google_redirect_uri or f"{request.base_url}api/auth/google/callback"
         
-        # Exchange code for token
-        token_response = httpx.post(
-            "https://oauth2.googleapis.com/token",
-            data={
-                "code": code,
-                "client_id": settings.google_client_id,
-                "client_secret": settings.google_client_secret,
-                "redirect_uri": redirect_uri,
-                "grant_type": "authorization_code",
-            },
-            timeout=10.0,
-        )
-        token_response.raise_for_status()
-        token_data = token_response.json()
-        access_token = token_data.get("access_token")
-        # id_token is a JWT (identity token), not usable for the userinfo endpoint.
-        # Keep it available for future verification if needed.
-        _id_token = token_data.get("id_token")
-        
-        if not access_token:
-            raise HTTPException(status_code=400, detail="No access_token received from Google")
-        
-        # Get user info from Google
-        userinfo_response = httpx.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=10.0,
-        )
-        userinfo_response.raise_for_status()
-        google_user = userinfo_response.json()
+        # One token exchange on the shared client; identity comes from the verified id_token.
+        with span("google.identify"):
+            claims = await google_oauth.identify(code, redirect_uri)
         
-        google_id = google_user.get("id")
-        email = google_user.get("email", "").lower().strip()
-        name = google_user.get("name")
-        avatar_url = google_user.get("picture")
+        google_id = claims.get("sub")
+        email = (claims.get("email") or "").lower().strip()
+        name = claims.get("name")
+        avatar_url = claims.get("picture")
         
         if not google_id or not email:
             raise HTTPException(status_code=400, detail="Invalid user data from Google")
         
         # Create or get user
-        user = create_or_get_google_user(
+        user = await run_in_threadpool(
+            create_or_get_google_user,
             db=db,
-            google_id=google_id,
+            google_id=str(google_id),
             email=email,
             name=name,
             avatar_url=avatar_url,
         )
         
         # Create session
-        sess = create_session(db=db, user_id=str(user["id"]), ttl_seconds=settings.auth_session_ttl_seconds)
+        sess = await run_in_threadpool(
+            create_session, db=db, user_id=str(user["id"]), ttl_seconds=settings.auth_session_ttl_seconds
+        )
         # Redirect to frontend (cookie must be set on the *returned* response)
         frontend_url = settings.frontend_url
         if not frontend_url:
@@ -269,11 +402,15 @@ def auth_google_callback(
         frontend_url = frontend_url.rstrip("/")
         from fastapi.responses import RedirectResponse
         redirect = RedirectResponse(url=f"{frontend_url}/?auth_success=true", status_code=302)
-        _set_session_cookie(redirect, sess["id"])
+        _set_session_cookie(redirect, sess, user)
         return redirect
         
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=400, detail=f"Google OAuth error: {e.response.text}")
+    except HTTPException:
+        raise
+    except google_oauth.GoogleAuthError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Google OAuth unavailable: {type(e).__name__}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OAuth callback error: {str(e)}")
 
@@ -301,6 +438,7 @@ def save_project_endpoint(
         name=proj["name"],
         description=proj.get("description"),
         files=[ProjectFile(path=f["path"], content=f["content"]) for f in proj.get("files", [])],
+        version=proj.get("version", 1),
         created_at=proj["created_at"],
         updated_at=proj["updated_at"],
     )
@@ -308,44 +446,184 @@ def save_project_endpoint(
 
 @router.get("/api/projects", response_model=ProjectListResponse)
 def list_projects_endpoint(
+    limit: int = 50,
+    cursor: Optional[str] = None,
     user: Dict[str, Any] = Depends(get_current_user),
     db=Depends(get_db),
 ) -> ProjectListResponse:
-    """List all projects for the current user."""
-    projects = list_projects(db=db, user_id=str(user["id"]), limit=100)
-    return ProjectListResponse(
-        projects=[
-            ProjectInfo(
-                id=p["id"],
-                name=p["name"],
-                description=p.get("description"),
-                files=[ProjectFile(path=f["path"], content=f["content"]) for f in p.get("files", [])],
-                created_at=p["created_at"],
-                updated_at=p["updated_at"],
-            )
-            for p in projects
-        ]
+    """List the current user's projects (metadata only; open one to load its files)."""
+    if not (1 <= limit <= 100):
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    try:
+        projects, next_cursor = list_project_summaries(db=db, user_id=str(user["id"]), limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return ProjectListResponse(projects=[ProjectSummary(**p) for p in projects], next_cursor=next_cursor)
+
+
+# search and export are declared before /api/projects/{project_id} so neither is taken for an id.
+@router.get("/api/projects/search", response_model=ProjectSearchResponse)
+def search_projects_endpoint(
+    q: str,
+    regex: Optional[str] = None,
+    case_sensitive: bool = False,
+    project_id: Optional[str] = None,
+    limit: int = 100,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> ProjectSearchResponse:
+    """Find `q` in the files of all the current user's projects (or one, with project_id).
+
+    Matching is case-insensitive unless case_sensitive. With `regex`, only lines
+    that also match it are returned (and the column is where it matches): the
+    index finds files by `q`, the pattern then filters that candidate set.
+    """
+    try:
+        pattern = code_search.compile_filter(q, regex=regex, case_sensitive=case_sensitive)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+    if len(q) < code_search.MIN_QUERY_CHARS:
+        raise HTTPException(status_code=400, detail=f"q must be at least {code_search.MIN_QUERY_CHARS} characters")
+    if not (1 <= limit <= 500):
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    found = search_projects(
+        db=db,
+        user_id=str(user["id"]),
+        query=q,
+        pattern=pattern,
+        case_sensitive=case_sensitive,
+        project_id=project_id,
+        limit=limit,
+    )
+    return ProjectSearchResponse(query=q, **found)
+
+
+@router.get("/api/projects/export")
+def export_projects_endpoint(format: str = "ndjson", user: Dict[str, Any] = Depends(get_current_user)):
+    """All of the current user's projects with their files, streamed as NDJSON (one per line) or a zip."""
+    if format not in ("ndjson", "zip"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'zip'")
+    projects = (proj for _, proj in iter_projects(user_id=str(user["id"])))
+    stamp = time.strftime("%Y%m%d")
+    if format == "zip":
+        return StreamingResponse(
+            project_transfer.zip_chunks(projects),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="projects-{stamp}.zip"'},
+        )
+    return StreamingResponse(
+        project_transfer.ndjson_chunks(projects),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="projects-{stamp}.ndjson"'},
     )
 
 
+@router.post("/api/projects/import")
+async def import_projects_endpoint(
+    request: Request,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+):
+    """Create projects from an NDJSON export in the request body (new ids, same names/files/timestamps).
+
+    The body is parsed as it arrives and inserted in batches of IMPORT_BATCH,
+    so uploads of any size run in bounded memory. Batches already inserted
+    stay if a later line is malformed; the 400 says how many.
+    """
+    user_id = str(user["id"])
+    imported = 0
+    lineno = 0
+    batch: List[Dict[str, Any]] = []
+    try:
+        async for line in project_transfer.ndjson_lines(request.stream()):
+            lineno += 1
+            batch.append(project_transfer.parse_project(line))
+            if len(batch) >= project_transfer.IMPORT_BATCH:
+                imported += len(await run_in_threadpool(import_projects, db=db, user_id=user_id, projects=batch))
+                batch = []
+        if batch:
+            imported += len(await run_in_threadpool(import_projects, db=db, user_id=user_id, projects=batch))
+    except project_transfer.LineTooLong as e:
+        raise HTTPException(status_code=413, detail={"message": f"line {lineno + 1}: {e}", "imported": imported})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"message": f"line {lineno}: {e}", "imported": imported})
+    return {"imported": imported}
+
+
 @router.get("/api/projects/{project_id}", response_model=ProjectInfo)
 def get_project_endpoint(
     project_id: str,
     user: Dict[str, Any] = Depends(get_current_user),
     db=Depends(get_db),
-) -> ProjectInfo:
+) -> Response:
     """Get a project by ID (must belong to current user)."""
-    proj = get_project(db=db, project_id=project_id, user_id=str(user["id"]))
-    if not proj:
+    stored = get_project_stored(db=db, project_id=project_id, user_id=str(user["id"]))
+    if not stored:
         raise HTTPException(status_code=404, detail="Project not found")
-    return ProjectInfo(
-        id=proj["id"],
-        name=proj["name"],
-        description=proj.get("description"),
-        files=[ProjectFile(path=f["path"], content=f["content"]) for f in proj.get("files", [])],
-        created_at=proj["created_at"],
-        updated_at=proj["updated_at"],
-    )
+    return _files_response(*stored)
+
+
+@router.get("/api/projects/{project_id}/manifest", response_model=ProjectManifest)
+def get_project_manifest_endpoint(
+    project_id: str,
+    request: Request,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> Response:
+    """Paths, sizes and content hashes of a project's files, without their contents.
+
+    The ETag is the project version, which every file write bumps, so a client
+    can revalidate its copy with If-None-Match and get a 304 when nothing changed.
+    """
+    manifest = get_project_manifest(db=db, project_id=project_id, user_id=str(user["id"]))
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    version, files = manifest
+    etag = '"%s.%s"' % (project_id, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"id": project_id, "version": version, "files": files}, headers=headers)
+
+
+@router.get("/api/projects/{project_id}/files/{path:path}", response_class=PlainTextResponse)
+def get_project_file_endpoint(
+    project_id: str,
+    path: str,
+    request: Request,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> Response:
+    """Raw content of one project file; its ETag is the content hash from the manifest.
+
+    A matching If-None-Match is answered with 304 before the content is read.
+    """
+    ref = get_project_file_ref(db=db, project_id=project_id, user_id=str(user["id"]), path=path)
+    if ref is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    etag = f'"{ref["hash"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    blob = get_blob_stored(db=db, content_hash=ref["hash"])
+    if blob is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    body = stored_text(*blob).encode("utf-8")
+    return Response(content=body, media_type="text/plain; charset=utf-8", headers=headers)
+
+
+def _files_body(head: Dict[str, Any], files: List[Any]) -> Iterator[bytes]:
+    """JSON of `head` plus "files": [{"path", "content"}], straight from stored (path, codec, payload).
+
+    Same JSON as the response_model would produce, minus the intermediate dicts
+    and pydantic models: each file is decoded and encoded only as it is sent.
+    """
+    items = ({"path": path, "content": stored_text(codec, payload)} for path, codec, payload in files)
+    return json_body.object_with_array(head, "files", items)
+
+
+def _files_response(head: Dict[str, Any], files: List[Any]) -> StreamingResponse:
+    return StreamingResponse(_files_body(head, files), media_type="application/json")
 
 
 @router.patch("/api/projects/{project_id}", response_model=ProjectInfo)
@@ -372,6 +650,7 @@ def update_project_endpoint(
         name=proj["name"],
         description=proj.get("description"),
         files=[ProjectFile(path=f["path"], content=f["content"]) for f in proj.get("files", [])],
+        version=proj.get("version", 1),
         created_at=proj["created_at"],
         updated_at=proj["updated_at"],
     )
@@ -386,26 +665,66 @@ def replace_project_endpoint(
 ) -> ProjectInfo:
     """Replace project files + metadata (must belong to current user)."""
     files_data = [{"path": f.path, "content": f.content} for f in req.files]
-    proj = replace_project(
-        db=db,
-        project_id=project_id,
-        user_id=str(user["id"]),
+    try:
+        res = replace_project(
+            db=db,
+            project_id=project_id,
+            user_id=str(user["id"]),
+            name=req.name,
+            description=req.description,
+            files=files_data,
+            base_version=req.base_version,
+        )
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    if not res:
+        raise HTTPException(status_code=404, detail="Project not found")
+    # The stored files are exactly the request's; no need to read them back.
+    return ProjectInfo(
+        id=res["id"],
         name=req.name,
         description=req.description,
-        files=files_data,
+        files=sorted(req.files, key=lambda f: f.path),
+        version=res["version"],
+        created_at=res["created_at"],
+        updated_at=res["updated_at"],
     )
-    if not proj:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return ProjectInfo(
-        id=proj["id"],
-        name=proj["name"],
-        description=proj.get("description"),
-        files=[ProjectFile(path=f["path"], content=f["content"]) for f in proj.get("files", [])],
-        created_at=proj["created_at"],
-        updated_at=proj["updated_at"],
+
+
+def _version_conflict(e: VersionConflict) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Project was modified since base_version", "current_version": e.current_version},
     )
 
 
+@router.patch("/api/projects/{project_id}/files", response_model=ProjectWriteResult)
+def patch_project_files_endpoint(
+    project_id: str,
+    req: ProjectFilesPatchRequest,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> ProjectWriteResult:
+    """Create/overwrite and delete individual files; only those files are written."""
+    upserts = {f.path: f.content for f in req.upsert}
+    if len(upserts) != len(req.upsert) or set(upserts) & set(req.delete):
+        raise HTTPException(status_code=400, detail="Each path may appear only once across upsert/delete")
+    try:
+        res = patch_project_files(
+            db=db,
+            project_id=project_id,
+            user_id=str(user["id"]),
+            upserts=upserts,
+            deletes=list(dict.fromkeys(req.delete)),
+            base_version=req.base_version,
+        )
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    if not res:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return ProjectWriteResult(**{k: res[k] for k in ProjectWriteResult.model_fields})
+
+
 @router.delete("/api/projects/{project_id}")
 def delete_project_endpoint(
     project_id: str,
@@ -419,6 +738,138 @@ def delete_project_endpoint(
     return {"ok": True}
 
 
+@router.get("/api/projects/{project_id}/versions", response_model=ProjectVersionListResponse)
+def list_project_versions_endpoint(
+    project_id: str,
+    limit: int = 50,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> ProjectVersionListResponse:
+    """Saved versions of a project, newest first (one per save)."""
+    if not (1 <= limit <= 500):
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    versions = list_project_versions(db=db, project_id=project_id, user_id=str(user["id"]), limit=limit)
+    if versions is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return ProjectVersionListResponse(versions=[ProjectVersionInfo(**v) for v in versions])
+
+
+# Declared before /versions/{version} so "diff" is not parsed as a version number.
+@router.get("/api/projects/{project_id}/versions/diff", response_model=ProjectVersionDiff)
+def diff_project_versions_endpoint(
+    project_id: str,
+    from_version: int = Query(..., alias="from"),
+    to_version: int = Query(..., alias="to"),
+    content: bool = False,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> ProjectVersionDiff:
+    """Files added/removed/modified between two versions (?content=true includes both sides)."""
+    changes = diff_project_versions(
+        db=db,
+        project_id=project_id,
+        user_id=str(user["id"]),
+        from_version=from_version,
+        to_version=to_version,
+        include_content=content,
+    )
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return ProjectVersionDiff(
+        from_version=from_version, to_version=to_version, changes=[ProjectFileChange(**c) for c in changes]
+    )
+
+
+@router.get("/api/projects/{project_id}/versions/{version}", response_model=ProjectVersionFiles)
+def get_project_version_endpoint(
+    project_id: str,
+    version: int,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> Response:
+    """The files of a saved version."""
+    files = get_project_version(db=db, project_id=project_id, user_id=str(user["id"]), version=version)
+    if files is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return _files_response({"version": version}, files)
+
+
+@router.post("/api/projects/{project_id}/versions/{version}/restore", response_model=ProjectWriteResult)
+def restore_project_version_endpoint(
+    project_id: str,
+    version: int,
+    req: Optional[ProjectRestoreRequest] = None,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> ProjectWriteResult:
+    """Make a saved version current again. Recorded as a new version, so it can be undone too."""
+    try:
+        res = restore_project_version(
+            db=db,
+            project_id=project_id,
+            user_id=str(user["id"]),
+            version=version,
+            base_version=req.base_version if req else None,
+        )
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    if not res:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return ProjectWriteResult(**{k: res[k] for k in ProjectWriteResult.model_fields})
+
+
+@router.post("/api/projects/{project_id}/versions/{version}/fork", response_model=ProjectWriteResult)
+def fork_project_version_endpoint(
+    project_id: str,
+    version: int,
+    req: Optional[ProjectForkRequest] = None,
+    user: Dict[str, Any] = Depends(get_current_user),
+    db=Depends(get_db),
+) -> ProjectWriteResult:
+    """Start a new project from a saved version (no file content is copied)."""
+    res = fork_project_version(
+        db=db, project_id=project_id, user_id=str(user["id"]), version=version, name=req.name if req else None
+    )
+    if not res:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return ProjectWriteResult(**{k: res[k] for k in ProjectWriteResult.model_fields})
+
+
+@router.get("/debug/profile", response_class=PlainTextResponse)
+def debug_profile(
+    seconds: float = 10.0,
+    hz: float = 100.0,
+    idle: bool = False,
+    lines: bool = False,
+    _: None = Depends(require_admin),
+):
+    """Sample all worker threads and return collapsed stacks (flamegraph.pl / speedscope input)."""
+    if not (0 < seconds <= 60):
+        raise HTTPException(status_code=400, detail="seconds must be in (0, 60]")
+    try:
+        counts, rounds = sample_stacks(seconds, hz=hz, include_idle=idle, with_lines=lines)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return PlainTextResponse(
+        collapsed(counts),
+        headers={
+            "X-Profile-Rounds": str(rounds),
+            "X-Profile-Samples": str(sum(counts.values())),
+            "Content-Disposition": 'inline; filename="profile.folded"',
+        },
+    )
+
+
+@router.get("/debug/storage")
+def debug_storage(_: None = Depends(require_admin), db=Depends(get_db)):
+    """Stored project file content by codec, with compression ratios.
+
+    Per-process totals for everything encoded since startup (project files and
+    session store) are in /metrics as storage_codec_bytes_total.
+    """
+    return {"project_blobs": storage_stats(db=db)}
+
+
 @router.get("/api/ai/status")
 def ai_status():
     return {
@@ -730,6 +1181,7 @@ CRITICAL ROBLOX CODE RULES (MUST FOLLOW):
 """
 
 
+@traced("fallback_build")
 def _pick_template_pack(template: str, prompt: str) -> Dict[str, Any]:
     template = (template or "").strip().lower()
     prompt_lower = (prompt or "").strip().lower()
@@ -784,6 +1236,7 @@ def _normalize_zip_path(path: str) -> str:
     return p
 
 
+@traced("zip")
 def _zip_bytes(title: str, files: List[Dict[str, str]]) -> Tuple[str, bytes]:
     buf = io.BytesIO()
     with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
@@ -796,6 +1249,7 @@ def _zip_bytes(title: str, files: List[Dict[str, str]]) -> Tuple[str, bytes]:
     return _safe_zip_filename(title), buf.getvalue()
 
 
+@traced("compact")
 def _compact_base_files(files: List[Dict[str, str]], change_request: str) -> List[Dict[str, str]]:
     """Reduce context sent to the model so regen works on big packs."""
     if not files:
@@ -838,6 +1292,7 @@ def _compact_base_files(files: List[Dict[str, str]], change_request: str) -> Lis
     return out
 
 
+@traced("validate")
 def _looks_like_broken_studio_pack(files: List[Dict[str, str]]) -> bool:
     """Heuristics to detect common Roblox client/server placement mistakes.
 
@@ -967,6 +1422,8 @@ def _repair_pack_once(*, prompt: str, template: str, reason: str, candidate: Dic
         system_prompt=_REPAIR_SYSTEM_PROMPT,
         temperature=0.1,
         max_tokens=1600,
+        route="repair",
+        template=template,
         extra_context={
             "template": template,
             "original_prompt": prompt,
@@ -1030,6 +1487,8 @@ def roblox_generate(req: RobloxGenerateRequest, user: Dict[str, Any] = Depends(g
             temperature=float(req.temperature),
             max_tokens=int(req.max_tokens),
             extra_context={"template": ai_template},  # None/empty = let AI analyze naturally
+            route="generate",
+            template=template,
         )
 
         # Minimal validation + merge safety notes
@@ -1107,6 +1566,8 @@ def roblox_generate(req: RobloxGenerateRequest, user: Dict[str, Any] = Depends(g
                             temperature=0.15,
                             max_tokens=max(1400, int(req.max_tokens)),
                             extra_context={"template": template, "retry": "mvp_regen_from_scratch"},
+                            route="mvp_retry",
+                            template=template,
                         )
                         files3 = retry.get("files")
                         if isinstance(files3, list):
@@ -1150,6 +1611,8 @@ def roblox_generate(req: RobloxGenerateRequest, user: Dict[str, Any] = Depends(g
                             temperature=0.15,
                             max_tokens=max(1400, int(req.max_tokens)),
                             extra_context={"template": template, "retry": "mvp_regen_from_scratch"},
+                            route="mvp_retry",
+                            template=template,
                         )
                         files3 = retry.get("files")
                         if isinstance(files3, list):
@@ -1323,6 +1786,8 @@ def roblox_regenerate(req: RobloxRegenerateRequest, user: Dict[str, Any] = Depen
             temperature=float(req.temperature),
             max_tokens=int(req.max_tokens),
             extra_context=context,
+            route="regenerate",
+            template=req.template,
         )
 
         title = str(data.get("title") or base_title or fallback["title"])
@@ -1398,7 +1863,8 @@ def roblox_regenerate(req: RobloxRegenerateRequest, user: Dict[str, Any] = Depen
             setup_instructions=[str(x) for x in setup_instructions],
             notes=notes,
         )
-        sid = session_store.create(pack.model_dump())
+        # Only a successful regenerate advances the lineage the Studio plugin follows.
+        sid = session_store.create(pack.model_dump(), parent=req.session_id if base_pack_from_session else None)
         pack.session_id = sid
         return pack
     except HTTPException:
@@ -1431,12 +1897,93 @@ def roblox_generate_zip(req: RobloxGenerateRequest, user: Dict[str, Any] = Depen
     )
 
 
+def _accepts_gzip(request: Request) -> bool:
+    for token in (request.headers.get("accept-encoding") or "").lower().split(","):
+        name, _, params = token.strip().partition(";")
+        if name.strip() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
 @router.get("/api/roblox/sessions/{session_id}")
-def roblox_session_get(session_id: str, user: Dict[str, Any] = Depends(get_current_user)):
-    pack = session_store.get(session_id)
-    if not pack:
+def roblox_session_get(session_id: str, request: Request, _: None = Depends(require_session_access)):
+    # Served straight from the store's bytes; no dict round-trip through FastAPI's encoder.
+    gzipped = _accepts_gzip(request)
+    body = session_store.get_bytes(session_id, gzipped=gzipped)
+    if body is None:
         raise HTTPException(status_code=404, detail="session not found")
-    return pack
+    headers = {"Vary": "Accept-Encoding"}
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@router.get("/api/roblox/sessions/{session_id}/manifest")
+def roblox_session_manifest(session_id: str, request: Request, _: None = Depends(require_session_access)):
+    """Per-file content hashes for the newest version in this session's regenerate lineage."""
+    manifest = session_store.manifest(session_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="session not found")
+    etag = '"%s.%s"' % (manifest["session_id"], manifest["version"])
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(manifest, headers=headers)
+
+
+@router.get("/api/roblox/sessions/{session_id}/files/{digest}")
+def roblox_session_file(session_id: str, digest: str, request: Request, _: None = Depends(require_session_access)):
+    """Raw content of one file by its manifest hash. Content-addressed, so cacheable forever."""
+    manifest = session_store.manifest(session_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="session not found")
+    if not any(f["hash"] == digest for f in manifest["files"]):
+        raise HTTPException(status_code=404, detail="file not in session")
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    content = session_store.get_file(digest)
+    if content is None:
+        raise HTTPException(status_code=404, detail="file expired")
+    return Response(content=content.encode("utf-8"), media_type="text/plain; charset=utf-8", headers=headers)
+
+
+_WAIT_MAX_SECONDS = 30.0
+_WAIT_POLL_SECONDS = 1.0
+
+
+@router.get("/api/roblox/sessions/{session_id}/wait")
+async def roblox_session_wait(
+    session_id: str, version: int = 0, timeout: float = 25.0, _: None = Depends(require_session_access)
+):
+    """Long-poll until the lineage has a version newer than `version`; 204 on timeout.
+
+    Polls the shared store (any worker may have handled the regenerate) without
+    holding a threadpool thread while waiting.
+    """
+    deadline = time.monotonic() + max(0.0, min(timeout, _WAIT_MAX_SECONDS))
+    while True:
+        head = await run_in_threadpool(session_store.head, session_id)
+        if head is None:
+            raise HTTPException(status_code=404, detail="session not found")
+        if head[1] > version:
+            return {"session_id": head[0], "version": head[1]}
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return Response(status_code=204)
+        await asyncio.sleep(min(_WAIT_POLL_SECONDS, remaining))
 
 
 @router.get("/api/roblox/sessions/{session_id}/plugin.rbxmx")
@@ -1446,7 +1993,8 @@ def roblox_session_plugin(session_id: str, request: Request, user: Dict[str, Any
         raise HTTPException(status_code=404, detail="session not found")
 
     base_url = str(request.base_url).rstrip("/")
-    xml = generate_import_plugin_rbxmx(base_url=base_url, session_id=session_id)
+    token = sign_token(_PLUGIN_TOKEN_PURPOSE, {"sid": session_id}, settings.plugin_token_ttl_seconds)
+    xml = generate_import_plugin_rbxmx(base_url=base_url, session_id=session_id, token=token)
     filename = f"VibeCodingImporter_{session_id[:8]}.rbxmx"
     return StreamingResponse(
         io.BytesIO(xml.encode("utf-8")),
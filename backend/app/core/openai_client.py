@@ -7,6 +7,87 @@ import time
 import hashlib
 
 
+def _fix_control_characters_in_json(text: str) -> str:
+    """Fix unescaped control characters (newlines, tabs) in JSON string values."""
+    # This function finds JSON string values and escapes control characters inside them
+    result = []
+    i = 0
+    in_string = False
+    escape_next = False
+    
+    while i < len(text):
+        char = text[i]
+        
+        if escape_next:
+            # Skip escaped character (including \" which means we're still in string)
+            result.append(char)
+            escape_next = False
+            i += 1
+            continue
+        
+        if char == '\\':
+            # Next character is escaped
+            result.append(char)
+            escape_next = True
+            i += 1
+            continue
+        
+        if char == '"':
+            # Toggle string state
+            in_string = not in_string
+            result.append(char)
+            i += 1
+            continue
+        
+        if in_string:
+            # Inside a string - escape control characters
+            if char == '\n':
+                result.append('\\n')
+            elif char == '\r':
+                result.append('\\r')
+            elif char == '\t':
+                result.append('\\t')
+            elif ord(char) < 32:  # Other control characters
+                result.append(f'\\u{ord(char):04x}')
+            else:
+                result.append(char)
+        else:
+            # Outside string - pass through
+            result.append(char)
+        
+        i += 1
+    
+    return ''.join(result)
+
+
+def _clean_json_content(text: str) -> str:
+    """Clean and sanitize JSON content before parsing."""
+    # Remove markdown code blocks if present
+    text = text.strip()
+    
+    # Check for markdown code blocks with json
+    if "```json" in text:
+        # Extract content between ```json and ```
+        start = text.find("```json") + 7
+        end = text.find("```", start)
+        if end != -1:
+            text = text[start:end].strip()
+    elif "```" in text:
+        # Extract content between ``` and ```
+        start = text.find("```") + 3
+        end = text.find("```", start)
+        if end != -1:
+            text = text[start:end].strip()
+    
+    # Remove any leading/trailing backticks
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    
+    return text.strip()
+
+
 class OpenAIClient:
     def __init__(self):
         # Keep requests snappy (Roblox players feel latency immediately)
@@ -66,85 +147,6 @@ class OpenAIClient:
             
             content = response.choices[0].message.content
             
-            def fix_control_characters_in_json(text: str) -> str:
-                """Fix unescaped control characters (newlines, tabs) in JSON string values."""
-                # This function finds JSON string values and escapes control characters inside them
-                result = []
-                i = 0
-                in_string = False
-                escape_next = False
-                
-                while i < len(text):
-                    char = text[i]
-                    
-                    if escape_next:
-                        # Skip escaped character (including \" which means we're still in string)
-                        result.append(char)
-                        escape_next = False
-                        i += 1
-                        continue
-                    
-                    if char == '\\':
-                        # Next character is escaped
-                        result.append(char)
-                        escape_next = True
-                        i += 1
-                        continue
-                    
-                    if char == '"':
-                        # Toggle string state
-                        in_string = not in_string
-                        result.append(char)
-                        i += 1
-                        continue
-                    
-                    if in_string:
-                        # Inside a string - escape control characters
-                        if char == '\n':
-                            result.append('\\n')
-                        elif char == '\r':
-                            result.append('\\r')
-                        elif char == '\t':
-                            result.append('\\t')
-                        elif ord(char) < 32:  # Other control characters
-                            result.append(f'\\u{ord(char):04x}')
-                        else:
-                            result.append(char)
-                    else:
-                        # Outside string - pass through
-                        result.append(char)
-                    
-                    i += 1
-                
-                return ''.join(result)
-            
-            def clean_json_content(text: str) -> str:
-                """Clean and sanitize JSON content before parsing."""
-                # Remove markdown code blocks if present
-                text = text.strip()
-                
-                # Check for markdown code blocks with json
-                if "```json" in text:
-                    # Extract content between ```json and ```
-                    start = text.find("```json") + 7
-                    end = text.find("```", start)
-                    if end != -1:
-                        text = text[start:end].strip()
-                elif "```" in text:
-                    # Extract content between ``` and ```
-                    start = text.find("```") + 3
-                    end = text.find("```", start)
-                    if end != -1:
-                        text = text[start:end].strip()
-                
-                # Remove any leading/trailing backticks
-                if text.startswith("```"):
-                    text = text[3:]
-                if text.endswith("```"):
-                    text = text[:-3]
-                
-                return text.strip()
-            
             # Parse JSON from response
             # If response_format was used, content is already JSON
             # Otherwise, try to extract JSON from markdown code blocks or plain text
@@ -160,14 +162,14 @@ class OpenAIClient:
                         parse_error = e
                         # Try fixing control characters
                         try:
-                            fixed_content = fix_control_characters_in_json(content)
+                            fixed_content = _fix_control_characters_in_json(content)
                             result = json.loads(fixed_content)
                             parse_error = None
                         except json.JSONDecodeError as e2:
                             parse_error = e2
                             # If still failing, clean markdown and try again
-                            content_clean = clean_json_content(content)
-                            fixed_content = fix_control_characters_in_json(content_clean)
+                            content_clean = _clean_json_content(content)
+                            fixed_content = _fix_control_characters_in_json(content_clean)
                             try:
                                 result = json.loads(fixed_content)
                                 parse_error = None
@@ -175,7 +177,7 @@ class OpenAIClient:
                                 parse_error = e3
                 else:
                     # Try to parse JSON from response (might be wrapped in markdown)
-                    content_clean = clean_json_content(content)
+                    content_clean = _clean_json_content(content)
                     
                     try:
                         result = json.loads(content_clean)
@@ -183,7 +185,7 @@ class OpenAIClient:
                         parse_error = e
                         # Try fixing control characters
                         try:
-                            fixed_content = fix_control_characters_in_json(content_clean)
+                            fixed_content = _fix_control_characters_in_json(content_clean)
                             result = json.loads(fixed_content)
                             parse_error = None
                         except json.JSONDecodeError as e2:
@@ -204,7 +206,7 @@ class OpenAIClient:
                                     parse_error = e3
                                     # Last attempt: fix control characters in extracted JSON
                                     try:
-                                        fixed_json = fix_control_characters_in_json(json_str)
+                                        fixed_json = _fix_control_characters_in_json(json_str)
                                         result = json.loads(fixed_json)
                                         parse_error = None
                                     except json.JSONDecodeError as e4:
@@ -223,7 +225,7 @@ class OpenAIClient:
                                             parse_error = None
                                         except json.JSONDecodeError:
                                             try:
-                                                fixed_json = fix_control_characters_in_json(json_str)
+                                                fixed_json = _fix_control_characters_in_json(json_str)
                                                 result = json.loads(fixed_json)
                                                 parse_error = None
                                             except json.JSONDecodeError as e5:
@@ -721,7 +723,7 @@ CRITICAL: Code must WORK when pasted and Play is clicked:
   * Required services must be retrieved: local Lighting = game:GetService("Lighting"), local Players = game:GetService("Players"), local Workspace = game:GetService("Workspace"), etc.
 - Movement: Players.PlayerAdded → CharacterAdded → ensure Humanoid exists (movement works by default in Roblox)
 - Jumping: Set Humanoid.JumpPower = 50 if needed
-- Touch/Click: Use Touched:Connect with COMPLETE logic (not just empty functions). For collectible coins/items, ensure coin.CanTouch = true and coin.CanCollide = false. Use debounce pattern to prevent multiple rapid collections: local collectingCoins = {}; if collectingCoins[coin] then return end; collectingCoins[coin] = true; onCoinTouched(coin, player); wait(0.5); collectingCoins[coin] = nil
+- Touch/Click: Use Touched:Connect with COMPLETE logic (not just empty functions). For collectible coins/items, ensure coin.CanTouch = true and coin.CanCollide = false. Use debounce pattern to prevent multiple rapid collections: local collectingCoins = {{}}; if collectingCoins[coin] then return end; collectingCoins[coin] = true; onCoinTouched(coin, player); wait(0.5); collectingCoins[coin] = nil
 - Scoring: Create leaderstats, update values, display in GUI. If user wants day/night changes based on score, use Lighting service to change TimeOfDay or ClockTime progressively.
 - Day/Night Transitions: When user mentions "day to night" or "when coins touched night comes" or "collect coin switch day to night then after 1 sec switch to day", automatically switch to night when coin is collected, then after 1 second switch back to day.
   * Start with DAY theme: local Lighting = game:GetService("Lighting"); Lighting.TimeOfDay = 6 (6 AM = day) or Lighting.ClockTime = 12 (noon = day)
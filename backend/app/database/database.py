@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import base64
 import secrets
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple, Union, cast
-
-from app.services.security import hash_password, verify_password
+from typing import Any, Callable, Dict, Iterator, List, Optional, Pattern, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from app.database.models import AuthRevocation, AuthSession, Base, Draft, Project, User  # noqa: F401
+from app.database.mongo_repository import MongoRepository
+from app.database.repository import Repository, StoredFile, VersionConflict, stored_text  # noqa: F401
+from app.database.sql_repository import SqlRepository
+from app.services import blob_codec, code_search
+from app.services.auth_cache import auth_cache, last_seen_writer, revocations
+from app.services.security import hash_password
+from app.services.tracing import traced
 from app.settings import settings
 
 
@@ -13,672 +24,298 @@ def _is_mongo_url(url: str) -> bool:
     return u.startswith("mongodb://") or u.startswith("mongodb+srv://")
 
 
-def _mongo_db():
-    # Lazy import to avoid requiring pymongo when using SQLite.
-    from pymongo import MongoClient
-
-    client = MongoClient(settings.database_url)
-    try:
-        db = client.get_default_database()
-    except Exception:
-        db = None
-    if db is None:
-        db = client["vibe_coding"]
-    return client, db
-
-
-_MONGO: Optional[Tuple[Any, Any]] = None
-
-
-def _get_mongo():
-    global _MONGO
-    if _MONGO is None:
-        _MONGO = _mongo_db()
-    return _MONGO
-
-
-# --- SQLite (SQLAlchemy) fallback ---
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String, Text, create_engine  # noqa: E402
-from sqlalchemy.ext.declarative import declarative_base  # noqa: E402
-from sqlalchemy.orm import sessionmaker  # noqa: E402
-
-Base = declarative_base()
-
-
-class Draft(Base):
-    __tablename__ = "drafts"
-
-    id = Column(Integer, primary_key=True, index=True)
-    prompt = Column(Text, nullable=False)
-    blueprint_id = Column(String, nullable=True)
-    settings = Column(JSON, nullable=True)
-    result = Column(JSON, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-
-class User(Base):
-    __tablename__ = "users"
+def sqlite_pragmas() -> Dict[str, Any]:
+    """PRAGMAs from the SQLITE_* settings, run on every new SQLite connection."""
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "mmap_size": settings.sqlite_mmap_bytes,
+    }
 
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, nullable=False, unique=True, index=True)
-    name = Column(String, nullable=True)
-    password_hash = Column(String, nullable=True)  # nullable for Google OAuth users
-    google_id = Column(String, nullable=True, unique=True, index=True)  # Google OAuth ID
-    avatar_url = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
 
+def create_sql_engine(url: str, *, pragmas: Optional[Dict[str, Any]] = None) -> Engine:
+    """SQLAlchemy engine with a bounded pool (DB_POOL_*); SQLite files also get `pragmas` (default: settings)."""
+    pool = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+    }
+    if not url.startswith("sqlite"):
+        return create_engine(url, **pool)
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # One in-memory database per connection; nothing to pool or tune.
+        return create_engine(url, connect_args={"check_same_thread": False})
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **pool)
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    if pragmas:
+
+        @event.listens_for(engine, "connect")
+        def _tune(dbapi_conn: Any, _record: Any) -> None:
+            cur = dbapi_conn.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cur.execute(f"PRAGMA {name}={value}")
+            finally:
+                cur.close()
+    return engine
+
+
+def mongo_client_options() -> Dict[str, Any]:
+    """MongoClient keyword arguments from the MONGO_* settings."""
+    return {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "appname": "vibe-coding-api",
+    }
 
-class AuthSession(Base):
-    __tablename__ = "auth_sessions"
 
-    id = Column(String, primary_key=True, index=True)  # stored in cookie
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_seen_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=False, index=True)
+def make_repository(url: str) -> Repository:
+    """The Repository for a DATABASE_URL-style URL (also used by migrate_projects.py)."""
+    if _is_mongo_url(url):
+        return MongoRepository(
+            url, history_limit=settings.project_history_limit, client_options=mongo_client_options()
+        )
+    return SqlRepository(create_sql_engine(url), history_limit=settings.project_history_limit)
 
 
-engine = None
-SessionLocal = None
-if not _is_mongo_url(settings.database_url):
-    engine = create_engine(
-        settings.database_url,
-        connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
-    )
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The backend is chosen once, from DATABASE_URL; everything below delegates to it.
+repo: Repository = make_repository(settings.database_url)
+engine = getattr(repo, "engine", None)
+SessionLocal = getattr(repo, "SessionLocal", None)
 
 
 def init_db():
     """Initialize database tables / indexes."""
-    if _is_mongo_url(settings.database_url):
-        _client, db = _get_mongo()
-        # Users: unique email, unique google_id (sparse)
-        db["users"].create_index("email", unique=True)
-        db["users"].create_index("google_id", unique=True, sparse=True)
-        # Sessions: TTL cleanup
-        db["auth_sessions"].create_index("expires_at", expireAfterSeconds=0)
-        db["auth_sessions"].create_index("user_id")
-        # Projects: user_id index
-        db["projects"].create_index("user_id")
-        db["projects"].create_index("updated_at")
-        return
-
-    assert engine is not None
-    Base.metadata.create_all(bind=engine)
-    _sqlite_maybe_migrate(engine)
-    # Create projects table if missing
-    from sqlalchemy import Table, MetaData, Column, Integer, String, Text, JSON, DateTime
-    metadata = MetaData()
-    try:
-        projects_table = Table("projects", metadata, autoload_with=engine)
-    except Exception:
-        projects_table = Table(
-            "projects",
-            metadata,
-            Column("id", Integer, primary_key=True),
-            Column("user_id", String, nullable=False, index=True),
-            Column("name", String, nullable=False),
-            Column("description", Text, nullable=True),
-            Column("files", JSON, nullable=False),
-            Column("created_at", DateTime, default=datetime.utcnow),
-            Column("updated_at", DateTime, default=datetime.utcnow),
-        )
-        projects_table.create(engine, checkfirst=True)
-
-
-def _sqlite_maybe_migrate(engine: Any) -> None:
-    """Best-effort SQLite migrations for local dev (no Alembic)."""
-    try:
-        with engine.connect() as conn:
-            rows = conn.exec_driver_sql("PRAGMA table_info(users)").fetchall()
-            cols = {r[1] for r in rows}  # (cid, name, type, notnull, dflt_value, pk)
-
-            # Add google_id if missing (introduced for Google OAuth)
-            if "google_id" not in cols:
-                conn.exec_driver_sql("ALTER TABLE users ADD COLUMN google_id VARCHAR")
-            if "avatar_url" not in cols:
-                conn.exec_driver_sql("ALTER TABLE users ADD COLUMN avatar_url VARCHAR")
-
-            # Ensure an index exists for google_id lookups (unique where possible)
-            # SQLite can't create a UNIQUE constraint retroactively, but a unique index works.
-            conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_google_id ON users(google_id)")
-    except Exception:
-        # Don't crash startup on best-effort migration.
-        return
+    repo.init()
 
 
 def get_db():
     """Dependency: yield MongoDB database or SQLAlchemy session."""
-    if _is_mongo_url(settings.database_url):
-        _client, db = _get_mongo()
-        yield db
-        return
-
-    assert SessionLocal is not None
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    yield from repo.session()
 
 
 def save_draft(db, draft_data: Dict[str, Any]) -> str:
     """Save a draft to the database."""
-    if _is_mongo_db(db):
-        doc = {
-            "prompt": draft_data["prompt"],
-            "blueprint_id": draft_data.get("blueprint_id"),
-            "settings": draft_data.get("settings"),
-            "result": draft_data["result"],
-            "created_at": _as_dt(draft_data.get("created_at")),
-        }
-        res = db["drafts"].insert_one(doc)
-        return str(res.inserted_id)
-
-    draft = Draft(
-        prompt=draft_data["prompt"],
-        blueprint_id=draft_data.get("blueprint_id"),
-        settings=draft_data.get("settings"),
-        result=draft_data["result"],
-        created_at=datetime.fromisoformat(draft_data["created_at"]) if isinstance(draft_data["created_at"], str) else draft_data["created_at"]
-    )
-    db.add(draft)
-    db.commit()
-    db.refresh(draft)
-    return str(draft.id)
+    return repo.save_draft(db, draft_data)
 
 
 def get_draft(db, draft_id: str) -> Optional[Dict[str, Any]]:
     """Get a draft by ID."""
-    if _is_mongo_db(db):
-        oid = _maybe_object_id(draft_id)
-        if oid is None:
-            return None
-        doc = db["drafts"].find_one({"_id": oid})
-        if not doc:
-            return None
-        return {
-            "id": str(doc["_id"]),
-            "prompt": doc.get("prompt"),
-            "blueprint_id": doc.get("blueprint_id"),
-            "settings": doc.get("settings"),
-            "result": doc.get("result"),
-            "created_at": _iso(doc.get("created_at")),
-        }
-
-    draft = db.query(Draft).filter(Draft.id == draft_id).first()
-    if not draft:
-        return None
-    
-    return {
-        "id": str(draft.id),
-        "prompt": draft.prompt,
-        "blueprint_id": draft.blueprint_id,
-        "settings": draft.settings,
-        "result": draft.result,
-        "created_at": draft.created_at.isoformat()
-    }
+    return repo.get_draft(db, draft_id)
 
 
 def get_all_drafts(db, limit: int = 20) -> List[Dict[str, Any]]:
     """Get all drafts, limited by count."""
-    if _is_mongo_db(db):
-        docs = db["drafts"].find({}).sort("created_at", -1).limit(int(limit))
-        out: List[Dict[str, Any]] = []
-        for d in docs:
-            out.append(
-                {
-                    "id": str(d["_id"]),
-                    "prompt": d.get("prompt"),
-                    "blueprint_id": d.get("blueprint_id"),
-                    "settings": d.get("settings"),
-                    "result": d.get("result"),
-                    "created_at": _iso(d.get("created_at")),
-                }
-            )
-        return out
-
-    drafts = db.query(Draft).order_by(Draft.created_at.desc()).limit(limit).all()
-    
-    return [
-        {
-            "id": str(draft.id),
-            "prompt": draft.prompt,
-            "blueprint_id": draft.blueprint_id,
-            "settings": draft.settings,
-            "result": draft.result,
-            "created_at": draft.created_at.isoformat()
-        }
-        for draft in drafts
-    ]
-
-
-def create_user(*, db, email: str, password: str, name: Optional[str] = None) -> Dict[str, Any]:
-    email_norm = email.lower().strip()
-    if _is_mongo_db(db):
-        doc = {
-            "email": email_norm,
-            "name": name,
-            "password_hash": hash_password(password),
-            "google_id": None,
-            "avatar_url": None,
-            "created_at": datetime.utcnow(),
-        }
-        res = db["users"].insert_one(doc)
-        return {"id": str(res.inserted_id), "email": email_norm, "name": name, "avatar_url": None}
-
-    user = User(email=email_norm, name=name, password_hash=hash_password(password))
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return {"id": str(user.id), "email": user.email, "name": user.name, "avatar_url": getattr(user, "avatar_url", None)}
+    return repo.get_all_drafts(db, limit)
 
 
+@traced("db.create_user")
+def create_user(
+    *,
+    db,
+    email: str,
+    password: Optional[str] = None,
+    name: Optional[str] = None,
+    password_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Create a password user. Pass `password_hash` when it was computed off-thread (password_pool)."""
+    if password_hash is None:
+        password_hash = hash_password(password or "")
+    return repo.create_user(db, email=email.lower().strip(), name=name, password_hash=password_hash)
+
+
+@traced("db.create_or_get_google_user")
 def create_or_get_google_user(
     *, db, google_id: str, email: str, name: Optional[str] = None, avatar_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """Create or get user by Google ID. If email exists but no google_id, link them."""
-    email_norm = email.lower().strip()
-    if _is_mongo_db(db):
-        users = db["users"]
-        doc = users.find_one({"google_id": google_id})
-        if doc:
-            updates: Dict[str, Any] = {}
-            if name and doc.get("name") != name:
-                updates["name"] = name
-            if email_norm and doc.get("email") != email_norm:
-                updates["email"] = email_norm
-            if avatar_url and doc.get("avatar_url") != avatar_url:
-                updates["avatar_url"] = avatar_url
-            if updates:
-                users.update_one({"_id": doc["_id"]}, {"$set": updates})
-                doc.update(updates)
-            return {
-                "id": str(doc["_id"]),
-                "email": doc.get("email", email_norm),
-                "name": doc.get("name"),
-                "avatar_url": doc.get("avatar_url"),
-            }
+    user = repo.create_or_get_google_user(
+        db, google_id=google_id, email=email.lower().strip(), name=name, avatar_url=avatar_url
+    )
+    # Name/email/avatar may have changed; cached copies of this user are stale.
+    auth_cache.invalidate_user(str(user["id"]))
+    return user
 
-        # Link by email if exists
-        existing = users.find_one({"email": email_norm})
-        if existing:
-            updates = {"google_id": google_id}
-            if name:
-                updates["name"] = name
-            if avatar_url:
-                updates["avatar_url"] = avatar_url
-            users.update_one({"_id": existing["_id"]}, {"$set": updates})
-            existing.update(updates)
-            return {
-                "id": str(existing["_id"]),
-                "email": existing.get("email"),
-                "name": existing.get("name"),
-                "avatar_url": existing.get("avatar_url"),
-            }
 
-        # Create new
-        new_doc = {
-            "email": email_norm,
-            "name": name,
-            "password_hash": None,
-            "google_id": google_id,
-            "avatar_url": avatar_url,
-            "created_at": datetime.utcnow(),
-        }
-        res = users.insert_one(new_doc)
-        return {"id": str(res.inserted_id), "email": email_norm, "name": name, "avatar_url": avatar_url}
-
-    # SQLite fallback
-    user = db.query(User).filter(User.google_id == google_id).first()
-    if user:
-        if name and user.name != name:
-            user.name = name
-        if email_norm != user.email:
-            user.email = email_norm
-        if avatar_url and getattr(user, "avatar_url", None) != avatar_url:
-            user.avatar_url = avatar_url
-        db.commit()
-        db.refresh(user)
-        return {"id": str(user.id), "email": user.email, "name": user.name, "avatar_url": getattr(user, "avatar_url", None)}
-
-    existing = db.query(User).filter(User.email == email_norm).first()
-    if existing:
-        existing.google_id = google_id
-        if name:
-            existing.name = name
-        if avatar_url:
-            existing.avatar_url = avatar_url
-        db.commit()
-        db.refresh(existing)
-        return {
-            "id": str(existing.id),
-            "email": existing.email,
-            "name": existing.name,
-            "avatar_url": getattr(existing, "avatar_url", None),
-        }
-
-    user = User(email=email_norm, name=name, google_id=google_id, password_hash=None, avatar_url=avatar_url)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return {"id": str(user.id), "email": user.email, "name": user.name, "avatar_url": getattr(user, "avatar_url", None)}
-
-
-def authenticate_user(*, db, email: str, password: str) -> Optional[Dict[str, Any]]:
-    email_norm = email.lower().strip()
-    if _is_mongo_db(db):
-        doc = db["users"].find_one({"email": email_norm})
-        if not doc:
-            return None
-        ph = doc.get("password_hash")
-        if not ph:
-            return None
-        if not verify_password(password, ph):
-            return None
-        return {
-            "id": str(doc["_id"]),
-            "email": doc.get("email"),
-            "name": doc.get("name"),
-            "avatar_url": doc.get("avatar_url"),
-        }
-
-    user = db.query(User).filter(User.email == email_norm).first()
-    if not user:
-        return None
-    if not user.password_hash:
-        return None
-    if not verify_password(password, user.password_hash):
-        return None
-    return {"id": str(user.id), "email": user.email, "name": user.name, "avatar_url": getattr(user, "avatar_url", None)}
+@traced("db.get_password_login")
+def get_password_login(*, db, email: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """(public user, password_hash) for a password account, for verification off-thread."""
+    return repo.get_password_login(db, (email or "").lower().strip())
 
 
+@traced("db.create_session")
 def create_session(*, db, user_id: str, ttl_seconds: int) -> Dict[str, Any]:
-    sid = secrets.token_urlsafe(32)
     now = datetime.utcnow()
-    expires_at = now + timedelta(seconds=int(ttl_seconds))
-
-    if _is_mongo_db(db):
-        db["auth_sessions"].insert_one(
-            {
-                "_id": sid,
-                "user_id": user_id,
-                "created_at": now,
-                "last_seen_at": now,
-                "expires_at": expires_at,
-            }
-        )
-        return {"id": sid, "user_id": user_id, "expires_at": expires_at}
-
-    # SQLite: user_id is int FK
-    sess = AuthSession(
-        id=sid,
-        user_id=int(user_id),
-        created_at=now,
-        last_seen_at=now,
-        expires_at=expires_at,
+    return repo.create_session(
+        db,
+        sid=secrets.token_urlsafe(32),
+        user_id=user_id,
+        now=now,
+        expires_at=now + timedelta(seconds=int(ttl_seconds)),
     )
-    db.add(sess)
-    db.commit()
-    db.refresh(sess)
-    return {"id": sess.id, "user_id": str(sess.user_id), "expires_at": sess.expires_at}
 
 
+@traced("db.get_session")
 def get_session(*, db, sid: str) -> Optional[Dict[str, Any]]:
     if not sid:
         return None
+    sess = repo.get_session(db, sid, datetime.utcnow())
+    if sess is not None:
+        # last_seen_at is written behind, in batches (see flush_last_seen).
+        last_seen_writer.touch(sid)
+    return sess
 
-    now = datetime.utcnow()
-    if _is_mongo_db(db):
-        doc = db["auth_sessions"].find_one({"_id": sid})
-        if not doc:
-            return None
-        expires_at = doc.get("expires_at")
-        if isinstance(expires_at, datetime) and expires_at < now:
-            db["auth_sessions"].delete_one({"_id": sid})
-            return None
-        db["auth_sessions"].update_one({"_id": sid}, {"$set": {"last_seen_at": now}})
-        return {"id": sid, "user_id": cast(str, doc.get("user_id")), "expires_at": expires_at}
-
-    sess = db.query(AuthSession).filter(AuthSession.id == sid).first()
-    if not sess:
-        return None
-    if sess.expires_at < now:
-        db.delete(sess)
-        db.commit()
-        return None
-    sess.last_seen_at = now
-    db.add(sess)
-    db.commit()
-    return {"id": sess.id, "user_id": str(sess.user_id), "expires_at": sess.expires_at}
+
+@traced("db.flush_last_seen")
+def flush_last_seen(sids: List[str], seen_at: datetime) -> None:
+    """Set last_seen_at for a batch of sessions in one statement (per 500 ids)."""
+    repo.flush_last_seen(sids, seen_at)
 
 
+@traced("db.delete_session")
 def delete_session(*, db, sid: str) -> None:
     if not sid:
         return
-    if _is_mongo_db(db):
-        db["auth_sessions"].delete_one({"_id": sid})
-        return
+    auth_cache.invalidate_session(sid)
+    last_seen_writer.discard(sid)
+    expires_at = repo.delete_session(db, sid, datetime.utcnow())
+    if expires_at is not None:
+        revocations.add(sid, expires_at)
+
 
-    sess = db.query(AuthSession).filter(AuthSession.id == sid).first()
-    if sess:
-        db.delete(sess)
-        db.commit()
+def fetch_revocations(since: Optional[datetime]) -> List[Tuple[str, datetime, datetime]]:
+    """(sid, expires_at, revoked_at) revoked after `since` (all live ones when None)."""
+    return repo.fetch_revocations(since, datetime.utcnow())
 
 
+@traced("db.get_user_by_id")
 def get_user_by_id(*, db, user_id: str) -> Optional[Dict[str, Any]]:
     if not user_id:
         return None
-    if _is_mongo_db(db):
-        oid = _maybe_object_id(user_id)
-        if oid is None:
-            return None
-        doc = db["users"].find_one({"_id": oid})
-        if not doc:
-            return None
-        return {
-            "id": str(doc["_id"]),
-            "email": doc.get("email"),
-            "name": doc.get("name"),
-            "avatar_url": doc.get("avatar_url"),
-        }
-
-    try:
-        iid = int(user_id)
-    except Exception:
-        return None
-    user = db.query(User).filter(User.id == iid).first()
-    if not user:
-        return None
-    return {"id": str(user.id), "email": user.email, "name": user.name, "avatar_url": getattr(user, "avatar_url", None)}
+    return repo.get_user_by_id(db, user_id)
 
 
+@traced("db.get_user_by_email")
 def get_user_by_email(*, db, email: str) -> Optional[Dict[str, Any]]:
     email_norm = (email or "").lower().strip()
     if not email_norm:
         return None
-    if _is_mongo_db(db):
-        doc = db["users"].find_one({"email": email_norm})
-        if not doc:
-            return None
-        return {
-            "id": str(doc["_id"]),
-            "email": doc.get("email"),
-            "name": doc.get("name"),
-            "avatar_url": doc.get("avatar_url"),
-        }
-
-    user = db.query(User).filter(User.email == email_norm).first()
-    if not user:
-        return None
-    return {"id": str(user.id), "email": user.email, "name": user.name, "avatar_url": getattr(user, "avatar_url", None)}
+    return repo.get_user_by_email(db, email_norm)
 
 
-def _is_mongo_db(db: Any) -> bool:
-    # pymongo.database.Database has get_collection/list_collection_names
-    return hasattr(db, "get_collection") and hasattr(db, "list_collection_names")
+@traced("db.save_project")
+def save_project(*, db, user_id: str, name: str, files: List[Dict[str, Any]], description: Optional[str] = None) -> str:
+    """Save a project (all files) for a user."""
+    return repo.save_project(
+        db, user_id=user_id, name=name, files=files, description=description, now=datetime.utcnow()
+    )
 
 
-def _maybe_object_id(v: str):
-    try:
-        from bson import ObjectId
+@traced("db.get_project")
+def get_project(*, db, project_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """Get a project by ID (user must own it)."""
+    return repo.get_project(db, project_id, user_id)
 
-        return ObjectId(v)
-    except Exception:
-        return None
 
+@traced("db.get_project_stored")
+def get_project_stored(*, db, project_id: str, user_id: str) -> Optional[Tuple[Dict[str, Any], List[StoredFile]]]:
+    """Like get_project, but files are (path, codec, payload) to decode with stored_text() when sent."""
+    return repo.get_project_stored(db, project_id, user_id)
 
-def _as_dt(v: Any) -> datetime:
-    if isinstance(v, datetime):
-        return v
-    if isinstance(v, str) and v:
-        try:
-            return datetime.fromisoformat(v)
-        except Exception:
-            pass
-    return datetime.utcnow()
 
+@traced("db.get_project_manifest")
+def get_project_manifest(*, db, project_id: str, user_id: str) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+    """(version, [{"path", "hash", "size"}]) of a project's files, without their contents."""
+    return repo.get_project_manifest(db, project_id, user_id)
 
-def _iso(v: Any) -> str:
-    if isinstance(v, datetime):
-        return v.isoformat()
-    return datetime.utcnow().isoformat()
 
+@traced("db.get_project_file_ref")
+def get_project_file_ref(*, db, project_id: str, user_id: str, path: str) -> Optional[Dict[str, Any]]:
+    """{"hash", "size"} of one project file; None if the project or file doesn't exist."""
+    return repo.get_project_file_ref(db, project_id, user_id, path)
 
-def save_project(*, db, user_id: str, name: str, files: List[Dict[str, Any]], description: Optional[str] = None) -> str:
-    """Save a project (all files) for a user."""
-    now = datetime.utcnow()
-    if _is_mongo_db(db):
-        doc = {
-            "user_id": user_id,
-            "name": name,
-            "description": description,
-            "files": files,
-            "created_at": now,
-            "updated_at": now,
-        }
-        res = db["projects"].insert_one(doc)
-        return str(res.inserted_id)
-
-    # SQLite: would need a Project table, but for now just use JSON in a simple table
-    # For simplicity, we'll use MongoDB-style storage even in SQLite
-    from sqlalchemy import Table, MetaData
-    metadata = MetaData()
-    projects_table = Table(
-        "projects",
-        metadata,
-        Column("id", Integer, primary_key=True),
-        Column("user_id", String, nullable=False, index=True),
-        Column("name", String, nullable=False),
-        Column("description", Text, nullable=True),
-        Column("files", JSON, nullable=False),
-        Column("created_at", DateTime, default=datetime.utcnow),
-        Column("updated_at", DateTime, default=datetime.utcnow),
-    )
-    metadata.create_all(engine)
-    # Insert via raw SQL for simplicity
-    with engine.connect() as conn:
-        result = conn.execute(
-            projects_table.insert().values(
-                user_id=user_id,
-                name=name,
-                description=description,
-                files=files,
-                created_at=now,
-                updated_at=now,
-            )
+
+@traced("db.search_projects")
+def search_projects(
+    *,
+    db,
+    user_id: str,
+    query: str,
+    pattern: Pattern[str],
+    case_sensitive: bool,
+    project_id: Optional[str],
+    limit: int,
+) -> Dict[str, Any]:
+    """Lines of the user's files containing `query` and matching `pattern` (code_search.compile_filter).
+
+    Returns {"results": [{"project_id", "project_name", "path", "line", "column", "snippet"}],
+    "files_searched", "truncated"}; truncated when `limit` matches or the candidate cap was hit.
+    """
+    candidates = repo.search_project_files(db, user_id, query, project_id, code_search.MAX_CANDIDATE_FILES)
+    results: List[Dict[str, Any]] = []
+    for f in candidates:
+        hits = code_search.find_matches(
+            f["content"], query, pattern, case_sensitive=case_sensitive, limit=limit - len(results)
         )
-        conn.commit()
-        return str(result.lastrowid)
+        for hit in hits:
+            results.append({"project_id": f["project_id"], "project_name": f["project_name"], "path": f["path"], **hit})
+        if len(results) >= limit:
+            break
+    return {
+        "results": results,
+        "files_searched": len(candidates),
+        "truncated": len(results) >= limit or len(candidates) >= code_search.MAX_CANDIDATE_FILES,
+    }
 
 
-def get_project(*, db, project_id: str, user_id: str) -> Optional[Dict[str, Any]]:
-    """Get a project by ID (user must own it)."""
-    if _is_mongo_db(db):
-        oid = _maybe_object_id(project_id)
-        if oid is None:
-            return None
-        doc = db["projects"].find_one({"_id": oid, "user_id": user_id})
-        if not doc:
-            return None
-        return {
-            "id": str(doc["_id"]),
-            "name": doc.get("name"),
-            "description": doc.get("description"),
-            "files": doc.get("files", []),
-            "created_at": _iso(doc.get("created_at")),
-            "updated_at": _iso(doc.get("updated_at")),
-        }
+@traced("db.get_blob_stored")
+def get_blob_stored(*, db, content_hash: str) -> Optional[Tuple[Optional[str], Any]]:
+    """(codec, payload) of one blob by content hash."""
+    return repo.get_blobs_stored(db, [content_hash]).get(content_hash)
 
-    try:
-        iid = int(project_id)
-    except Exception:
-        return None
-    # SQLite: query projects table
-    from sqlalchemy import Table, MetaData, select
-    metadata = MetaData()
-    projects_table = Table("projects", metadata, autoload_with=engine)
-    with engine.connect() as conn:
-        result = conn.execute(
-            select(projects_table).where(
-                projects_table.c.id == iid,
-                projects_table.c.user_id == user_id,
-            )
-        ).first()
-        if not result:
-            return None
-        return {
-            "id": str(result.id),
-            "name": result.name,
-            "description": result.description,
-            "files": result.files or [],
-            "created_at": result.created_at.isoformat() if result.created_at else datetime.utcnow().isoformat(),
-            "updated_at": result.updated_at.isoformat() if result.updated_at else datetime.utcnow().isoformat(),
-        }
-
-
-def list_projects(*, db, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-    """List all projects for a user."""
-    if _is_mongo_db(db):
-        docs = db["projects"].find({"user_id": user_id}).sort("updated_at", -1).limit(int(limit))
-        out: List[Dict[str, Any]] = []
-        for d in docs:
-            out.append(
-                {
-                    "id": str(d["_id"]),
-                    "name": d.get("name"),
-                    "description": d.get("description"),
-                    "files": d.get("files", []),
-                    "created_at": _iso(d.get("created_at")),
-                    "updated_at": _iso(d.get("updated_at")),
-                }
-            )
-        return out
-
-    # SQLite
-    from sqlalchemy import Table, MetaData, select
-    metadata = MetaData()
-    projects_table = Table("projects", metadata, autoload_with=engine)
-    with engine.connect() as conn:
-        results = conn.execute(
-            select(projects_table)
-            .where(projects_table.c.user_id == user_id)
-            .order_by(projects_table.c.updated_at.desc())
-            .limit(limit)
-        ).fetchall()
-        return [
-            {
-                "id": str(r.id),
-                "name": r.name,
-                "description": r.description,
-                "files": r.files or [],
-                "created_at": r.created_at.isoformat() if r.created_at else datetime.utcnow().isoformat(),
-                "updated_at": r.updated_at.isoformat() if r.updated_at else datetime.utcnow().isoformat(),
-            }
-            for r in results
-        ]
 
+def _encode_cursor(updated_at: datetime, project_id: str) -> str:
+    raw = f"{updated_at.isoformat()}|{project_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of _encode_cursor; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts, project_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), project_id
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+@traced("db.list_project_summaries")
+def list_project_summaries(
+    *, db, user_id: str, limit: int = 50, cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of a user's projects, newest first, without file contents.
+
+    Returns (summaries, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed `cursor`.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    rows = repo.list_project_summaries(db, user_id, limit + 1, after)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if isinstance(last["updated_dt"], datetime):
+            next_cursor = _encode_cursor(last["updated_dt"], last["id"])
+    for row in rows:
+        del row["updated_dt"]
+    return rows, next_cursor
+
+
+@traced("db.update_project")
 def update_project(
     *,
     db,
@@ -688,81 +325,23 @@ def update_project(
     description: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
     """Update project metadata (name/description). Returns updated project or None if not found/owned."""
-    now = datetime.utcnow()
-    if _is_mongo_db(db):
-        oid = _maybe_object_id(project_id)
-        if oid is None:
-            return None
-        update: Dict[str, Any] = {"updated_at": now}
-        if name is not None:
-            update["name"] = name
-        if description is not None:
-            update["description"] = description
-        res = db["projects"].update_one({"_id": oid, "user_id": user_id}, {"$set": update})
-        if res.matched_count == 0:
-            return None
-        return get_project(db=db, project_id=project_id, user_id=user_id)
-
-    try:
-        iid = int(project_id)
-    except Exception:
-        return None
-    from sqlalchemy import Table, MetaData, select, update as sql_update
-
-    metadata = MetaData()
-    projects_table = Table("projects", metadata, autoload_with=engine)
-    values: Dict[str, Any] = {"updated_at": now}
+    values: Dict[str, Any] = {"updated_at": datetime.utcnow()}
     if name is not None:
         values["name"] = name
     if description is not None:
         values["description"] = description
-    with engine.connect() as conn:
-        res = conn.execute(
-            sql_update(projects_table)
-            .where(projects_table.c.id == iid, projects_table.c.user_id == user_id)
-            .values(**values)
-        )
-        conn.commit()
-        if res.rowcount == 0:
-            return None
-        result = conn.execute(
-            select(projects_table).where(projects_table.c.id == iid, projects_table.c.user_id == user_id)
-        ).first()
-        if not result:
-            return None
-        return {
-            "id": str(result.id),
-            "name": result.name,
-            "description": result.description,
-            "files": result.files or [],
-            "created_at": result.created_at.isoformat() if result.created_at else datetime.utcnow().isoformat(),
-            "updated_at": result.updated_at.isoformat() if result.updated_at else datetime.utcnow().isoformat(),
-        }
+    if not repo.update_project(db, project_id, user_id, values):
+        return None
+    return repo.get_project(db, project_id, user_id)
 
 
+@traced("db.delete_project")
 def delete_project(*, db, project_id: str, user_id: str) -> bool:
     """Delete a project. Returns True if deleted, False if not found/owned."""
-    if _is_mongo_db(db):
-        oid = _maybe_object_id(project_id)
-        if oid is None:
-            return False
-        res = db["projects"].delete_one({"_id": oid, "user_id": user_id})
-        return bool(res.deleted_count)
-
-    try:
-        iid = int(project_id)
-    except Exception:
-        return False
-    from sqlalchemy import Table, MetaData, delete as sql_delete
-
-    metadata = MetaData()
-    projects_table = Table("projects", metadata, autoload_with=engine)
-    with engine.connect() as conn:
-        res = conn.execute(sql_delete(projects_table).where(projects_table.c.id == iid, projects_table.c.user_id == user_id))
-        conn.commit()
-        return bool(res.rowcount)
+    return repo.delete_project(db, project_id, user_id)
 
 
+@traced("db.replace_project")
 def replace_project(
     *,
     db,
@@ -771,61 +350,171 @@ def replace_project(
     name: str,
     files: List[Dict[str, Any]],
     description: Optional[str] = None,
+    base_version: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
-    """Replace a project's files + metadata. Returns updated project or None if not found/owned."""
-    now = datetime.utcnow()
-    if _is_mongo_db(db):
-        oid = _maybe_object_id(project_id)
-        if oid is None:
-            return None
-        res = db["projects"].update_one(
-            {"_id": oid, "user_id": user_id},
-            {
-                "$set": {
-                    "name": name,
-                    "description": description,
-                    "files": files,
-                    "updated_at": now,
-                }
-            },
-        )
-        if res.matched_count == 0:
-            return None
-        return get_project(db=db, project_id=project_id, user_id=user_id)
+    """Replace a project's files + metadata; only files whose content changed are written.
+
+    A save that changes no file makes no new version (metadata still updates).
+    Returns {"id", "version", "file_count", "total_bytes", "created_at", "updated_at"} or None
+    if not found/owned; raises VersionConflict if `base_version` is stale.
+    """
+    return repo.write_project_files(
+        db,
+        project_id,
+        user_id,
+        upserts={str(f.get("path") or ""): f.get("content") or "" for f in files},
+        deletes=[],
+        replace=True,
+        base_version=base_version,
+        meta={"name": name, "description": description},
+        now=datetime.utcnow(),
+    )
 
-    try:
-        iid = int(project_id)
-    except Exception:
+
+@traced("db.patch_project_files")
+def patch_project_files(
+    *,
+    db,
+    project_id: str,
+    user_id: str,
+    upserts: Dict[str, str],
+    deletes: List[str],
+    base_version: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """Create/overwrite and delete individual files; same result and errors as replace_project."""
+    return repo.write_project_files(
+        db,
+        project_id,
+        user_id,
+        upserts=upserts,
+        deletes=deletes,
+        replace=False,
+        base_version=base_version,
+        meta={},
+        now=datetime.utcnow(),
+    )
+
+
+@traced("db.list_project_versions")
+def list_project_versions(*, db, project_id: str, user_id: str, limit: int = 50) -> Optional[List[Dict[str, Any]]]:
+    """Saved versions of a project, newest first. None if not found/owned."""
+    return repo.list_project_versions(db, project_id, user_id, limit)
+
+
+@traced("db.get_project_version")
+def get_project_version(*, db, project_id: str, user_id: str, version: int) -> Optional[List[StoredFile]]:
+    """Files of a saved version in path order, as stored (see get_project_stored). None if it doesn't exist."""
+    refs = repo.get_version_files(db, project_id, user_id, version)
+    if refs is None:
         return None
-    from sqlalchemy import Table, MetaData, select, update as sql_update
-
-    metadata = MetaData()
-    projects_table = Table("projects", metadata, autoload_with=engine)
-    with engine.connect() as conn:
-        res = conn.execute(
-            sql_update(projects_table)
-            .where(projects_table.c.id == iid, projects_table.c.user_id == user_id)
-            .values(
-                name=name,
-                description=description,
-                files=files,
-                updated_at=now,
-            )
+    blobs = repo.get_blobs_stored(db, list({r["hash"] for r in refs}))
+    return [(r["path"], *blobs.get(r["hash"], (None, ""))) for r in refs]
+
+
+@traced("db.diff_project_versions")
+def diff_project_versions(
+    *, db, project_id: str, user_id: str, from_version: int, to_version: int, include_content: bool = False
+) -> Optional[List[Dict[str, Any]]]:
+    """Files that differ between two versions, by path.
+
+    Each change is {"path", "status" ("added" | "removed" | "modified"), "old_size", "new_size"}
+    plus "old_content"/"new_content" with `include_content`. Unchanged files are compared by
+    hash only, so their content is never read. None if either version doesn't exist.
+    """
+    old = repo.get_version_files(db, project_id, user_id, from_version)
+    new = repo.get_version_files(db, project_id, user_id, to_version)
+    if old is None or new is None:
+        return None
+    before = {f["path"]: f for f in old}
+    after = {f["path"]: f for f in new}
+    changes: List[Dict[str, Any]] = []
+    for path in sorted(set(before) | set(after)):
+        a, b = before.get(path), after.get(path)
+        if a is not None and b is not None and a["hash"] == b["hash"]:
+            continue
+        changes.append(
+            {
+                "path": path,
+                "status": "added" if a is None else "removed" if b is None else "modified",
+                "old_size": a["size"] if a else None,
+                "new_size": b["size"] if b else None,
+                "old_hash": a["hash"] if a else None,
+                "new_hash": b["hash"] if b else None,
+            }
         )
-        conn.commit()
-        if res.rowcount == 0:
-            return None
-        result = conn.execute(
-            select(projects_table).where(projects_table.c.id == iid, projects_table.c.user_id == user_id)
-        ).first()
-        if not result:
-            return None
-        return {
-            "id": str(result.id),
-            "name": result.name,
-            "description": result.description,
-            "files": result.files or [],
-            "created_at": result.created_at.isoformat() if result.created_at else datetime.utcnow().isoformat(),
-            "updated_at": result.updated_at.isoformat() if result.updated_at else datetime.utcnow().isoformat(),
-        }
+    if include_content:
+        contents = repo.get_blobs(db, list({c[k] for c in changes for k in ("old_hash", "new_hash") if c[k]}))
+        for c in changes:
+            c["old_content"] = contents.get(c["old_hash"]) if c["old_hash"] else None
+            c["new_content"] = contents.get(c["new_hash"]) if c["new_hash"] else None
+    for c in changes:
+        del c["old_hash"], c["new_hash"]
+    return changes
+
+
+@traced("db.restore_project_version")
+def restore_project_version(
+    *, db, project_id: str, user_id: str, version: int, base_version: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Make a saved version's files current again (as a new version unless they already are; no content is copied).
+
+    Same result and errors as replace_project; None if the project or version doesn't exist.
+    """
+    return repo.restore_project_version(
+        db, project_id, user_id, version, base_version=base_version, now=datetime.utcnow()
+    )
 
+
+@traced("db.fork_project_version")
+def fork_project_version(
+    *, db, project_id: str, user_id: str, version: int, name: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Create a new project from a saved version; it shares the version's file content."""
+    return repo.fork_project_version(db, project_id, user_id, version, name=name, now=datetime.utcnow())
+
+
+@traced("db.storage_stats")
+def storage_stats(*, db) -> List[Dict[str, Any]]:
+    """Stored project file content per codec, with its compression ratio (raw / stored)."""
+    rows = repo.storage_stats(db)
+    for row in rows:
+        row["ratio"] = blob_codec.ratio(row["raw_bytes"], row["stored_bytes"])
+    return rows
+
+
+def _in_session(target: Repository, fn: Callable[[Any], Any]) -> Any:
+    gen = target.session()
+    db = next(gen)
+    try:
+        return fn(db)
+    finally:
+        gen.close()
+
+
+def iter_projects(
+    *, user_id: Optional[str], source: Optional[Repository] = None, page: int = 100
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(owner, project with files) for each project of `user_id` (every user's when None), in id order.
+
+    Memory is bounded by one project however many there are. Each page of ids and
+    each project is read in its own short session, so this can be consumed while a
+    response streams (after the request's session has closed) without holding a
+    read transaction open for the whole export.
+    """
+    source = source or repo
+    after: Optional[str] = None
+    while True:
+        keys = _in_session(source, lambda db: source.list_project_keys(db, user_id, after, page))
+        for project_id, owner in keys:
+            proj = _in_session(source, lambda db: source.get_project(db, project_id, owner))
+            if proj is not None:  # deleted since the page was read
+                yield owner, proj
+        if len(keys) < page:
+            return
+        after = keys[-1][0]
+
+
+@traced("db.import_projects")
+def import_projects(*, db, user_id: str, projects: List[Dict[str, Any]]) -> List[str]:
+    """Insert a batch of projects for `user_id` (one transaction where the backend has them)."""
+    return repo.import_projects(db, user_id, projects, datetime.utcnow())
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class Draft(Base):
+    __tablename__ = "drafts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    prompt = Column(Text, nullable=False)
+    blueprint_id = Column(String, nullable=True)
+    settings = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, nullable=False, unique=True, index=True)
+    name = Column(String, nullable=True)
+    password_hash = Column(String, nullable=True)  # nullable for Google OAuth users
+    google_id = Column(String, nullable=True, unique=True, index=True)  # Google OAuth ID
+    avatar_url = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AuthSession(Base):
+    __tablename__ = "auth_sessions"
+
+    id = Column(String, primary_key=True, index=True)  # stored in cookie
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class AuthRevocation(Base):
+    """Deleted sessions, kept until they would have expired, so workers verifying
+    signed session cookies can learn about logouts (see RevocationList)."""
+
+    __tablename__ = "auth_revocations"
+
+    sid = Column(String, primary_key=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class Project(Base):
+    """A user's saved project. File contents live in project_files/project_blobs;
+    `files` only holds data from databases created before that, which is moved
+    out at startup (SqlRepository._maybe_migrate) and left as []."""
+
+    __tablename__ = "projects"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    name = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    files = Column(JSON, nullable=False)
+    # Kept in step with `files` so listings never have to read file contents.
+    file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(Integer, nullable=False, default=0)
+    # Bumped on every file write; clients send it back for optimistic concurrency.
+    version = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    # Serves the Project Manager listing: newest first, keyset-paginated.
+    __table_args__ = (Index("ix_projects_user_updated", "user_id", "updated_at", "id"),)
+
+
+class ProjectFileRef(Base):
+    """One file of a project: its path and the content hash it points at."""
+
+    __tablename__ = "project_files"
+
+    project_id = Column(Integer, primary_key=True)
+    path = Column(String, primary_key=True)
+    hash = Column(String, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+
+
+class ProjectBlob(Base):
+    """File content keyed by its SHA-256, shared by every file (in any project) with that content.
+
+    `data` is the content encoded by app.services.blob_codec under `codec`. Rows
+    written before the codec existed have codec NULL and the text in `content`.
+    """
+
+    __tablename__ = "project_blobs"
+
+    hash = Column(String, primary_key=True)
+    content = Column(Text, nullable=False, default="")
+    size = Column(Integer, nullable=False)
+    codec = Column(String, nullable=True)
+    data = Column(LargeBinary, nullable=True)
+
+
+class ProjectVersion(Base):
+    """One saved state of a project. Its files are (path -> hash) rows in
+    project_version_files, so a version costs a row per file, never a copy of the content."""
+
+    __tablename__ = "project_versions"
+
+    project_id = Column(Integer, primary_key=True)
+    version = Column(Integer, primary_key=True)
+    file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProjectVersionFile(Base):
+    __tablename__ = "project_version_files"
+
+    project_id = Column(Integer, primary_key=True)
+    version = Column(Integer, primary_key=True)
+    path = Column(String, primary_key=True)
+    hash = Column(String, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
@@ -0,0 +1,865 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, cast
+
+from app.database.repository import (
+    Repository,
+    StoredFile,
+    VersionConflict,
+    as_dt,
+    content_hash,
+    file_stats,
+    iso,
+    public_user,
+    stored_text,
+)
+from app.services import blob_codec, code_search
+
+
+def _maybe_object_id(v: str):
+    try:
+        from bson import ObjectId
+
+        return ObjectId(v)
+    except Exception:
+        return None
+
+
+def _user(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return public_user(doc["_id"], doc.get("email"), doc.get("name"), doc.get("avatar_url"))
+
+
+def _draft(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "prompt": doc.get("prompt"),
+        "blueprint_id": doc.get("blueprint_id"),
+        "settings": doc.get("settings"),
+        "result": doc.get("result"),
+        "created_at": iso(doc.get("created_at")),
+    }
+
+
+_USER_FIELDS = {"email": 1, "name": 1, "avatar_url": 1}
+_SUMMARY_FIELDS = {"name": 1, "description": 1, "file_count": 1, "total_bytes": 1, "created_at": 1, "updated_at": 1}
+
+
+def _summary(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name"),
+        "description": doc.get("description"),
+        "file_count": doc.get("file_count") or 0,
+        "total_bytes": doc.get("total_bytes") or 0,
+        "created_at": iso(doc.get("created_at")),
+        "updated_at": iso(doc.get("updated_at")),
+        "updated_dt": doc.get("updated_at"),
+    }
+
+
+# Blob GC only removes blobs untouched for this long: without transactions a
+# concurrent save may be about to reference a blob that currently has no refs.
+_BLOB_GRACE = timedelta(minutes=10)
+# A writer holds a lease on the project document (its `writer` field) while it
+# diffs, writes the files and snapshots, so writers to one project take turns.
+# A lease left by a crashed process lapses after this long; other writers wait
+# at most this long for one.
+_WRITE_LEASE = timedelta(seconds=30)
+
+
+def _stored(doc: Dict[str, Any]) -> Tuple[Optional[str], Any]:
+    """(codec, payload) of a blob; blobs stored before the codec carry plain `content`."""
+    if doc.get("codec") is None:
+        return None, doc.get("content") or ""
+    return doc["codec"], doc.get("data") or b""
+
+
+_BLOB_FIELDS = {"content": 1, "codec": 1, "data": 1}
+
+
+_PROJECT_FIELDS = {"name": 1, "description": 1, "version": 1, "created_at": 1, "updated_at": 1}
+
+
+def _project(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name"),
+        "description": doc.get("description"),
+        "version": doc.get("version") or 1,
+        "created_at": iso(doc.get("created_at")),
+        "updated_at": iso(doc.get("updated_at")),
+    }
+
+
+_WRITE_FIELDS = {"version": 1, "file_count": 1, "total_bytes": 1, "created_at": 1, "updated_at": 1}
+
+
+def _write_result(oid: Any, doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(oid),
+        "version": doc.get("version") or 1,
+        "file_count": doc.get("file_count") or 0,
+        "total_bytes": doc.get("total_bytes") or 0,
+        "created_at": iso(doc.get("created_at")),
+        "updated_at": iso(doc.get("updated_at")),
+    }
+
+
+class MongoRepository(Repository):
+    """pymongo implementation; the client is created on first use (pymongo is optional)."""
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        history_limit: int = 0,
+        client_options: Optional[Dict[str, Any]] = None,
+        database: Optional[str] = None,
+    ):
+        """`database` overrides the URL's database (default "vibe_coding" when the URL names none)."""
+        self._url = url
+        self._database = database
+        self.history_limit = max(0, int(history_limit))
+        self._client_options = dict(client_options or {})
+        self._client: Any = None
+        self._db: Any = None
+
+    @property
+    def db(self) -> Any:
+        if self._db is None:
+            # Lazy import to avoid requiring pymongo when using SQLite.
+            from pymongo import MongoClient
+
+            self._client = MongoClient(self._url, **self._client_options)
+            try:
+                db = self._client[self._database] if self._database else self._client.get_default_database()
+            except Exception:
+                db = None
+            self._db = db if db is not None else self._client["vibe_coding"]
+        return self._db
+
+    def init(self) -> None:
+        db = self.db
+        # Users: unique email, unique google_id (sparse)
+        db["users"].create_index("email", unique=True)
+        db["users"].create_index("google_id", unique=True, sparse=True)
+        # Sessions: TTL cleanup
+        db["auth_sessions"].create_index("expires_at", expireAfterSeconds=0)
+        db["auth_sessions"].create_index("user_id")
+        db["auth_revocations"].create_index("expires_at", expireAfterSeconds=0)
+        # Revocation sync: revoked since the last sync and not yet expired.
+        db["auth_revocations"].create_index([("revoked_at", 1), ("expires_at", 1)])
+        db["drafts"].create_index([("created_at", -1)])
+        # Serves the Project Manager listing (newest first, keyset-paginated) and
+        # every other per-user lookup (search, ownership checks go by _id).
+        db["projects"].create_index([("user_id", 1), ("updated_at", -1), ("_id", -1)])
+        # Export / migration paging: one owner's projects in _id order.
+        db["projects"].create_index([("user_id", 1), ("_id", 1)])
+        db["project_files"].create_index([("project_id", 1), ("path", 1)], unique=True)
+        db["project_files"].create_index("hash")
+        # One document per version, with its (path, hash, size) list embedded.
+        db["project_versions"].create_index([("project_id", 1), ("version", -1)], unique=True)
+        db["project_versions"].create_index("files.hash")
+        # Search: blobs carry their words (code_search.index_terms) under a text
+        # index; no stemming or stop words, identifiers are not English.
+        db["project_blobs"].create_index([("terms", "text")], default_language="none", name="project_blob_terms")
+        # One-off backfill for projects saved before file_count/total_bytes were stored.
+        db["projects"].update_many(
+            {"file_count": {"$exists": False}},
+            [
+                {
+                    "$set": {
+                        "file_count": {"$size": {"$ifNull": ["$files", []]}},
+                        "total_bytes": {
+                            "$sum": {
+                                "$map": {
+                                    "input": {"$ifNull": ["$files", []]},
+                                    "in": {"$strLenBytes": {"$ifNull": ["$$this.content", ""]}},
+                                }
+                            }
+                        },
+                    }
+                }
+            ],
+        )
+
+        self._move_legacy_files(db)
+        self._snapshot_unversioned(db)
+        self._index_unsearched(db)
+
+    def _move_legacy_files(self, db: Any) -> None:
+        """Move file arrays still embedded in project documents into project_files/project_blobs."""
+        moved = 0
+        for doc in db["projects"].find({"files": {"$exists": True}}, {"files": 1}):
+            files = {str(f.get("path") or ""): f.get("content") or "" for f in doc.get("files") or []}
+            self._sync_files(db, str(doc["_id"]), files, [], replace=True, now=datetime.utcnow())
+            db["projects"].update_one({"_id": doc["_id"]}, {"$unset": {"files": ""}})
+            moved += 1
+        if moved:
+            print(f"Moved files of {moved} project(s) into project_files")
+
+    def _index_unsearched(self, db: Any) -> None:
+        """Add search terms to blobs stored before search existed."""
+        from pymongo import UpdateOne
+
+        ops: List[Any] = []
+        for doc in db["project_blobs"].find({"terms": {"$exists": False}}, _BLOB_FIELDS):
+            terms = code_search.index_terms(stored_text(*_stored(doc)))
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"terms": terms}}))
+            if len(ops) >= 500:
+                db["project_blobs"].bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            db["project_blobs"].bulk_write(ops, ordered=False)
+
+    def _snapshot_unversioned(self, db: Any) -> None:
+        """Record the current state of projects saved before version history existed."""
+        versioned = set(db["project_versions"].distinct("project_id"))
+        fields = {"version": 1, "file_count": 1, "total_bytes": 1, "updated_at": 1}
+        for doc in db["projects"].find({}, fields):
+            if str(doc["_id"]) not in versioned:
+                self._snapshot(db, str(doc["_id"]), doc, as_dt(doc.get("updated_at")))
+
+    def session(self) -> Iterator[Any]:
+        yield self.db
+
+    # Drafts
+
+    def save_draft(self, db: Any, draft_data: Dict[str, Any]) -> str:
+        doc = {
+            "prompt": draft_data["prompt"],
+            "blueprint_id": draft_data.get("blueprint_id"),
+            "settings": draft_data.get("settings"),
+            "result": draft_data["result"],
+            "created_at": as_dt(draft_data.get("created_at")),
+        }
+        return str(db["drafts"].insert_one(doc).inserted_id)
+
+    def get_draft(self, db: Any, draft_id: str) -> Optional[Dict[str, Any]]:
+        oid = _maybe_object_id(draft_id)
+        if oid is None:
+            return None
+        doc = db["drafts"].find_one({"_id": oid})
+        return _draft(doc) if doc else None
+
+    def get_all_drafts(self, db: Any, limit: int) -> List[Dict[str, Any]]:
+        return [_draft(d) for d in db["drafts"].find({}).sort("created_at", -1).limit(int(limit))]
+
+    # Users
+
+    def create_user(self, db: Any, *, email: str, name: Optional[str], password_hash: str) -> Dict[str, Any]:
+        doc = {
+            "email": email,
+            "name": name,
+            "password_hash": password_hash,
+            "google_id": None,
+            "avatar_url": None,
+            "created_at": datetime.utcnow(),
+        }
+        res = db["users"].insert_one(doc)
+        return public_user(res.inserted_id, email, name, None)
+
+    def create_or_get_google_user(
+        self, db: Any, *, google_id: str, email: str, name: Optional[str], avatar_url: Optional[str]
+    ) -> Dict[str, Any]:
+        users = db["users"]
+        doc = users.find_one({"google_id": google_id}, _USER_FIELDS)
+        if doc:
+            updates: Dict[str, Any] = {}
+            if name and doc.get("name") != name:
+                updates["name"] = name
+            if email and doc.get("email") != email:
+                updates["email"] = email
+            if avatar_url and doc.get("avatar_url") != avatar_url:
+                updates["avatar_url"] = avatar_url
+            if updates:
+                users.update_one({"_id": doc["_id"]}, {"$set": updates})
+                doc.update(updates)
+            return public_user(doc["_id"], doc.get("email", email), doc.get("name"), doc.get("avatar_url"))
+
+        # Link by email if exists
+        existing = users.find_one({"email": email}, _USER_FIELDS)
+        if existing:
+            updates = {"google_id": google_id}
+            if name:
+                updates["name"] = name
+            if avatar_url:
+                updates["avatar_url"] = avatar_url
+            users.update_one({"_id": existing["_id"]}, {"$set": updates})
+            existing.update(updates)
+            return _user(existing)
+
+        new_doc = {
+            "email": email,
+            "name": name,
+            "password_hash": None,
+            "google_id": google_id,
+            "avatar_url": avatar_url,
+            "created_at": datetime.utcnow(),
+        }
+        res = users.insert_one(new_doc)
+        return public_user(res.inserted_id, email, name, avatar_url)
+
+    def get_password_login(self, db: Any, email: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        doc = db["users"].find_one({"email": email}, {**_USER_FIELDS, "password_hash": 1})
+        if not doc or not doc.get("password_hash"):
+            return None
+        return _user(doc), str(doc["password_hash"])
+
+    def get_user_by_id(self, db: Any, user_id: str) -> Optional[Dict[str, Any]]:
+        oid = _maybe_object_id(user_id)
+        if oid is None:
+            return None
+        doc = db["users"].find_one({"_id": oid}, _USER_FIELDS)
+        return _user(doc) if doc else None
+
+    def get_user_by_email(self, db: Any, email: str) -> Optional[Dict[str, Any]]:
+        doc = db["users"].find_one({"email": email}, _USER_FIELDS)
+        return _user(doc) if doc else None
+
+    # Auth sessions
+
+    def create_session(self, db: Any, *, sid: str, user_id: str, now: datetime, expires_at: datetime) -> Dict[str, Any]:
+        db["auth_sessions"].insert_one(
+            {
+                "_id": sid,
+                "user_id": user_id,
+                "created_at": now,
+                "last_seen_at": now,
+                "expires_at": expires_at,
+            }
+        )
+        return {"id": sid, "user_id": user_id, "expires_at": expires_at}
+
+    def get_session(self, db: Any, sid: str, now: datetime) -> Optional[Dict[str, Any]]:
+        doc = db["auth_sessions"].find_one({"_id": sid}, {"user_id": 1, "expires_at": 1})
+        if not doc:
+            return None
+        expires_at = doc.get("expires_at")
+        if isinstance(expires_at, datetime) and expires_at < now:
+            db["auth_sessions"].delete_one({"_id": sid})
+            return None
+        return {"id": sid, "user_id": cast(str, doc.get("user_id")), "expires_at": expires_at}
+
+    def delete_session(self, db: Any, sid: str, now: datetime) -> Optional[datetime]:
+        doc = db["auth_sessions"].find_one_and_delete({"_id": sid}, {"expires_at": 1})
+        if not doc:
+            return None
+        expires_at = as_dt(doc.get("expires_at"))
+        db["auth_revocations"].update_one(
+            {"_id": sid}, {"$set": {"revoked_at": now, "expires_at": expires_at}}, upsert=True
+        )
+        return expires_at
+
+    def flush_last_seen(self, sids: List[str], seen_at: datetime) -> None:
+        for i in range(0, len(sids), 500):
+            self.db["auth_sessions"].update_many({"_id": {"$in": sids[i : i + 500]}}, {"$set": {"last_seen_at": seen_at}})
+
+    def fetch_revocations(self, since: Optional[datetime], now: datetime) -> List[Tuple[str, datetime, datetime]]:
+        query: Dict[str, Any] = {"expires_at": {"$gt": now}}
+        if since is not None:
+            query["revoked_at"] = {"$gt": since}
+        docs = self.db["auth_revocations"].find(query, {"expires_at": 1, "revoked_at": 1})
+        return [(str(d["_id"]), as_dt(d.get("expires_at")), as_dt(d.get("revoked_at"))) for d in docs]
+
+    # Projects
+
+    def _sync_files(
+        self, db: Any, pid: str, upserts: Dict[str, str], deletes: List[str], *, replace: bool, now: datetime
+    ) -> Optional[Tuple[int, int]]:
+        """Point `pid`'s files at new content; returns the (file count, bytes) delta, None if unchanged."""
+        write = self._diff_files(db, pid, upserts, deletes, replace=replace, now=now)
+        return write() if write is not None else None
+
+    def _diff_files(
+        self, db: Any, pid: str, upserts: Dict[str, str], deletes: List[str], *, replace: bool, now: datetime
+    ) -> Optional[Callable[[], Tuple[int, int]]]:
+        """None if `pid`'s files already match; else a function that writes the change and returns the delta."""
+        new = {path: content_hash(content) for path, content in upserts.items()}
+        query: Dict[str, Any] = {"project_id": pid}
+        if not replace:
+            query["path"] = {"$in": list(new) + list(deletes)}
+        old = {d["path"]: (d["hash"], d["size"]) for d in db["project_files"].find(query, {"path": 1, "hash": 1, "size": 1})}
+        changed = [p for p, h in new.items() if old.get(p, ("",))[0] != h]
+        removed = [p for p in (set(old) - set(new) if replace else deletes) if p in old and p not in new]
+        if not changed and not removed:
+            return None
+        return lambda: self._write_files(db, pid, upserts, new, old, changed, removed, now)
+
+    def _write_files(
+        self,
+        db: Any,
+        pid: str,
+        upserts: Dict[str, str],
+        new: Dict[str, str],
+        old: Dict[str, Tuple[str, int]],
+        changed: List[str],
+        removed: List[str],
+        now: datetime,
+    ) -> Tuple[int, int]:
+        from pymongo import DeleteMany, InsertOne, UpdateOne
+
+        raw = {p: upserts[p].encode("utf-8") for p in changed}
+        sizes = {p: len(b) for p, b in raw.items()}
+        blobs = {new[p]: p for p in changed}
+        if blobs:
+            ops: List[Any] = []
+            for h, p in blobs.items():
+                codec, data = blob_codec.encode(raw[p])
+                ops.append(
+                    UpdateOne(
+                        {"_id": h},
+                        {
+                            "$setOnInsert": {
+                                "codec": codec,
+                                "data": data,
+                                "size": sizes[p],
+                                "terms": code_search.index_terms(upserts[p]),
+                            },
+                            "$set": {"touched_at": now},
+                        },
+                        upsert=True,
+                    )
+                )
+            db["project_blobs"].bulk_write(ops, ordered=False)
+        touched = changed + removed
+        ops = [DeleteMany({"project_id": pid, "path": {"$in": touched}})]
+        ops += [InsertOne({"project_id": pid, "path": p, "hash": new[p], "size": sizes[p]}) for p in changed]
+        db["project_files"].bulk_write(ops, ordered=True)
+        # Replaced blobs stay referenced by the previous version; _snapshot's
+        # pruning collects them once that version goes.
+        count_delta = len([p for p in changed if p not in old]) - len(removed)
+        bytes_delta = sum(sizes.values()) - sum(old[p][1] for p in touched if p in old)
+        return count_delta, bytes_delta
+
+    def save_project(
+        self, db: Any, *, user_id: str, name: str, files: List[Dict[str, Any]], description: Optional[str], now: datetime
+    ) -> str:
+        return self._insert_project(db, user_id, name, description, files, now, now)
+
+    def _insert_project(
+        self,
+        db: Any,
+        user_id: str,
+        name: str,
+        description: Optional[str],
+        files: List[Dict[str, Any]],
+        created_at: datetime,
+        updated_at: datetime,
+    ) -> str:
+        contents = {str(f.get("path") or ""): f.get("content") or "" for f in files}
+        count, size = file_stats([{"content": c} for c in contents.values()])
+        doc = {
+            "user_id": user_id,
+            "name": name,
+            "description": description,
+            "file_count": count,
+            "total_bytes": size,
+            "version": 1,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+        pid = str(db["projects"].insert_one(doc).inserted_id)
+        # touched_at drives blob GC, so it is the real time even for imported timestamps.
+        self._sync_files(db, pid, contents, [], replace=True, now=datetime.utcnow())
+        self._snapshot(db, pid, doc, updated_at)
+        return pid
+
+    def get_project_stored(
+        self, db: Any, project_id: str, user_id: str
+    ) -> Optional[Tuple[Dict[str, Any], List[StoredFile]]]:
+        oid = _maybe_object_id(project_id)
+        if oid is None:
+            return None
+        doc = db["projects"].find_one({"_id": oid, "user_id": user_id}, _PROJECT_FIELDS)
+        if not doc:
+            return None
+        refs = db["project_files"].find({"project_id": project_id}, {"_id": 0, "path": 1, "hash": 1}).sort("path", 1)
+        refs = list(refs)
+        blobs = self.get_blobs_stored(db, list({r["hash"] for r in refs}))
+        return _project(doc), [(r["path"], *blobs.get(r["hash"], (None, ""))) for r in refs]
+
+    def get_project_manifest(
+        self, db: Any, project_id: str, user_id: str
+    ) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+        oid = _maybe_object_id(project_id)
+        if oid is None:
+            return None
+        doc = db["projects"].find_one({"_id": oid, "user_id": user_id}, {"version": 1})
+        if doc is None:
+            return None
+        refs = db["project_files"].find({"project_id": project_id}, {"_id": 0, "path": 1, "hash": 1, "size": 1})
+        return doc.get("version") or 1, list(refs.sort("path", 1))
+
+    def get_project_file_ref(self, db: Any, project_id: str, user_id: str, path: str) -> Optional[Dict[str, Any]]:
+        oid = _maybe_object_id(project_id)
+        if oid is None or db["projects"].find_one({"_id": oid, "user_id": user_id}, {"_id": 1}) is None:
+            return None
+        return db["project_files"].find_one({"project_id": project_id, "path": path}, {"_id": 0, "hash": 1, "size": 1})
+
+    def list_project_summaries(
+        self, db: Any, user_id: str, limit: int, after: Optional[Tuple[datetime, str]] = None
+    ) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"user_id": user_id}
+        if after is not None:
+            after_id = _maybe_object_id(after[1])
+            if after_id is None:
+                return []
+            # The range on updated_at bounds the index scan; the $or only drops
+            # the rows of the boundary timestamp already returned. Index order
+            # serves the sort either way.
+            query["updated_at"] = {"$lte": after[0]}
+            query["$or"] = [{"updated_at": {"$lt": after[0]}}, {"_id": {"$lt": after_id}}]
+        docs = db["projects"].find(query, _SUMMARY_FIELDS).sort([("updated_at", -1), ("_id", -1)]).limit(int(limit))
+        return [_summary(d) for d in docs]
+
+    def update_project(self, db: Any, project_id: str, user_id: str, values: Dict[str, Any]) -> bool:
+        oid = _maybe_object_id(project_id)
+        if oid is None:
+            return False
+        res = db["projects"].update_one({"_id": oid, "user_id": user_id}, {"$set": values})
+        return bool(res.matched_count)
+
+    def write_project_files(
+        self,
+        db: Any,
+        project_id: str,
+        user_id: str,
+        *,
+        upserts: Dict[str, str],
+        deletes: List[str],
+        replace: bool,
+        base_version: Optional[int],
+        meta: Dict[str, Any],
+        now: datetime,
+    ) -> Optional[Dict[str, Any]]:
+        oid = _maybe_object_id(project_id)
+        if oid is None:
+            return None
+
+        def prepare() -> Optional[Callable[[], Dict[str, Any]]]:
+            write = self._diff_files(db, project_id, upserts, deletes, replace=replace, now=now)
+            if write is None:
+                return None
+
+            def apply() -> Dict[str, Any]:
+                count_delta, bytes_delta = write()
+                return {"$inc": {"file_count": count_delta, "total_bytes": bytes_delta}}
+
+            return apply
+
+        return self._write(db, oid, user_id, base_version=base_version, meta=meta, now=now, prepare=prepare)
+
+    def _write(
+        self,
+        db: Any,
+        oid: Any,
+        user_id: str,
+        *,
+        base_version: Optional[int],
+        meta: Dict[str, Any],
+        now: datetime,
+        prepare: Any,
+    ) -> Optional[Dict[str, Any]]:
+        """Under the project's write lease: diff with `prepare()`, run the `apply()` it returned, bump the version
+        and snapshot.
+
+        `apply` changes the files and returns the counter update. When `prepare`
+        returns None the files are already as requested: no version is made, only
+        `meta` fields that differ are updated (and updated_at with them).
+        """
+        from bson import ObjectId
+        from pymongo import ReturnDocument
+
+        owned = {"_id": oid, "user_id": user_id}
+        token = ObjectId()
+        deadline = time.monotonic() + _WRITE_LEASE.total_seconds()
+        while True:
+            current = db["projects"].find_one(owned, {**_WRITE_FIELDS, **{k: 1 for k in meta}})
+            if current is None:
+                return None
+            version = current.get("version") or 1
+            if base_version is not None and version != base_version:
+                raise VersionConflict(version)
+            # No multi-document transactions (standalone servers have none): the
+            # lease keeps a second writer from diffing against files being rewritten.
+            clock = datetime.utcnow()
+            free = {"$or": [{"writer": None}, {"writer.until": {"$lt": clock}}]}
+            lease = {"$set": {"writer": {"id": token, "until": clock + _WRITE_LEASE}}}
+            if db["projects"].update_one({**owned, "version": current.get("version"), **free}, lease).modified_count:
+                break
+            if time.monotonic() > deadline:
+                raise VersionConflict(version)
+            time.sleep(0.01)
+        held = {"_id": oid, "writer.id": token}
+        try:
+            apply = prepare()
+            if apply is None:
+                changed = {k: v for k, v in meta.items() if current.get(k) != v}
+                if changed:
+                    db["projects"].update_one(held, {"$set": {**changed, "updated_at": now}})
+                    current["updated_at"] = now
+                return _write_result(oid, current)
+            update = apply()
+            update.setdefault("$set", {}).update({"version": version + 1, "updated_at": now, **meta})
+            doc = db["projects"].find_one_and_update(
+                held, update, projection=_WRITE_FIELDS, return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                # The lease lapsed and another writer took over.
+                raise VersionConflict(version)
+            self._snapshot(db, str(oid), doc, now)
+            return _write_result(oid, doc)
+        finally:
+            db["projects"].update_one(held, {"$unset": {"writer": ""}})
+
+    def delete_project(self, db: Any, project_id: str, user_id: str) -> bool:
+        oid = _maybe_object_id(project_id)
+        if oid is None:
+            return False
+        if not db["projects"].delete_one({"_id": oid, "user_id": user_id}).deleted_count:
+            return False
+        hashes = set(db["project_files"].distinct("hash", {"project_id": project_id}))
+        hashes.update(db["project_versions"].distinct("files.hash", {"project_id": project_id}))
+        db["project_files"].delete_many({"project_id": project_id})
+        db["project_versions"].delete_many({"project_id": project_id})
+        self._collect_blobs(db, list(hashes), datetime.utcnow())
+        return True
+
+    def _collect_blobs(self, db: Any, hashes: List[str], now: datetime) -> None:
+        """Delete blobs among `hashes` that no file or kept version references."""
+        if not hashes:
+            return
+        live = set(db["project_files"].distinct("hash", {"hash": {"$in": hashes}}))
+        live.update(db["project_versions"].distinct("files.hash", {"files.hash": {"$in": hashes}}))
+        dead = [h for h in hashes if h not in live]
+        if dead:
+            db["project_blobs"].delete_many({"_id": {"$in": dead}, "touched_at": {"$lt": now - _BLOB_GRACE}})
+
+    def search_project_files(
+        self, db: Any, user_id: str, query: str, project_id: Optional[str], limit: int
+    ) -> List[Dict[str, Any]]:
+        owned: Dict[str, Any] = {"user_id": user_id}
+        if project_id is not None:
+            oid = _maybe_object_id(project_id)
+            if oid is None:
+                return []
+            owned["_id"] = oid
+        projects = {str(d["_id"]): d for d in db["projects"].find(owned, {"name": 1, "updated_at": 1})}
+        if not projects:
+            return []
+        in_projects: Dict[str, Any] = {"project_id": {"$in": list(projects)}}
+        ref_fields = {"project_id": 1, "path": 1, "hash": 1}
+        terms = code_search.query_terms(query)
+        if terms:
+            # The text index matches whole words only; narrow to blobs with every
+            # word of the query, then check the actual substring below.
+            search = " ".join(f'"{t}"' for t in terms)
+            hashes = db["project_files"].distinct("hash", in_projects)
+            matched = db["project_blobs"].distinct("_id", {"$text": {"$search": search}, "_id": {"$in": hashes}})
+            refs = list(db["project_files"].find({**in_projects, "hash": {"$in": matched}}, ref_fields))
+        else:
+            refs = list(db["project_files"].find(in_projects, ref_fields))
+        refs.sort(key=lambda r: r["path"])
+        refs.sort(key=lambda r: as_dt(projects[r["project_id"]].get("updated_at")), reverse=True)
+        needle = query.lower()
+        out: List[Dict[str, Any]] = []
+        for i in range(0, len(refs), 100):
+            chunk = refs[i : i + 100]
+            blobs = self.get_blobs_stored(db, list({r["hash"] for r in chunk}))
+            for r in chunk:
+                content = stored_text(*blobs.get(r["hash"], (None, "")))
+                if needle not in content.lower():
+                    continue
+                name = projects[r["project_id"]].get("name")
+                out.append({"project_id": r["project_id"], "project_name": name, "path": r["path"], "content": content})
+                if len(out) >= limit:
+                    return out
+        return out
+
+    # Bulk transfer
+
+    def list_project_keys(
+        self, db: Any, user_id: Optional[str], after: Optional[str], limit: int
+    ) -> List[Tuple[str, str]]:
+        query: Dict[str, Any] = {}
+        if user_id is not None:
+            query["user_id"] = user_id
+        if after is not None:
+            after_id = _maybe_object_id(after)
+            if after_id is None:
+                return []
+            query["_id"] = {"$gt": after_id}
+        docs = db["projects"].find(query, {"user_id": 1}).sort("_id", 1).limit(int(limit))
+        return [(str(d["_id"]), d.get("user_id")) for d in docs]
+
+    def import_projects(self, db: Any, user_id: str, projects: List[Dict[str, Any]], now: datetime) -> List[str]:
+        # No multi-document transaction here: a failure part-way leaves the
+        # projects inserted before it, like a sequence of POST /api/projects.
+        return [
+            self._insert_project(
+                db,
+                user_id,
+                p["name"],
+                p.get("description"),
+                p.get("files") or [],
+                p.get("created_at") or now,
+                p.get("updated_at") or now,
+            )
+            for p in projects
+        ]
+
+    # Version history
+
+    def _snapshot(self, db: Any, pid: str, doc: Dict[str, Any], now: datetime) -> None:
+        """Record `pid`'s current files as version doc["version"] and drop versions beyond history_limit."""
+        version = doc.get("version") or 1
+        files = list(db["project_files"].find({"project_id": pid}, {"_id": 0, "path": 1, "hash": 1, "size": 1}))
+        db["project_versions"].insert_one(
+            {
+                "project_id": pid,
+                "version": version,
+                "file_count": doc.get("file_count") or 0,
+                "total_bytes": doc.get("total_bytes") or 0,
+                "created_at": now,
+                "files": files,
+            }
+        )
+        cutoff = version - self.history_limit
+        if self.history_limit and cutoff >= 1:
+            pruned = {"project_id": pid, "version": {"$lte": cutoff}}
+            hashes = db["project_versions"].distinct("files.hash", pruned)
+            db["project_versions"].delete_many(pruned)
+            self._collect_blobs(db, hashes, now)
+
+    def _owned_version(
+        self, db: Any, project_id: str, user_id: str, version: int, fields: Optional[Dict[str, Any]] = None
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(project doc, version doc) if the user owns the project and the version is kept."""
+        oid = _maybe_object_id(project_id)
+        if oid is None:
+            return None
+        project = db["projects"].find_one({"_id": oid, "user_id": user_id}, {"name": 1, "description": 1})
+        if project is None:
+            return None
+        ver = db["project_versions"].find_one({"project_id": project_id, "version": int(version)}, fields)
+        return (project, ver) if ver is not None else None
+
+    def list_project_versions(
+        self, db: Any, project_id: str, user_id: str, limit: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        oid = _maybe_object_id(project_id)
+        if oid is None or db["projects"].find_one({"_id": oid, "user_id": user_id}, {"_id": 1}) is None:
+            return None
+        docs = (
+            db["project_versions"]
+            .find({"project_id": project_id}, {"files": 0})
+            .sort("version", -1)
+            .limit(int(limit))
+        )
+        return [
+            {
+                "version": d["version"],
+                "file_count": d.get("file_count") or 0,
+                "total_bytes": d.get("total_bytes") or 0,
+                "created_at": iso(d.get("created_at")),
+            }
+            for d in docs
+        ]
+
+    def get_version_files(
+        self, db: Any, project_id: str, user_id: str, version: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        owned = self._owned_version(db, project_id, user_id, version, {"files": 1})
+        if owned is None:
+            return None
+        files = [{"path": f["path"], "hash": f["hash"], "size": f["size"]} for f in owned[1].get("files") or []]
+        return sorted(files, key=lambda f: f["path"])
+
+    def get_blobs_stored(self, db: Any, hashes: List[str]) -> Dict[str, Tuple[Optional[str], Any]]:
+        if not hashes:
+            return {}
+        docs = db["project_blobs"].find({"_id": {"$in": list(hashes)}}, _BLOB_FIELDS)
+        return {b["_id"]: _stored(b) for b in docs}
+
+    def storage_stats(self, db: Any) -> List[Dict[str, Any]]:
+        pipeline = [
+            {
+                "$group": {
+                    "_id": "$codec",
+                    "blobs": {"$sum": 1},
+                    "raw_bytes": {"$sum": "$size"},
+                    # Pre-codec blobs hold plain `content`; count those at their raw size.
+                    "stored_bytes": {"$sum": {"$ifNull": [{"$binarySize": "$data"}, "$size"]}},
+                }
+            }
+        ]
+        return [
+            {
+                "codec": d["_id"] or "legacy",
+                "blobs": d["blobs"],
+                "raw_bytes": int(d["raw_bytes"]),
+                "stored_bytes": int(d["stored_bytes"]),
+            }
+            for d in db["project_blobs"].aggregate(pipeline)
+        ]
+
+    def restore_project_version(
+        self, db: Any, project_id: str, user_id: str, version: int, *, base_version: Optional[int], now: datetime
+    ) -> Optional[Dict[str, Any]]:
+        owned = self._owned_version(db, project_id, user_id, version)
+        if owned is None:
+            return None
+        project, source = owned
+
+        def apply() -> Dict[str, Any]:
+            self._copy_version_files(db, project_id, source)
+            counters = {"file_count": source.get("file_count") or 0, "total_bytes": source.get("total_bytes") or 0}
+            return {"$set": counters}
+
+        def prepare() -> Optional[Callable[[], Dict[str, Any]]]:
+            current = {(d["path"], d["hash"]) for d in db["project_files"].find({"project_id": project_id})}
+            return None if current == {(f["path"], f["hash"]) for f in source.get("files") or []} else apply
+
+        return self._write(db, project["_id"], user_id, base_version=base_version, meta={}, now=now, prepare=prepare)
+
+    def _copy_version_files(self, db: Any, pid: str, source: Dict[str, Any]) -> None:
+        from pymongo import DeleteMany, InsertOne
+
+        ops: List[Any] = [DeleteMany({"project_id": pid})]
+        ops += [
+            InsertOne({"project_id": pid, "path": f["path"], "hash": f["hash"], "size": f["size"]})
+            for f in source.get("files") or []
+        ]
+        db["project_files"].bulk_write(ops, ordered=True)
+
+    def fork_project_version(
+        self, db: Any, project_id: str, user_id: str, version: int, *, name: Optional[str], now: datetime
+    ) -> Optional[Dict[str, Any]]:
+        owned = self._owned_version(db, project_id, user_id, version)
+        if owned is None:
+            return None
+        project, source = owned
+        doc = {
+            "user_id": user_id,
+            "name": name or f"{project.get('name')} (v{source['version']})",
+            "description": project.get("description"),
+            "file_count": source.get("file_count") or 0,
+            "total_bytes": source.get("total_bytes") or 0,
+            "version": 1,
+            "created_at": now,
+            "updated_at": now,
+        }
+        pid = str(db["projects"].insert_one(doc).inserted_id)
+        self._copy_version_files(db, pid, source)
+        self._snapshot(db, pid, doc, now)
+        return {
+            "id": pid,
+            "version": 1,
+            "file_count": doc["file_count"],
+            "total_bytes": doc["total_bytes"],
+            "created_at": iso(now),
+            "updated_at": iso(now),
+        }
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.services import blob_codec
+
+# (path, codec, payload): a file's content as stored, decoded with stored_text()
+# only once something needs the text.
+StoredFile = Tuple[str, Optional[str], Any]
+
+
+class Repository:
+    """Storage operations behind app.database.database.
+
+    One implementation (SqlRepository or MongoRepository) is chosen from
+    DATABASE_URL when the process starts, so request handlers never test which
+    backend they are talking to. `db` is whatever `session()` yielded for the
+    request: a SQLAlchemy Session or a pymongo Database.
+
+    `history_limit` is how many versions of each project to keep (0 = all).
+
+    All users/projects are returned as plain dicts with string ids and ISO
+    timestamps; both implementations must produce identical shapes.
+    """
+
+    history_limit: int = 0
+
+    def init(self) -> None:
+        """Create tables / indexes. Called once at startup."""
+        raise NotImplementedError
+
+    def session(self) -> Iterator[Any]:
+        """Per-request handle (generator, used by the get_db dependency)."""
+        raise NotImplementedError
+
+    # Drafts
+
+    def save_draft(self, db: Any, draft_data: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def get_draft(self, db: Any, draft_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get_all_drafts(self, db: Any, limit: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # Users
+
+    def create_user(self, db: Any, *, email: str, name: Optional[str], password_hash: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def create_or_get_google_user(
+        self, db: Any, *, google_id: str, email: str, name: Optional[str], avatar_url: Optional[str]
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_password_login(self, db: Any, email: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        raise NotImplementedError
+
+    def get_user_by_id(self, db: Any, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get_user_by_email(self, db: Any, email: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # Auth sessions
+
+    def create_session(self, db: Any, *, sid: str, user_id: str, now: datetime, expires_at: datetime) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_session(self, db: Any, sid: str, now: datetime) -> Optional[Dict[str, Any]]:
+        """The live session `sid` (expired ones are deleted and reported missing)."""
+        raise NotImplementedError
+
+    def delete_session(self, db: Any, sid: str, now: datetime) -> Optional[datetime]:
+        """Delete `sid` and record its revocation; returns its expiry if it existed."""
+        raise NotImplementedError
+
+    def flush_last_seen(self, sids: List[str], seen_at: datetime) -> None:
+        raise NotImplementedError
+
+    def fetch_revocations(self, since: Optional[datetime], now: datetime) -> List[Tuple[str, datetime, datetime]]:
+        raise NotImplementedError
+
+    # Projects
+    #
+    # File contents are content-addressed: a project's files are (path -> hash)
+    # references to shared blobs, so writes only touch the files that changed.
+
+    def save_project(
+        self, db: Any, *, user_id: str, name: str, files: List[Dict[str, Any]], description: Optional[str], now: datetime
+    ) -> str:
+        raise NotImplementedError
+
+    def get_project_stored(
+        self, db: Any, project_id: str, user_id: str
+    ) -> Optional[Tuple[Dict[str, Any], List[StoredFile]]]:
+        """(metadata incl. `version`, files in path order), contents still as stored."""
+        raise NotImplementedError
+
+    def get_project(self, db: Any, project_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Project metadata, `version` and `files` (path order)."""
+        stored = self.get_project_stored(db, project_id, user_id)
+        if stored is None:
+            return None
+        meta, files = stored
+        meta["files"] = [{"path": path, "content": stored_text(codec, payload)} for path, codec, payload in files]
+        return meta
+
+    def get_project_manifest(
+        self, db: Any, project_id: str, user_id: str
+    ) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+        """(version, [{"path", "hash", "size"}] in path order) without reading any content."""
+        raise NotImplementedError
+
+    def get_project_file_ref(self, db: Any, project_id: str, user_id: str, path: str) -> Optional[Dict[str, Any]]:
+        """{"hash", "size"} of one file of an owned project; None if either doesn't exist."""
+        raise NotImplementedError
+
+    def list_project_summaries(
+        self, db: Any, user_id: str, limit: int, after: Optional[Tuple[datetime, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Newest-first project metadata without file contents.
+
+        `after` is the (updated_at, id) of the last row of the previous page.
+        Rows carry `file_count`/`total_bytes`, plus `updated_dt` for the next cursor.
+        """
+        raise NotImplementedError
+
+    def update_project(self, db: Any, project_id: str, user_id: str, values: Dict[str, Any]) -> bool:
+        """Set metadata `values` on an owned project; False if not found/owned."""
+        raise NotImplementedError
+
+    def write_project_files(
+        self,
+        db: Any,
+        project_id: str,
+        user_id: str,
+        *,
+        upserts: Dict[str, str],
+        deletes: List[str],
+        replace: bool,
+        base_version: Optional[int],
+        meta: Dict[str, Any],
+        now: datetime,
+    ) -> Optional[Dict[str, Any]]:
+        """Apply file changes (path -> content upserts, path deletes) and `meta` in one write.
+
+        With `replace`, `upserts` is the complete file set and every other path
+        is removed. Unchanged files (same hash) are not rewritten. With
+        `base_version`, raises VersionConflict unless the project is still at it.
+        Returns {"id", "version", "file_count", "total_bytes", "created_at", "updated_at"},
+        or None if the project is not found/owned.
+        """
+        raise NotImplementedError
+
+    def delete_project(self, db: Any, project_id: str, user_id: str) -> bool:
+        raise NotImplementedError
+
+    def search_project_files(
+        self, db: Any, user_id: str, query: str, project_id: Optional[str], limit: int
+    ) -> List[Dict[str, Any]]:
+        """Up to `limit` files of the user's projects (or just `project_id`) likely to contain `query`.
+
+        Rows are {"project_id", "project_name", "path", "content"}, most recently
+        updated projects first. The index may return files that do not actually
+        contain `query` (callers check each line); see app.services.code_search.
+        """
+        raise NotImplementedError
+
+    # Bulk transfer (export / import / backend migration)
+
+    def list_project_keys(
+        self, db: Any, user_id: Optional[str], after: Optional[str], limit: int
+    ) -> List[Tuple[str, str]]:
+        """(project id, owner) in id order, after `after`; all owners when `user_id` is None."""
+        raise NotImplementedError
+
+    def import_projects(self, db: Any, user_id: str, projects: List[Dict[str, Any]], now: datetime) -> List[str]:
+        """Insert projects ({"name", "description", "files", optional "created_at"/"updated_at"}) in one batch."""
+        raise NotImplementedError
+
+    # Version history
+    #
+    # Every write snapshots the resulting file set as a new version; only the
+    # newest `history_limit` versions are kept (0 keeps all). Snapshots reference
+    # the same blobs as the live files, so restoring or forking copies no content.
+
+    def list_project_versions(
+        self, db: Any, project_id: str, user_id: str, limit: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Newest-first {"version", "file_count", "total_bytes", "created_at"}; None if not found/owned."""
+        raise NotImplementedError
+
+    def get_version_files(
+        self, db: Any, project_id: str, user_id: str, version: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """{"path", "hash", "size"} of `version` in path order; None if it or the project doesn't exist."""
+        raise NotImplementedError
+
+    def get_blobs_stored(self, db: Any, hashes: List[str]) -> Dict[str, Tuple[Optional[str], Any]]:
+        """hash -> (codec, payload) for the given content hashes."""
+        raise NotImplementedError
+
+    def get_blobs(self, db: Any, hashes: List[str]) -> Dict[str, str]:
+        """hash -> content for the given content hashes."""
+        stored = self.get_blobs_stored(db, hashes)
+        return {h: stored_text(codec, payload) for h, (codec, payload) in stored.items()}
+
+    def storage_stats(self, db: Any) -> List[Dict[str, Any]]:
+        """Per codec: {"codec", "blobs", "raw_bytes", "stored_bytes"} over all stored file content."""
+        raise NotImplementedError
+
+    def restore_project_version(
+        self, db: Any, project_id: str, user_id: str, version: int, *, base_version: Optional[int], now: datetime
+    ) -> Optional[Dict[str, Any]]:
+        """Make `version`'s files current again, as a new version.
+
+        Same result and errors as write_project_files; None if the project or version doesn't exist.
+        """
+        raise NotImplementedError
+
+    def fork_project_version(
+        self, db: Any, project_id: str, user_id: str, version: int, *, name: Optional[str], now: datetime
+    ) -> Optional[Dict[str, Any]]:
+        """A new project of the same owner starting from `version`'s files (write_project_files result shape)."""
+        raise NotImplementedError
+
+
+class VersionConflict(Exception):
+    """The project changed since the client's base_version; carries the current version."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"project is at version {current_version}")
+        self.current_version = current_version
+
+
+def stored_text(codec: Optional[str], payload: Any) -> str:
+    """Text of a stored blob. Blobs from before the codec (codec None) are plain text."""
+    if codec is None:
+        return payload or ""
+    return blob_codec.decode_text(codec, payload)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def file_stats(files: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """(file count, total UTF-8 bytes of content) for a project's files."""
+    return len(files), sum(len((f.get("content") or "").encode("utf-8")) for f in files)
+
+
+def public_user(user_id: Any, email: Any, name: Any, avatar_url: Any) -> Dict[str, Any]:
+    return {"id": str(user_id), "email": email, "name": name, "avatar_url": avatar_url}
+
+
+def as_dt(v: Any) -> datetime:
+    if isinstance(v, datetime):
+        return v
+    if isinstance(v, str) and v:
+        try:
+            return datetime.fromisoformat(v)
+        except Exception:
+            pass
+    return datetime.utcnow()
+
+
+def iso(v: Any) -> str:
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return datetime.utcnow().isoformat()
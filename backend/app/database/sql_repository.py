@@ -0,0 +1,993 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Integer, and_, bindparam, delete, exists, func, insert, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import (
+    AuthRevocation,
+    AuthSession,
+    Base,
+    Draft,
+    Project,
+    ProjectBlob,
+    ProjectFileRef,
+    ProjectVersion,
+    ProjectVersionFile,
+    User,
+)
+from app.database.repository import (
+    Repository,
+    StoredFile,
+    VersionConflict,
+    content_hash,
+    file_stats,
+    iso,
+    public_user,
+    stored_text,
+)
+from app.services import blob_codec, code_search
+from app.services.tracing import span
+
+# Statements are built once; SQLAlchemy's compiled cache then reuses their SQL.
+_projects = Project.__table__
+_USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+_USER_BY_ID = select(User).where(User.id == bindparam("id"))
+_USER_BY_GOOGLE_ID = select(User).where(User.google_id == bindparam("google_id"))
+_SESSION_BY_ID = select(AuthSession).where(AuthSession.id == bindparam("sid"))
+_TOUCH_SESSIONS = (
+    update(AuthSession)
+    .where(AuthSession.id.in_(bindparam("sids", expanding=True)))
+    .values(last_seen_at=bindparam("seen_at"))
+)
+_LIVE_REVOCATIONS = select(AuthRevocation.sid, AuthRevocation.expires_at, AuthRevocation.revoked_at).where(
+    AuthRevocation.expires_at > bindparam("now")
+)
+_NEW_REVOCATIONS = _LIVE_REVOCATIONS.where(AuthRevocation.revoked_at > bindparam("since"))
+_PURGE_REVOCATIONS = delete(AuthRevocation).where(AuthRevocation.expires_at <= bindparam("now"))
+# Bind names must differ from column names to be usable in UPDATE ... WHERE.
+_OWNED = (_projects.c.id == bindparam("pid"), _projects.c.user_id == bindparam("owner"))
+_files = ProjectFileRef.__table__
+_blobs = ProjectBlob.__table__
+_INSERT_PROJECT = insert(_projects)
+_SELECT_PROJECT = select(_projects).where(*_OWNED)
+_DELETE_PROJECT = delete(_projects).where(*_OWNED)
+_PROJECT_VERSION = select(_projects.c.version).where(*_OWNED)
+# A no-op UPDATE that makes a write hold the project (SQLite's write lock, a row
+# lock elsewhere) before it diffs, so concurrent writers take turns.
+_LOCK_PROJECT = update(_projects).where(*_OWNED).values(version=_projects.c.version)
+_PROJECT_FILES = (
+    select(_files.c.path, _blobs.c.content, _blobs.c.codec, _blobs.c.data)
+    .join(_blobs, _blobs.c.hash == _files.c.hash)
+    .where(_files.c.project_id == bindparam("pid"))
+    .order_by(_files.c.path)
+)
+_FILE_REFS = select(_files.c.path, _files.c.hash, _files.c.size).where(_files.c.project_id == bindparam("pid"))
+_MANIFEST = _FILE_REFS.order_by(_files.c.path)
+# Ownership and the file in one lookup (join on the projects primary key).
+_OWNED_FILE_REF = (
+    select(_files.c.hash, _files.c.size)
+    .join(_projects, _projects.c.id == _files.c.project_id)
+    .where(*_OWNED, _files.c.path == bindparam("path"))
+)
+_FILE_REFS_AT = _FILE_REFS.where(_files.c.path.in_(bindparam("paths", expanding=True)))
+_DELETE_FILE_REFS = delete(_files).where(
+    _files.c.project_id == bindparam("pid"), _files.c.path.in_(bindparam("paths", expanding=True))
+)
+_DELETE_ALL_FILE_REFS = delete(_files).where(_files.c.project_id == bindparam("pid"))
+_INSERT_FILE_REF = insert(_files)
+_EXISTING_BLOBS = select(_blobs.c.hash).where(_blobs.c.hash.in_(bindparam("hashes", expanding=True)))
+# Writers and _collect_blobs lock the blob rows they are about to rely on or
+# delete, so a collection never removes a blob a concurrent write just pointed
+# at. SQLite ignores FOR UPDATE: there a write transaction already excludes
+# every other writer.
+_SHARE_BLOBS = _EXISTING_BLOBS.with_for_update(read=True)
+_LOCK_BLOBS = _EXISTING_BLOBS.with_for_update()
+_BLOBS = select(_blobs.c.hash, _blobs.c.content, _blobs.c.codec, _blobs.c.data).where(
+    _blobs.c.hash.in_(bindparam("hashes", expanding=True))
+)
+_STORAGE_STATS = select(
+    _blobs.c.codec,
+    func.count(),
+    func.coalesce(func.sum(_blobs.c.size), 0),
+    # Pre-codec rows hold their text in `content`; count those at their raw size.
+    func.coalesce(func.sum(func.coalesce(func.length(_blobs.c.data), _blobs.c.size)), 0),
+).group_by(_blobs.c.codec)
+# Search (SQLite): an FTS5 trigram table holding each blob's text once. Its
+# rowid is derived from the content hash, so rows are found again without an
+# index on `hash` and survive VACUUM renumbering project_blobs.
+_FTS_TABLE = "project_blob_fts"
+_INSERT_FTS = text(f"INSERT OR REPLACE INTO {_FTS_TABLE}(rowid, hash, content) VALUES (:rowid, :hash, :content)")
+_DELETE_FTS = text(f"DELETE FROM {_FTS_TABLE} WHERE rowid IN :rowids").bindparams(bindparam("rowids", expanding=True))
+_SEARCH_SELECT = f"""
+    SELECT p.id AS project_id, p.name AS project_name, f.path AS path, s.content AS content
+    FROM {_FTS_TABLE} s
+    JOIN project_files f ON f.hash = s.hash
+    JOIN projects p ON p.id = f.project_id
+    WHERE {_FTS_TABLE} MATCH :q AND p.user_id = :owner"""
+_SEARCH_ORDER = " ORDER BY p.updated_at DESC, p.id, f.path LIMIT :limit"
+_SEARCH = text(_SEARCH_SELECT + _SEARCH_ORDER)
+_SEARCH_PROJECT = text(_SEARCH_SELECT + " AND p.id = :pid" + _SEARCH_ORDER)
+# Without FTS5 (other SQL backends) a search reads the user's files in order.
+_SEARCH_SCAN = (
+    select(
+        _projects.c.id.label("project_id"),
+        _projects.c.name.label("project_name"),
+        _files.c.path,
+        _blobs.c.content,
+        _blobs.c.codec,
+        _blobs.c.data,
+    )
+    .join(_files, _files.c.project_id == _projects.c.id)
+    .join(_blobs, _blobs.c.hash == _files.c.hash)
+    .where(_projects.c.user_id == bindparam("owner"))
+    .order_by(_projects.c.updated_at.desc(), _projects.c.id, _files.c.path)
+)
+_versions = ProjectVersion.__table__
+_vfiles = ProjectVersionFile.__table__
+# Drop blobs among `hashes` that no file or kept version references any more.
+_COLLECT_BLOBS = delete(_blobs).where(
+    _blobs.c.hash.in_(bindparam("hashes", expanding=True)),
+    ~exists().where(_files.c.hash == _blobs.c.hash),
+    ~exists().where(_vfiles.c.hash == _blobs.c.hash),
+)
+_VERSION_ROW = select(_versions).where(
+    _versions.c.project_id == bindparam("pid"), _versions.c.version == bindparam("ver")
+)
+_VERSIONS = (
+    select(_versions.c.version, _versions.c.file_count, _versions.c.total_bytes, _versions.c.created_at)
+    .where(_versions.c.project_id == bindparam("pid"))
+    .order_by(_versions.c.version.desc())
+    .limit(bindparam("limit"))
+)
+_VERSION_FILES = (
+    select(_vfiles.c.path, _vfiles.c.hash, _vfiles.c.size)
+    .where(_vfiles.c.project_id == bindparam("pid"), _vfiles.c.version == bindparam("ver"))
+    .order_by(_vfiles.c.path)
+)
+_INSERT_VERSION = insert(_versions)
+# Snapshots and restores are INSERT ... SELECT of (path, hash) rows; no content moves.
+_SNAPSHOT_FILES = insert(_vfiles).from_select(
+    ["project_id", "version", "path", "hash", "size"],
+    select(_files.c.project_id, bindparam("ver", type_=Integer), _files.c.path, _files.c.hash, _files.c.size).where(
+        _files.c.project_id == bindparam("pid")
+    ),
+)
+_COPY_VERSION_FILES = insert(_files).from_select(
+    ["project_id", "path", "hash", "size"],
+    select(bindparam("dest", type_=Integer), _vfiles.c.path, _vfiles.c.hash, _vfiles.c.size).where(
+        _vfiles.c.project_id == bindparam("pid"), _vfiles.c.version == bindparam("ver")
+    ),
+)
+_PRUNED_HASHES = (
+    select(_vfiles.c.hash)
+    .where(_vfiles.c.project_id == bindparam("pid"), _vfiles.c.version <= bindparam("cutoff"))
+    .distinct()
+)
+_PRUNE_VERSION_FILES = delete(_vfiles).where(
+    _vfiles.c.project_id == bindparam("pid"), _vfiles.c.version <= bindparam("cutoff")
+)
+_PRUNE_VERSIONS = delete(_versions).where(
+    _versions.c.project_id == bindparam("pid"), _versions.c.version <= bindparam("cutoff")
+)
+_ALL_VERSION_HASHES = select(_vfiles.c.hash).where(_vfiles.c.project_id == bindparam("pid")).distinct()
+_DELETE_ALL_VERSION_FILES = delete(_vfiles).where(_vfiles.c.project_id == bindparam("pid"))
+_DELETE_ALL_VERSIONS = delete(_versions).where(_versions.c.project_id == bindparam("pid"))
+# Returned by the version-bumping writes (see _write_result).
+_WRITE_RESULT = (
+    _projects.c.version,
+    _projects.c.file_count,
+    _projects.c.total_bytes,
+    _projects.c.created_at,
+    _projects.c.updated_at,
+)
+_SUMMARY_COLUMNS = (
+    _projects.c.id,
+    _projects.c.name,
+    _projects.c.description,
+    _projects.c.file_count,
+    _projects.c.total_bytes,
+    _projects.c.created_at,
+    _projects.c.updated_at,
+)
+_SUMMARIES = (
+    select(*_SUMMARY_COLUMNS)
+    .where(_projects.c.user_id == bindparam("owner"))
+    .order_by(_projects.c.updated_at.desc(), _projects.c.id.desc())
+    .limit(bindparam("limit"))
+)
+# Keyset page: rows strictly after (updated_at, id) in the listing order.
+_SUMMARIES_AFTER = _SUMMARIES.where(
+    or_(
+        _projects.c.updated_at < bindparam("after_ts"),
+        and_(_projects.c.updated_at == bindparam("after_ts"), _projects.c.id < bindparam("after_id")),
+    )
+)
+
+
+def _user(row: Any) -> Dict[str, Any]:
+    return public_user(row.id, row.email, row.name, getattr(row, "avatar_url", None))
+
+
+def _draft(row: Any) -> Dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "prompt": row.prompt,
+        "blueprint_id": row.blueprint_id,
+        "settings": row.settings,
+        "result": row.result,
+        "created_at": row.created_at.isoformat(),
+    }
+
+
+def _project(row: Any) -> Dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "name": row.name,
+        "description": row.description,
+        "version": row.version or 1,
+        "created_at": iso(row.created_at),
+        "updated_at": iso(row.updated_at),
+    }
+
+
+def _summary(row: Any) -> Dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "name": row.name,
+        "description": row.description,
+        "file_count": row.file_count or 0,
+        "total_bytes": row.total_bytes or 0,
+        "created_at": iso(row.created_at),
+        "updated_at": iso(row.updated_at),
+        "updated_dt": row.updated_at,
+    }
+
+
+def _write_result(pid: int, row: Any) -> Dict[str, Any]:
+    return {
+        "id": str(pid),
+        "version": row.version,
+        "file_count": row.file_count,
+        "total_bytes": row.total_bytes,
+        "created_at": iso(row.created_at),
+        "updated_at": iso(row.updated_at),
+    }
+
+
+def _stored(row: Any) -> Tuple[Optional[str], Any]:
+    """(codec, payload) of a blob row; pre-codec rows carry their text in `content`."""
+    return (None, row.content) if row.codec is None else (row.codec, row.data)
+
+
+def _search_hit(row: Any, content: str) -> Dict[str, Any]:
+    return {"project_id": str(row.project_id), "project_name": row.project_name, "path": row.path, "content": content}
+
+
+def _search_rowid(content_hash: str) -> int:
+    return int(content_hash[:15], 16)
+
+
+def _insert_blobs(dialect: str) -> Any:
+    """INSERT into project_blobs that skips hashes another writer stored first."""
+    if dialect == "sqlite":
+        return sqlite.insert(_blobs).on_conflict_do_nothing(index_elements=["hash"])
+    if dialect == "postgresql":
+        return postgresql.insert(_blobs).on_conflict_do_nothing(index_elements=["hash"])
+    return insert(_blobs)
+
+
+def _int_id(v: str) -> Optional[int]:
+    try:
+        return int(v)
+    except Exception:
+        return None
+
+
+class SqlRepository(Repository):
+    """SQLAlchemy implementation (SQLite by default, any SQLAlchemy URL works)."""
+
+    def __init__(self, engine: Any, *, history_limit: int = 0):
+        self.engine = engine
+        self.history_limit = max(0, int(history_limit))
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.fts = False
+        self._insert_blob = _insert_blobs(engine.dialect.name)
+
+    def init(self) -> None:
+        Base.metadata.create_all(bind=self.engine)
+        self._maybe_migrate()
+        self._snapshot_unversioned()
+        self._init_search()
+
+    def _maybe_migrate(self) -> None:
+        """Best-effort SQLite migrations for local dev (no Alembic)."""
+        if self.engine.dialect.name != "sqlite":
+            return
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.exec_driver_sql("PRAGMA table_info(users)").fetchall()
+                cols = {r[1] for r in rows}  # (cid, name, type, notnull, dflt_value, pk)
+
+                # Add google_id if missing (introduced for Google OAuth)
+                if "google_id" not in cols:
+                    conn.exec_driver_sql("ALTER TABLE users ADD COLUMN google_id VARCHAR")
+                if "avatar_url" not in cols:
+                    conn.exec_driver_sql("ALTER TABLE users ADD COLUMN avatar_url VARCHAR")
+
+                # Ensure an index exists for google_id lookups (unique where possible)
+                # SQLite can't create a UNIQUE constraint retroactively, but a unique index works.
+                conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_google_id ON users(google_id)")
+        except Exception:
+            # Don't crash startup on best-effort migration.
+            return
+        try:
+            with self.engine.connect() as conn:
+                cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(projects)").fetchall()}
+                if "version" not in cols:
+                    conn.exec_driver_sql("ALTER TABLE projects ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+                blob_cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(project_blobs)").fetchall()}
+                if "codec" not in blob_cols:
+                    # Existing rows keep their text in `content` (codec NULL).
+                    conn.exec_driver_sql("ALTER TABLE project_blobs ADD COLUMN codec VARCHAR")
+                    conn.exec_driver_sql("ALTER TABLE project_blobs ADD COLUMN data BLOB")
+                if "file_count" not in cols:
+                    conn.exec_driver_sql("ALTER TABLE projects ADD COLUMN file_count INTEGER NOT NULL DEFAULT 0")
+                    conn.exec_driver_sql("ALTER TABLE projects ADD COLUMN total_bytes INTEGER NOT NULL DEFAULT 0")
+                    # One-off backfill; from here on the columns are written with `files`.
+                    for row in conn.execute(select(_projects.c.id, _projects.c.files)).all():
+                        count, size = file_stats(row.files or [])
+                        conn.execute(
+                            update(_projects).where(_projects.c.id == row.id).values(file_count=count, total_bytes=size)
+                        )
+                conn.exec_driver_sql(
+                    "CREATE INDEX IF NOT EXISTS ix_projects_user_updated ON projects(user_id, updated_at, id)"
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ projects table migration skipped: {type(e).__name__}: {e}")
+        self._move_legacy_files()
+
+    def _move_legacy_files(self) -> None:
+        """Move file lists still stored inline in projects.files into project_files/project_blobs."""
+        db = self.SessionLocal()
+        try:
+            rows = db.execute(
+                select(_projects.c.id, _projects.c.files).where(_projects.c.files.is_not(None), _projects.c.files != [])
+            ).all()
+            for row in rows:
+                files = {str(f.get("path") or ""): f.get("content") or "" for f in row.files or []}
+                self._sync_files(db, row.id, files, [], replace=True)
+                db.execute(update(_projects).where(_projects.c.id == row.id).values(files=[]))
+            db.commit()
+            if rows:
+                print(f"Moved files of {len(rows)} project(s) into project_files")
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ legacy project files not migrated: {type(e).__name__}: {e}")
+        finally:
+            db.close()
+
+    def _snapshot_unversioned(self) -> None:
+        """Record the current state of projects saved before version history existed."""
+        unversioned = ~exists().where(_versions.c.project_id == _projects.c.id)
+        with self.engine.begin() as conn:
+            conn.execute(
+                insert(_vfiles).from_select(
+                    ["project_id", "version", "path", "hash", "size"],
+                    select(_files.c.project_id, _projects.c.version, _files.c.path, _files.c.hash, _files.c.size)
+                    .join(_projects, _projects.c.id == _files.c.project_id)
+                    .where(unversioned),
+                )
+            )
+            conn.execute(
+                insert(_versions).from_select(
+                    ["project_id", "version", "file_count", "total_bytes", "created_at"],
+                    select(
+                        _projects.c.id, _projects.c.version, _projects.c.file_count, _projects.c.total_bytes,
+                        _projects.c.updated_at,
+                    ).where(unversioned),
+                )
+            )
+
+    def _init_search(self) -> None:
+        """Create the FTS5 search table on SQLite, indexing existing blobs the first time."""
+        if self.engine.dialect.name != "sqlite":
+            return
+        try:
+            with self.engine.begin() as conn:
+                found = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = ?", (_FTS_TABLE,)).first()
+                if found is None:
+                    conn.exec_driver_sql(
+                        f"CREATE VIRTUAL TABLE {_FTS_TABLE} USING fts5(hash UNINDEXED, content, tokenize='trigram')"
+                    )
+                    rows = conn.execute(select(_blobs.c.hash, _blobs.c.content, _blobs.c.codec, _blobs.c.data))
+                    batch = []
+                    for row in rows:
+                        batch.append(
+                            {"rowid": _search_rowid(row.hash), "hash": row.hash, "content": stored_text(*_stored(row))}
+                        )
+                        if len(batch) >= 500:
+                            conn.execute(_INSERT_FTS, batch)
+                            batch = []
+                    if batch:
+                        conn.execute(_INSERT_FTS, batch)
+            self.fts = True
+        except Exception as e:
+            # e.g. SQLite built without FTS5 or older than 3.34 (no trigram tokenizer)
+            print(f"⚠️ project search index unavailable, searches will scan files: {type(e).__name__}: {e}")
+
+    def session(self) -> Iterator[Any]:
+        db = self.SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # Drafts
+
+    def save_draft(self, db: Any, draft_data: Dict[str, Any]) -> str:
+        created_at = draft_data["created_at"]
+        draft = Draft(
+            prompt=draft_data["prompt"],
+            blueprint_id=draft_data.get("blueprint_id"),
+            settings=draft_data.get("settings"),
+            result=draft_data["result"],
+            created_at=datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at,
+        )
+        db.add(draft)
+        db.commit()
+        return str(draft.id)
+
+    def get_draft(self, db: Any, draft_id: str) -> Optional[Dict[str, Any]]:
+        iid = _int_id(draft_id)
+        if iid is None:
+            return None
+        draft = db.get(Draft, iid)
+        return _draft(draft) if draft else None
+
+    def get_all_drafts(self, db: Any, limit: int) -> List[Dict[str, Any]]:
+        drafts = db.execute(select(Draft).order_by(Draft.created_at.desc()).limit(limit)).scalars()
+        return [_draft(d) for d in drafts]
+
+    # Users
+
+    def create_user(self, db: Any, *, email: str, name: Optional[str], password_hash: str) -> Dict[str, Any]:
+        user = User(email=email, name=name, password_hash=password_hash)
+        db.add(user)
+        db.commit()
+        return _user(user)
+
+    def create_or_get_google_user(
+        self, db: Any, *, google_id: str, email: str, name: Optional[str], avatar_url: Optional[str]
+    ) -> Dict[str, Any]:
+        user = db.execute(_USER_BY_GOOGLE_ID, {"google_id": google_id}).scalars().first()
+        if user:
+            if name and user.name != name:
+                user.name = name
+            if email != user.email:
+                user.email = email
+            if avatar_url and getattr(user, "avatar_url", None) != avatar_url:
+                user.avatar_url = avatar_url
+            db.commit()
+            return _user(user)
+
+        existing = db.execute(_USER_BY_EMAIL, {"email": email}).scalars().first()
+        if existing:
+            existing.google_id = google_id
+            if name:
+                existing.name = name
+            if avatar_url:
+                existing.avatar_url = avatar_url
+            db.commit()
+            return _user(existing)
+
+        user = User(email=email, name=name, google_id=google_id, password_hash=None, avatar_url=avatar_url)
+        db.add(user)
+        db.commit()
+        return _user(user)
+
+    def get_password_login(self, db: Any, email: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        row = db.execute(_USER_BY_EMAIL, {"email": email}).scalars().first()
+        if not row or not row.password_hash:
+            return None
+        return _user(row), row.password_hash
+
+    def get_user_by_id(self, db: Any, user_id: str) -> Optional[Dict[str, Any]]:
+        iid = _int_id(user_id)
+        if iid is None:
+            return None
+        user = db.execute(_USER_BY_ID, {"id": iid}).scalars().first()
+        return _user(user) if user else None
+
+    def get_user_by_email(self, db: Any, email: str) -> Optional[Dict[str, Any]]:
+        user = db.execute(_USER_BY_EMAIL, {"email": email}).scalars().first()
+        return _user(user) if user else None
+
+    # Auth sessions
+
+    def create_session(self, db: Any, *, sid: str, user_id: str, now: datetime, expires_at: datetime) -> Dict[str, Any]:
+        # user_id is an int FK here
+        sess = AuthSession(id=sid, user_id=int(user_id), created_at=now, last_seen_at=now, expires_at=expires_at)
+        db.add(sess)
+        db.commit()
+        return {"id": sid, "user_id": str(user_id), "expires_at": expires_at}
+
+    def get_session(self, db: Any, sid: str, now: datetime) -> Optional[Dict[str, Any]]:
+        sess = db.execute(_SESSION_BY_ID, {"sid": sid}).scalars().first()
+        if not sess:
+            return None
+        if sess.expires_at < now:
+            db.delete(sess)
+            db.commit()
+            return None
+        return {"id": sess.id, "user_id": str(sess.user_id), "expires_at": sess.expires_at}
+
+    def delete_session(self, db: Any, sid: str, now: datetime) -> Optional[datetime]:
+        sess = db.execute(_SESSION_BY_ID, {"sid": sid}).scalars().first()
+        if not sess:
+            return None
+        expires_at = sess.expires_at
+        db.merge(AuthRevocation(sid=sid, revoked_at=now, expires_at=expires_at))
+        db.delete(sess)
+        db.commit()
+        return expires_at
+
+    def flush_last_seen(self, sids: List[str], seen_at: datetime) -> None:
+        db = self.SessionLocal()
+        try:
+            for i in range(0, len(sids), 500):
+                db.execute(
+                    _TOUCH_SESSIONS,
+                    {"sids": sids[i : i + 500], "seen_at": seen_at},
+                    execution_options={"synchronize_session": False},
+                )
+            with span("db.commit"):
+                db.commit()
+        finally:
+            db.close()
+
+    def fetch_revocations(self, since: Optional[datetime], now: datetime) -> List[Tuple[str, datetime, datetime]]:
+        db = self.SessionLocal()
+        try:
+            if since is None:
+                rows = db.execute(_LIVE_REVOCATIONS, {"now": now}).all()
+                # Once per worker start: drop rows whose sessions have expired anyway.
+                db.execute(_PURGE_REVOCATIONS, {"now": now})
+                db.commit()
+            else:
+                rows = db.execute(_NEW_REVOCATIONS, {"now": now, "since": since}).all()
+            return [(r[0], r[1], r[2]) for r in rows]
+        finally:
+            db.close()
+
+    # Projects
+
+    def _put_blobs(self, db: Any, contents: Dict[str, str]) -> None:
+        """Store hash -> content for blobs not already present. Call after the transaction's first write."""
+        present = {r[0] for r in db.execute(_SHARE_BLOBS, {"hashes": list(contents)})}
+        missing = []
+        for h, c in contents.items():
+            if h in present:
+                continue
+            raw = c.encode("utf-8")
+            codec, data = blob_codec.encode(raw)
+            missing.append({"hash": h, "content": "", "size": len(raw), "codec": codec, "data": data})
+        if missing:
+            db.execute(self._insert_blob, missing)
+            if self.fts:
+                # INSERT OR REPLACE by hash-derived rowid: harmless if the blob was a duplicate.
+                hashes = [m["hash"] for m in missing]
+                db.execute(_INSERT_FTS, [{"rowid": _search_rowid(h), "hash": h, "content": contents[h]} for h in hashes])
+
+    def _collect_blobs(self, db: Any, hashes: List[str]) -> None:
+        """Delete blobs among `hashes` that nothing references any more (and their search rows). No commit."""
+        # Lock first: the DELETE's reference check then sees writers that held these rows.
+        db.execute(_LOCK_BLOBS, {"hashes": hashes})
+        db.execute(_COLLECT_BLOBS, {"hashes": hashes})
+        if self.fts:
+            kept = {r[0] for r in db.execute(_EXISTING_BLOBS, {"hashes": hashes})}
+            gone = [_search_rowid(h) for h in hashes if h not in kept]
+            if gone:
+                db.execute(_DELETE_FTS, {"rowids": gone})
+
+    def _sync_files(
+        self, db: Any, pid: int, upserts: Dict[str, str], deletes: List[str], *, replace: bool
+    ) -> Optional[Tuple[int, int]]:
+        """Point `pid`'s files at new content; returns the (file count, bytes) delta, None if unchanged. No commit."""
+        new = {path: content_hash(content) for path, content in upserts.items()}
+        if replace:
+            old_rows = db.execute(_FILE_REFS, {"pid": pid}).all()
+        else:
+            old_rows = db.execute(_FILE_REFS_AT, {"pid": pid, "paths": list(new) + list(deletes)}).all()
+        old = {r.path: (r.hash, r.size) for r in old_rows}
+        changed = [p for p, h in new.items() if old.get(p, ("",))[0] != h]
+        removed = [p for p in (set(old) - set(new) if replace else deletes) if p in old and p not in new]
+        if not changed and not removed:
+            return None
+        # Callers have already written (_write's lock, _insert_project's INSERT), so
+        # on SQLite no collection can run between _put_blobs' check and the commit.
+        self._put_blobs(db, {new[p]: upserts[p] for p in changed})
+        touched = changed + removed
+        db.execute(_DELETE_FILE_REFS, {"pid": pid, "paths": touched})
+        sizes = {p: len(upserts[p].encode("utf-8")) for p in changed}
+        if changed:
+            db.execute(
+                _INSERT_FILE_REF, [{"project_id": pid, "path": p, "hash": new[p], "size": sizes[p]} for p in changed]
+            )
+        # Replaced blobs stay referenced by the previous version; _snapshot's
+        # pruning collects them once that version goes.
+        count_delta = len([p for p in changed if p not in old]) - len(removed)
+        bytes_delta = sum(sizes.values()) - sum(old[p][1] for p in touched if p in old)
+        return count_delta, bytes_delta
+
+    def save_project(
+        self, db: Any, *, user_id: str, name: str, files: List[Dict[str, Any]], description: Optional[str], now: datetime
+    ) -> str:
+        pid = self._insert_project(db, user_id, name, description, files, now, now)
+        db.commit()
+        return str(pid)
+
+    def _insert_project(
+        self,
+        db: Any,
+        user_id: str,
+        name: str,
+        description: Optional[str],
+        files: List[Dict[str, Any]],
+        created_at: datetime,
+        updated_at: datetime,
+    ) -> int:
+        """Insert a project with its files as version 1. No commit."""
+        contents = {str(f.get("path") or ""): f.get("content") or "" for f in files}
+        count, size = file_stats([{"content": c} for c in contents.values()])
+        res = db.execute(
+            _INSERT_PROJECT,
+            {
+                "user_id": user_id,
+                "name": name,
+                "description": description,
+                "files": [],
+                "file_count": count,
+                "total_bytes": size,
+                "version": 1,
+                "created_at": created_at,
+                "updated_at": updated_at,
+            },
+        )
+        pid = res.inserted_primary_key[0]
+        self._sync_files(db, pid, contents, [], replace=True)
+        self._snapshot(db, pid, 1, count, size, updated_at)
+        return pid
+
+    def get_project_stored(
+        self, db: Any, project_id: str, user_id: str
+    ) -> Optional[Tuple[Dict[str, Any], List[StoredFile]]]:
+        iid = _int_id(project_id)
+        if iid is None:
+            return None
+        row = db.execute(_SELECT_PROJECT, {"pid": iid, "owner": user_id}).first()
+        if not row:
+            return None
+        files = [(r.path, *_stored(r)) for r in db.execute(_PROJECT_FILES, {"pid": iid})]
+        return _project(row), files
+
+    def get_project_manifest(
+        self, db: Any, project_id: str, user_id: str
+    ) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+        iid = _int_id(project_id)
+        if iid is None:
+            return None
+        current = db.execute(_PROJECT_VERSION, {"pid": iid, "owner": user_id}).first()
+        if current is None:
+            return None
+        rows = db.execute(_MANIFEST, {"pid": iid})
+        return current.version, [{"path": r.path, "hash": r.hash, "size": r.size} for r in rows]
+
+    def get_project_file_ref(self, db: Any, project_id: str, user_id: str, path: str) -> Optional[Dict[str, Any]]:
+        iid = _int_id(project_id)
+        if iid is None:
+            return None
+        row = db.execute(_OWNED_FILE_REF, {"pid": iid, "owner": user_id, "path": path}).first()
+        return {"hash": row.hash, "size": row.size} if row else None
+
+    def list_project_summaries(
+        self, db: Any, user_id: str, limit: int, after: Optional[Tuple[datetime, str]] = None
+    ) -> List[Dict[str, Any]]:
+        if after is None:
+            rows = db.execute(_SUMMARIES, {"owner": user_id, "limit": int(limit)}).all()
+        else:
+            after_id = _int_id(after[1])
+            if after_id is None:
+                return []
+            params = {"owner": user_id, "limit": int(limit), "after_ts": after[0], "after_id": after_id}
+            rows = db.execute(_SUMMARIES_AFTER, params).all()
+        return [_summary(r) for r in rows]
+
+    def update_project(self, db: Any, project_id: str, user_id: str, values: Dict[str, Any]) -> bool:
+        iid = _int_id(project_id)
+        if iid is None:
+            return False
+        res = db.execute(update(_projects).where(*_OWNED).values(**values), {"pid": iid, "owner": user_id})
+        db.commit()
+        return bool(res.rowcount)
+
+    def write_project_files(
+        self,
+        db: Any,
+        project_id: str,
+        user_id: str,
+        *,
+        upserts: Dict[str, str],
+        deletes: List[str],
+        replace: bool,
+        base_version: Optional[int],
+        meta: Dict[str, Any],
+        now: datetime,
+    ) -> Optional[Dict[str, Any]]:
+        iid = _int_id(project_id)
+        if iid is None:
+            return None
+
+        def apply() -> Optional[Dict[str, Any]]:
+            delta = self._sync_files(db, iid, upserts, deletes, replace=replace)
+            if delta is None:
+                return None
+            return {"file_count": _projects.c.file_count + delta[0], "total_bytes": _projects.c.total_bytes + delta[1]}
+
+        return self._write(db, iid, user_id, base_version=base_version, meta=meta, now=now, apply=apply)
+
+    def _write(
+        self,
+        db: Any,
+        iid: int,
+        user_id: str,
+        *,
+        base_version: Optional[int],
+        meta: Dict[str, Any],
+        now: datetime,
+        apply: Any,
+    ) -> Optional[Dict[str, Any]]:
+        """Bump the project's version around `apply()` and snapshot the result, holding the project meanwhile.
+
+        `apply` changes the files and returns the column values to set with the new
+        version, or None if the files are already as requested. Then no version is
+        made: only `meta` columns that differ are updated (and updated_at with them).
+        """
+        params = {"pid": iid, "owner": user_id}
+        if not db.execute(_LOCK_PROJECT, params).rowcount:
+            db.rollback()
+            return None
+        current = db.execute(_PROJECT_VERSION, params).first()
+        if base_version is not None and current.version != base_version:
+            db.rollback()
+            raise VersionConflict(current.version)
+        values = apply()
+        if values is None:
+            return self._update_meta(db, params, meta, now)
+        stmt = (
+            update(_projects)
+            .where(*_OWNED)
+            .values(version=_projects.c.version + 1, updated_at=now, **values, **meta)
+        )
+        if self.engine.dialect.update_returning:
+            row = db.execute(stmt.returning(*_WRITE_RESULT), params).first()
+        else:
+            db.execute(stmt, params)
+            row = db.execute(select(*_WRITE_RESULT).where(*_OWNED), params).first()
+        self._snapshot(db, iid, row.version, row.file_count, row.total_bytes, now)
+        db.commit()
+        return _write_result(iid, row)
+
+    def _update_meta(self, db: Any, params: Dict[str, Any], meta: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        if meta:
+            changed = or_(*(_projects.c[k].is_distinct_from(v) for k, v in meta.items()))
+            db.execute(update(_projects).where(*_OWNED, changed).values(updated_at=now, **meta), params)
+        row = db.execute(select(*_WRITE_RESULT).where(*_OWNED), params).first()
+        db.commit()
+        return _write_result(params["pid"], row)
+
+    def delete_project(self, db: Any, project_id: str, user_id: str) -> bool:
+        iid = _int_id(project_id)
+        if iid is None:
+            return False
+        res = db.execute(_DELETE_PROJECT, {"pid": iid, "owner": user_id})
+        if not res.rowcount:
+            db.rollback()
+            return False
+        hashes = {r.hash for r in db.execute(_FILE_REFS, {"pid": iid})}
+        hashes.update(r.hash for r in db.execute(_ALL_VERSION_HASHES, {"pid": iid}))
+        db.execute(_DELETE_ALL_FILE_REFS, {"pid": iid})
+        db.execute(_DELETE_ALL_VERSION_FILES, {"pid": iid})
+        db.execute(_DELETE_ALL_VERSIONS, {"pid": iid})
+        if hashes:
+            self._collect_blobs(db, list(hashes))
+        db.commit()
+        return True
+
+    def search_project_files(
+        self, db: Any, user_id: str, query: str, project_id: Optional[str], limit: int
+    ) -> List[Dict[str, Any]]:
+        pid = None
+        if project_id is not None:
+            pid = _int_id(project_id)
+            if pid is None:
+                return []
+        if self.fts:
+            params: Dict[str, Any] = {"q": code_search.fts_phrase(query), "owner": user_id, "limit": int(limit)}
+            if pid is not None:
+                params["pid"] = pid
+            rows = db.execute(_SEARCH_PROJECT if pid is not None else _SEARCH, params)
+            return [_search_hit(r, r.content) for r in rows]
+        stmt = _SEARCH_SCAN.where(_projects.c.id == pid) if pid is not None else _SEARCH_SCAN
+        needle = query.lower()
+        out: List[Dict[str, Any]] = []
+        for r in db.execute(stmt, {"owner": user_id}):
+            content = stored_text(*_stored(r))
+            if needle in content.lower():
+                out.append(_search_hit(r, content))
+                if len(out) >= limit:
+                    break
+        return out
+
+    # Bulk transfer
+
+    def list_project_keys(
+        self, db: Any, user_id: Optional[str], after: Optional[str], limit: int
+    ) -> List[Tuple[str, str]]:
+        stmt = select(_projects.c.id, _projects.c.user_id).order_by(_projects.c.id).limit(int(limit))
+        if user_id is not None:
+            stmt = stmt.where(_projects.c.user_id == user_id)
+        if after is not None:
+            after_id = _int_id(after)
+            if after_id is None:
+                return []
+            stmt = stmt.where(_projects.c.id > after_id)
+        return [(str(r.id), r.user_id) for r in db.execute(stmt)]
+
+    def import_projects(self, db: Any, user_id: str, projects: List[Dict[str, Any]], now: datetime) -> List[str]:
+        try:
+            ids = [
+                self._insert_project(
+                    db,
+                    user_id,
+                    p["name"],
+                    p.get("description"),
+                    p.get("files") or [],
+                    p.get("created_at") or now,
+                    p.get("updated_at") or now,
+                )
+                for p in projects
+            ]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return [str(i) for i in ids]
+
+    # Version history
+
+    def _snapshot(self, db: Any, pid: int, version: int, file_count: int, total_bytes: int, now: datetime) -> None:
+        """Record `pid`'s current files as `version` and drop versions beyond history_limit. No commit."""
+        db.execute(_SNAPSHOT_FILES, {"pid": pid, "ver": version})
+        db.execute(
+            _INSERT_VERSION,
+            {
+                "project_id": pid,
+                "version": version,
+                "file_count": file_count,
+                "total_bytes": total_bytes,
+                "created_at": now,
+            },
+        )
+        cutoff = version - self.history_limit
+        if self.history_limit and cutoff >= 1:
+            params = {"pid": pid, "cutoff": cutoff}
+            hashes = [r.hash for r in db.execute(_PRUNED_HASHES, params)]
+            db.execute(_PRUNE_VERSION_FILES, params)
+            db.execute(_PRUNE_VERSIONS, params)
+            if hashes:
+                self._collect_blobs(db, hashes)
+
+    def _owned_version(self, db: Any, project_id: str, user_id: str, version: int) -> Optional[Tuple[Any, Any]]:
+        """(project row, version row) if the user owns the project and the version is kept."""
+        iid = _int_id(project_id)
+        if iid is None:
+            return None
+        project = db.execute(_SELECT_PROJECT, {"pid": iid, "owner": user_id}).first()
+        if project is None:
+            return None
+        row = db.execute(_VERSION_ROW, {"pid": iid, "ver": int(version)}).first()
+        return (project, row) if row is not None else None
+
+    def list_project_versions(
+        self, db: Any, project_id: str, user_id: str, limit: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        iid = _int_id(project_id)
+        if iid is None or db.execute(_PROJECT_VERSION, {"pid": iid, "owner": user_id}).first() is None:
+            return None
+        rows = db.execute(_VERSIONS, {"pid": iid, "limit": int(limit)}).all()
+        return [
+            {
+                "version": r.version,
+                "file_count": r.file_count,
+                "total_bytes": r.total_bytes,
+                "created_at": iso(r.created_at),
+            }
+            for r in rows
+        ]
+
+    def get_version_files(
+        self, db: Any, project_id: str, user_id: str, version: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        owned = self._owned_version(db, project_id, user_id, version)
+        if owned is None:
+            return None
+        rows = db.execute(_VERSION_FILES, {"pid": owned[0].id, "ver": int(version)})
+        return [{"path": r.path, "hash": r.hash, "size": r.size} for r in rows]
+
+    def get_blobs_stored(self, db: Any, hashes: List[str]) -> Dict[str, Tuple[Optional[str], Any]]:
+        if not hashes:
+            return {}
+        return {r.hash: _stored(r) for r in db.execute(_BLOBS, {"hashes": list(hashes)})}
+
+    def storage_stats(self, db: Any) -> List[Dict[str, Any]]:
+        return [
+            {"codec": codec or "legacy", "blobs": n, "raw_bytes": int(raw), "stored_bytes": int(stored)}
+            for codec, n, raw, stored in db.execute(_STORAGE_STATS)
+        ]
+
+    def restore_project_version(
+        self, db: Any, project_id: str, user_id: str, version: int, *, base_version: Optional[int], now: datetime
+    ) -> Optional[Dict[str, Any]]:
+        owned = self._owned_version(db, project_id, user_id, version)
+        if owned is None:
+            return None
+        iid, source = owned[0].id, owned[1]
+
+        def apply() -> Optional[Dict[str, Any]]:
+            current = {(r.path, r.hash) for r in db.execute(_FILE_REFS, {"pid": iid})}
+            if current == {(r.path, r.hash) for r in db.execute(_VERSION_FILES, {"pid": iid, "ver": source.version})}:
+                return None
+            db.execute(_DELETE_ALL_FILE_REFS, {"pid": iid})
+            db.execute(_COPY_VERSION_FILES, {"dest": iid, "pid": iid, "ver": source.version})
+            return {"file_count": source.file_count, "total_bytes": source.total_bytes}
+
+        return self._write(db, iid, user_id, base_version=base_version, meta={}, now=now, apply=apply)
+
+    def fork_project_version(
+        self, db: Any, project_id: str, user_id: str, version: int, *, name: Optional[str], now: datetime
+    ) -> Optional[Dict[str, Any]]:
+        owned = self._owned_version(db, project_id, user_id, version)
+        if owned is None:
+            return None
+        project, source = owned
+        res = db.execute(
+            _INSERT_PROJECT,
+            {
+                "user_id": user_id,
+                "name": name or f"{project.name} (v{source.version})",
+                "description": project.description,
+                "files": [],
+                "file_count": source.file_count,
+                "total_bytes": source.total_bytes,
+                "version": 1,
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+        pid = res.inserted_primary_key[0]
+        db.execute(_COPY_VERSION_FILES, {"dest": pid, "pid": project.id, "ver": source.version})
+        self._snapshot(db, pid, 1, source.file_count, source.total_bytes, now)
+        db.commit()
+        return {
+            "id": str(pid),
+            "version": 1,
+            "file_count": source.file_count,
+            "total_bytes": source.total_bytes,
+            "created_at": iso(now),
+            "updated_at": iso(now),
+        }
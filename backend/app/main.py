@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import hmac
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.api.routes import router
-from app.database.database import init_db
+from app.database.database import fetch_revocations, flush_last_seen, init_db
+from app.services import google_oauth
+from app.services.auth_cache import last_seen_writer, revocations
+from app.services.metrics import registry
+from app.services.password_pool import password_pool
+from app.services.security import require_signing_secret
+from app.services.tracing import end_trace, start_trace
 from app.settings import settings
 
 
@@ -26,9 +33,41 @@ app.add_middleware(
 app.include_router(router)
 
 
+@app.middleware("http")
+async def _stage_timing(request: Request, call_next):
+    trace, token = start_trace(request.method, request.url.path)
+    try:
+        response = await call_next(request)
+    finally:
+        end_trace(token)
+    if settings.server_timing_enabled:
+        response.headers["Server-Timing"] = trace.server_timing()
+    if settings.slow_request_ms > 0 and trace.elapsed() * 1000 >= settings.slow_request_ms:
+        route = request.scope.get("route")
+        print(trace.as_log(status=response.status_code, route=getattr(route, "path", None)), flush=True)
+    return response
+
+
 @app.on_event("startup")
 def _startup() -> None:
+    require_signing_secret()
     init_db()
+    last_seen_writer.start(flush_last_seen)
+    password_pool.start()
+    if settings.auth_session_mode == "signed":
+        revocations.start(fetch_revocations)
+
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    last_seen_writer.stop()
+    revocations.stop()
+    password_pool.shutdown()
+
+
+@app.on_event("shutdown")
+async def _close_http_clients() -> None:
+    await google_oauth.aclose()
 
 
 @app.get("/health")
@@ -36,6 +75,18 @@ def health():
     return {"status": "healthy", "service": "vibe-coding-api"}
 
 
+@app.get("/metrics")
+def metrics(request: Request):
+    """Prometheus text exposition of in-process metrics (per worker); needs METRICS_TOKEN as a bearer token."""
+    if not settings.metrics_token:
+        # Traffic and LLM spend are not for the public; scraping is opt-in.
+        raise HTTPException(status_code=404, detail="Not Found")
+    auth = request.headers.get("authorization") or ""
+    if not hmac.compare_digest(auth, f"Bearer {settings.metrics_token}"):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # Serve frontend build (if exists) or fallback to API
 _FRONTEND_BUILD_DIR = Path(__file__).parent.parent.parent / "frontend" / "dist"
 
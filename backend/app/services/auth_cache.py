@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.metrics import registry
+from app.settings import settings
+
+_lookups = registry.counter(
+    "auth_cache_lookups_total",
+    "Session-cookie -> user resolutions served from the per-worker cache (result=hit|miss).",
+    ("result",),
+)
+_last_seen_flushes = registry.counter(
+    "auth_last_seen_flushed_total",
+    "Sessions whose last_seen_at was written by the batched flusher.",
+)
+
+
+class AuthCache:
+    """Per-worker TTL cache of session id -> user.
+
+    Entries expire after `ttl_seconds` or at the session's own expiry, whichever
+    is first. Logout and user updates invalidate explicitly in this worker; other
+    workers converge within the TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 10_000):
+        self._ttl = ttl_seconds
+        self._max = max(1, max_entries)
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def _forget(self, sid: str) -> None:
+        # Caller holds the lock.
+        item = self._items.pop(sid, None)
+        if item is None:
+            return
+        uid = str(item[1].get("id"))
+        sids = self._by_user.get(uid)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._by_user[uid]
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        if not sid or self._ttl <= 0:
+            return None
+        with self._lock:
+            item = self._items.get(sid)
+            if item is not None and item[0] > time.time():
+                self._items.move_to_end(sid)
+                _lookups.inc(result="hit")
+                return dict(item[1])
+            if item is not None:
+                self._forget(sid)
+        _lookups.inc(result="miss")
+        return None
+
+    def put(self, sid: str, user: Dict[str, Any], session_expires_at: Optional[datetime] = None) -> None:
+        if not sid or self._ttl <= 0:
+            return
+        deadline = time.time() + self._ttl
+        if isinstance(session_expires_at, datetime):
+            # Session timestamps are naive UTC (datetime.utcnow()).
+            deadline = min(deadline, (session_expires_at - datetime(1970, 1, 1)).total_seconds())
+        with self._lock:
+            self._forget(sid)
+            self._items[sid] = (deadline, dict(user))
+            self._by_user.setdefault(str(user.get("id")), set()).add(sid)
+            while len(self._items) > self._max:
+                self._forget(next(iter(self._items)))
+
+    def invalidate_session(self, sid: str) -> None:
+        with self._lock:
+            self._forget(sid)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            for sid in list(self._by_user.get(str(user_id), ())):
+                self._forget(sid)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._by_user.clear()
+
+
+class LastSeenWriter:
+    """Write-behind buffer for auth_sessions.last_seen_at.
+
+    Requests only record "seen now" in memory; a daemon thread hands the pending
+    batch to `flush(sids, seen_at)` every `interval_seconds` (one UPDATE for the
+    whole batch), so authenticated reads never write to the database.
+    """
+
+    def __init__(self, interval_seconds: float = 30.0):
+        self._interval = interval_seconds
+        self._pending: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._flush: Optional[Callable[[List[str], datetime], Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self, sid: str) -> None:
+        if not sid:
+            return
+        now = datetime.utcnow()
+        with self._lock:
+            self._pending[sid] = now
+        if self._interval <= 0:
+            self.flush_now()
+
+    def discard(self, sid: str) -> None:
+        with self._lock:
+            self._pending.pop(sid, None)
+
+    def flush_now(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self._flush is None:
+            return 0
+        try:
+            # Everything in the batch was seen within the last interval; stamping the
+            # batch with its newest time keeps this to a single statement.
+            self._flush(list(pending), max(pending.values()))
+        except Exception as e:
+            print(f"⚠️ last_seen_at flush failed ({len(pending)} sessions): {type(e).__name__}: {e}")
+            with self._lock:
+                for sid, seen in pending.items():
+                    self._pending.setdefault(sid, seen)
+            return 0
+        _last_seen_flushes.inc(len(pending))
+        return len(pending)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            self.flush_now()
+
+    def start(self, flush: Callable[[List[str], datetime], Any]) -> None:
+        self._flush = flush
+        if self._thread is not None or self._interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="last-seen-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush_now()
+
+
+class RevocationList:
+    """Per-worker denylist of revoked session ids for signed-cookie sessions.
+
+    Signed cookies are verified without the database, so logout elsewhere only
+    takes effect here once the revocation is known. Every `interval_seconds` a
+    daemon thread pulls new rows from the revocations table (via `fetch`); ids
+    are dropped once the session would have expired anyway, keeping the set small.
+    """
+
+    _SKEW = timedelta(seconds=60)
+
+    def __init__(self, interval_seconds: float = 5.0):
+        self._interval = interval_seconds
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._since: Optional[datetime] = None
+        self._fetch: Optional[Callable[[Optional[datetime]], Iterable[Tuple[str, datetime, datetime]]]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _epoch(dt: datetime) -> float:
+        return (dt - datetime(1970, 1, 1)).total_seconds()
+
+    def add(self, sid: str, expires_at: Optional[datetime]) -> None:
+        until = self._epoch(expires_at) if isinstance(expires_at, datetime) else time.time() + 86400 * 366
+        with self._lock:
+            self._revoked[sid] = until
+
+    def is_revoked(self, sid: str) -> bool:
+        return sid in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def sync_now(self) -> None:
+        if self._fetch is None:
+            return
+        # Overlap the window to tolerate clock skew between workers writing revoked_at.
+        since = self._since - self._SKEW if self._since else None
+        try:
+            rows = list(self._fetch(since))
+        except Exception as e:
+            print(f"⚠️ session revocation sync failed: {type(e).__name__}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for sid, expires_at, revoked_at in rows:
+                self._revoked[sid] = self._epoch(expires_at)
+                if self._since is None or revoked_at > self._since:
+                    self._since = revoked_at
+            for sid in [k for k, until in self._revoked.items() if until <= now]:
+                del self._revoked[sid]
+            if self._since is None:
+                self._since = datetime.utcnow()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            self.sync_now()
+
+    def start(self, fetch: Callable[[Optional[datetime]], Iterable[Tuple[str, datetime, datetime]]]) -> None:
+        self._fetch = fetch
+        self.sync_now()
+        if self._thread is not None or self._interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+auth_cache = AuthCache(ttl_seconds=settings.auth_cache_ttl_seconds, max_entries=settings.auth_cache_max_entries)
+last_seen_writer = LastSeenWriter(interval_seconds=settings.auth_last_seen_flush_seconds)
+revocations = RevocationList(interval_seconds=settings.auth_revocation_sync_seconds)
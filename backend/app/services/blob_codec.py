@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import zlib
+from typing import Optional, Tuple
+
+from app.services.metrics import registry
+
+# Stored file contents (project blobs, session-store blobs and records) go
+# through this codec. Every stored value says which codec wrote it, so values
+# written before compression, or by a codec added later, keep decoding.
+RAW = "raw"
+ZLIB = "zlib"
+_LEVEL = 6
+# Below this, zlib's header and checksum eat most of the saving.
+MIN_COMPRESS_BYTES = 128
+
+# pack()/unpack() put the codec in a leading marker byte for stores without a
+# codec column. A default-window zlib stream always starts with 0x78, so bare
+# zlib values written before markers existed are recognised too.
+_MARKERS = {RAW: b"\x00", ZLIB: b"\x01"}
+_BY_MARKER = {m: name for name, m in _MARKERS.items()}
+_LEGACY_ZLIB = 0x78
+
+_codec_bytes = registry.counter(
+    "storage_codec_bytes_total",
+    "Content encoded for storage: stage=raw is the input size, stage=stored what was written.",
+    ("codec", "stage"),
+)
+
+
+def encode(data: bytes) -> Tuple[str, bytes]:
+    """(codec, payload) for `data`: zlib unless it is tiny or does not shrink."""
+    codec, payload = RAW, data
+    if len(data) >= MIN_COMPRESS_BYTES:
+        packed = zlib.compress(data, _LEVEL)
+        if len(packed) < len(data):
+            codec, payload = ZLIB, packed
+    _codec_bytes.inc(len(data), codec=codec, stage="raw")
+    _codec_bytes.inc(len(payload), codec=codec, stage="stored")
+    return codec, payload
+
+
+def decode(codec: Optional[str], payload: bytes) -> bytes:
+    if codec is None or codec == RAW:
+        return bytes(payload)
+    if codec == ZLIB:
+        return zlib.decompress(payload)
+    raise ValueError(f"unknown storage codec {codec!r}")
+
+
+def encode_text(text: str) -> Tuple[str, bytes]:
+    return encode(text.encode("utf-8"))
+
+
+def decode_text(codec: Optional[str], payload: bytes) -> str:
+    return decode(codec, payload).decode("utf-8")
+
+
+def pack(data: bytes) -> bytes:
+    """`data` encoded, with its codec as a one-byte prefix."""
+    codec, payload = encode(data)
+    return _MARKERS[codec] + payload
+
+
+def unpack(value: bytes) -> bytes:
+    """Inverse of pack(); also accepts bare zlib values."""
+    if not value:
+        return b""
+    if value[0] == _LEGACY_ZLIB:
+        return zlib.decompress(value)
+    codec = _BY_MARKER.get(value[:1])
+    if codec is None:
+        raise ValueError("unknown storage codec marker")
+    return decode(codec, value[1:])
+
+
+def ratio(raw_bytes: int, stored_bytes: int) -> float:
+    """Compression ratio (raw / stored), 1.0 when nothing is stored."""
+    return round(raw_bytes / stored_bytes, 2) if stored_bytes else 1.0
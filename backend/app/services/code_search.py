@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterator, List, Optional, Pattern
+
+try:
+    from re import _parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+# Project search: the database narrows a user's files down to candidates
+# containing the query (SQLite FTS5 trigram index, Mongo text index), then
+# find_matches() works out the exact lines, columns and snippets.
+
+# Trigram indexes cannot look up anything shorter.
+MIN_QUERY_CHARS = 3
+# At most this many candidate files are read per search.
+MAX_CANDIDATE_FILES = 500
+SNIPPET_CHARS = 160
+# User regexes run on the request thread, so they are kept to shapes that scan
+# in linear-ish time: bounded length, no unbounded repeat nested in another,
+# and long lines are only scanned in a window around the query (see find_matches).
+MAX_REGEX_CHARS = 200
+SCAN_WINDOW_CHARS = 1000
+
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def fts_phrase(query: str) -> str:
+    """`query` as an FTS5 phrase; with the trigram tokenizer this is a substring match."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def index_terms(text: str) -> str:
+    """Words of `text` for a word-based text index, identifiers also split into parts.
+
+    "CoinCollected" and "coin_collected" both index as coincollected/coin/collected,
+    so searching for a part of an identifier still finds the file.
+    """
+    terms = set()
+    for word in _WORD.findall(text):
+        terms.add(word.lower())
+        for part in word.split("_"):
+            terms.add(part.lower())
+            terms.update(p.lower() for p in _CAMEL.findall(part))
+    terms.discard("")
+    return " ".join(sorted(terms))
+
+
+def query_terms(query: str) -> List[str]:
+    """Identifier parts of `query`; a file containing `query` has all of them among its index_terms().
+
+    Word-based, so (unlike the trigram index) a query that starts or ends
+    mid-word only finds files where that fragment is also a whole part.
+    """
+    words = _WORD.findall(query)
+    return sorted({p.lower() for word in words for part in word.split("_") for p in _CAMEL.findall(part)})
+
+
+def _subpatterns(value: Any) -> Iterator[Any]:
+    if isinstance(value, _sre_parse.SubPattern):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            yield from _subpatterns(v)
+
+
+def _nested_repeat(items: Any, in_repeat: bool = False) -> bool:
+    """True if an unbounded repeat sits inside another unbounded repeat, e.g. (a+)+ or (\w+\s?)*."""
+    for op, av in items:
+        if str(op) in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+            unbounded = av[1] == _sre_parse.MAXREPEAT
+            if unbounded and in_repeat:
+                return True
+            if any(_nested_repeat(sub, in_repeat or unbounded) for sub in _subpatterns(av[2])):
+                return True
+        elif any(_nested_repeat(sub, in_repeat) for sub in _subpatterns(av)):
+            return True
+    return False
+
+
+def compile_filter(query: str, *, regex: Optional[str], case_sensitive: bool) -> Pattern[str]:
+    """The per-line pattern: `regex` if given, else `query` literally.
+
+    Raises re.error for invalid regexes and for ones that could backtrack
+    catastrophically (too long, or with nested unbounded quantifiers).
+    """
+    flags = 0 if case_sensitive else re.IGNORECASE
+    if not regex:
+        return re.compile(re.escape(query), flags)
+    if len(regex) > MAX_REGEX_CHARS:
+        raise re.error(f"longer than {MAX_REGEX_CHARS} characters")
+    if _nested_repeat(_sre_parse.parse(regex, flags)):
+        raise re.error("nested quantifiers like (a+)+ are not allowed")
+    return re.compile(regex, flags)
+
+
+def _snippet(line: str, start: int, end: int) -> str:
+    if len(line) <= SNIPPET_CHARS:
+        return line
+    half = max(0, (SNIPPET_CHARS - (end - start)) // 2)
+    lo = max(0, min(start - half, len(line) - SNIPPET_CHARS))
+    out = line[lo : lo + SNIPPET_CHARS]
+    return ("…" if lo else "") + out + ("…" if lo + SNIPPET_CHARS < len(line) else "")
+
+
+def find_matches(
+    content: str, query: str, pattern: Pattern[str], *, case_sensitive: bool, limit: int
+) -> List[Dict[str, Any]]:
+    """{"line", "column", "snippet"} (1-based) of lines containing `query` that `pattern` matches."""
+    needle = query if case_sensitive else query.lower()
+    out: List[Dict[str, Any]] = []
+    for lineno, line in enumerate(content.splitlines(), 1):
+        at = (line if case_sensitive else line.lower()).find(needle)
+        if at < 0:
+            continue
+        # Minified or generated lines: scan only a window around the query.
+        lo = max(0, at - SCAN_WINDOW_CHARS // 2) if len(line) > SCAN_WINDOW_CHARS else 0
+        m = pattern.search(line, lo, lo + SCAN_WINDOW_CHARS)
+        if m is None:
+            continue
+        out.append({"line": lineno, "column": m.start() + 1, "snippet": _snippet(line, m.start(), m.end())})
+        if len(out) >= limit:
+            break
+    return out
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from typing import Any, Dict, Optional, Set
+
+import httpx
+
+from app.services.metrics import registry
+from app.settings import settings
+
+_GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# A token naming a key id we don't have refetches the key set at once (Google just
+# rotated), but each unknown id only once and at most _UNKNOWN_KID_FETCHES times per
+# window, so forged or stale tokens cannot turn into a request per login.
+_UNKNOWN_KID_WINDOW_SECONDS = 60.0
+_UNKNOWN_KID_FETCHES = 3
+_DEFAULT_MAX_AGE = 3600.0
+
+_cert_fetches = registry.counter(
+    "google_certs_fetches_total",
+    "Downloads of Google's id_token signing certificates (reason=cold|expired|unknown_kid).",
+    ("reason",),
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class GoogleAuthError(ValueError):
+    """The token exchange or id_token verification failed; the message is safe to show."""
+
+
+def client() -> httpx.AsyncClient:
+    """Process-wide pooled client, so logins reuse TLS connections to Google."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def aclose() -> None:
+    global _client
+    c, _client = _client, None
+    if c is not None:
+        await c.aclose()
+
+
+def _max_age(cache_control: str) -> float:
+    m = re.search(r"max-age=(\d+)", cache_control or "")
+    return float(m.group(1)) if m else _DEFAULT_MAX_AGE
+
+
+class CertCache:
+    """Google's signing certificates (kid -> PEM), cached per worker.
+
+    Honours the Cache-Control max-age Google sends (keys rotate over days), and
+    refetches immediately when a token names a key id we don't have yet; each
+    unknown id gets one refetch, within an overall budget per window (see
+    _UNKNOWN_KID_FETCHES). Concurrent logins share one fetch.
+    """
+
+    def __init__(self, url: str):
+        self._url = url
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._window_started = 0.0
+        self._window_fetches = 0
+        self._tried_kids: Set[str] = set()
+
+    def _may_fetch_for(self, kid: str, now: float) -> bool:
+        if now - self._window_started >= _UNKNOWN_KID_WINDOW_SECONDS:
+            self._window_started = now
+            self._window_fetches = 0
+            self._tried_kids.clear()
+        return kid not in self._tried_kids and self._window_fetches < _UNKNOWN_KID_FETCHES
+
+    async def _refresh(self, reason: str) -> None:
+        resp = await client().get(self._url)
+        resp.raise_for_status()
+        self._certs = {str(k): str(v) for k, v in resp.json().items()}
+        self._expires_at = time.monotonic() + _max_age(resp.headers.get("cache-control", ""))
+        _cert_fetches.inc(reason=reason)
+
+    async def get(self, kid: str) -> Dict[str, str]:
+        now = time.monotonic()
+        if self._certs and now < self._expires_at and (kid in self._certs or not self._may_fetch_for(kid, now)):
+            return self._certs
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another login may have refreshed while we waited.
+            now = time.monotonic()
+            if not self._certs:
+                await self._refresh("cold")
+            elif now >= self._expires_at:
+                await self._refresh("expired")
+            elif kid not in self._certs and self._may_fetch_for(kid, now):
+                self._tried_kids.add(kid)
+                self._window_fetches += 1
+                await self._refresh("unknown_kid")
+        return self._certs
+
+
+_certs = CertCache(settings.google_certs_url)
+
+
+async def exchange_code(code: str, redirect_uri: str) -> Dict[str, Any]:
+    resp = await client().post(
+        settings.google_token_url,
+        data={
+            "code": code,
+            "client_id": settings.google_client_id,
+            "client_secret": settings.google_client_secret,
+            "redirect_uri": redirect_uri,
+            "grant_type": "authorization_code",
+        },
+    )
+    if resp.status_code >= 400:
+        raise GoogleAuthError(f"Google OAuth error: {resp.text}")
+    return resp.json()
+
+
+async def verify_id_token(id_token: str) -> Dict[str, Any]:
+    """Check the id_token's signature, audience, issuer and expiry locally; returns its claims."""
+    from google.auth import jwt
+
+    try:
+        header = jwt.decode_header(id_token)
+    except ValueError as e:
+        raise GoogleAuthError(f"Malformed id_token: {e}")
+    certs = await _certs.get(str(header.get("kid") or ""))
+    try:
+        claims = jwt.decode(id_token, certs=certs, audience=settings.google_client_id, clock_skew_in_seconds=10)
+    except ValueError as e:
+        raise GoogleAuthError(f"Invalid id_token: {e}")
+    if claims.get("iss") not in _GOOGLE_ISSUERS:
+        raise GoogleAuthError("Invalid id_token issuer")
+    return claims
+
+
+async def fetch_userinfo(access_token: str) -> Dict[str, Any]:
+    """Fallback for token responses without an id_token; maps to id_token claim names."""
+    resp = await client().get(settings.google_userinfo_url, headers={"Authorization": f"Bearer {access_token}"})
+    if resp.status_code >= 400:
+        raise GoogleAuthError(f"Google OAuth error: {resp.text}")
+    info = resp.json()
+    return {
+        "sub": info.get("id"),
+        "email": info.get("email"),
+        "email_verified": info.get("verified_email", True),
+        "name": info.get("name"),
+        "picture": info.get("picture"),
+    }
+
+
+async def identify(code: str, redirect_uri: str) -> Dict[str, Any]:
+    """Exchange `code` and return the user's claims (sub, email, name, picture)."""
+    token_data = await exchange_code(code, redirect_uri)
+    id_token = token_data.get("id_token")
+    if id_token:
+        claims = await verify_id_token(id_token)
+    elif token_data.get("access_token"):
+        claims = await fetch_userinfo(token_data["access_token"])
+    else:
+        raise GoogleAuthError("No id_token received from Google")
+    if claims.get("email_verified") is False:
+        raise GoogleAuthError("Google account email is not verified")
+    return claims
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+# orjson encodes large strings several times faster than the stdlib and goes
+# straight to bytes; it is optional and everything works without it.
+try:
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    _orjson = None
+
+# Streamed bodies are sent in chunks of about this size, so a project with many
+# small files is not one ASGI message per file.
+CHUNK_BYTES = 64 * 1024
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, like Starlette's JSONResponse renders it."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib handles those
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+def object_with_array(head: Dict[str, Any], key: str, items: Iterable[Any]) -> Iterator[bytes]:
+    """The JSON of {**head, key: list(items)}, yielded in chunks.
+
+    Items are encoded one at a time as the body is sent, so a large list is
+    never materialised as Python objects (or as one big string) all at once.
+    """
+    opening = dumps(head)[:-1]
+    buf: List[bytes] = [opening, b"," if head else b"", dumps(key), b":["]
+    size = 0
+    for i, item in enumerate(items):
+        chunk = dumps(item)
+        if i:
+            buf.append(b",")
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_BYTES:
+            yield b"".join(buf)
+            buf, size = [], 0
+    buf.append(b"]}")
+    yield b"".join(buf)
@@ -1,14 +1,150 @@
 from __future__ import annotations
 
 import json
+import time
 from typing import Any, Dict, List, Optional
 
 from fastapi import HTTPException
-from openai import OpenAI
+from openai import APITimeoutError, OpenAI, RateLimitError
 
+from app.services.metrics import LATENCY_BUCKETS, registry
+from app.services.tracing import span
 from app.settings import settings
 
 
+# USD per 1M tokens: (input, cached input, output). Unknown models are counted at 0.
+_PRICING_PER_1M: Dict[str, tuple] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+
+# Templates come from the request body; keep label cardinality bounded.
+_KNOWN_TEMPLATES = {
+    "coin_collector",
+    "seasonal_collector",
+    "seasonal_collector_import",
+    "obby",
+    "endless_runner",
+    "runner",
+    "tycoon",
+    "racing",
+    "race",
+    "fps",
+}
+
+_LLM_LABELS = ("call", "route", "template", "model")
+
+_llm_requests = registry.counter(
+    "llm_requests_total",
+    "Upstream LLM calls by outcome and finish_reason.",
+    _LLM_LABELS + ("outcome", "finish_reason"),
+)
+_llm_tokens = registry.counter(
+    "llm_tokens_total",
+    "Tokens reported by the upstream API (kind=prompt|completion|cached).",
+    _LLM_LABELS + ("kind",),
+)
+_llm_cost = registry.counter(
+    "llm_cost_usd_total",
+    "Estimated spend from token usage and the built-in price table.",
+    ("route", "model"),
+)
+_llm_latency = registry.histogram(
+    "llm_request_duration_seconds",
+    "Wall time of upstream LLM calls, including SDK retries.",
+    _LLM_LABELS + ("outcome",),
+    LATENCY_BUCKETS,
+)
+_llm_ttft = registry.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time until the first streamed content token.",
+    _LLM_LABELS,
+    LATENCY_BUCKETS,
+)
+_llm_completion_tokens = registry.histogram(
+    "llm_completion_tokens",
+    "Completion tokens per call.",
+    ("call", "route", "model"),
+    (50, 100, 250, 500, 1000, 1500, 2000, 3000, 4000, 8000),
+)
+
+
+def _template_label(template: Optional[str]) -> str:
+    t = (template or "").strip().lower()
+    if not t:
+        return "none"
+    return t if t in _KNOWN_TEMPLATES else "other"
+
+
+def _outcome_for(exc: BaseException) -> str:
+    if isinstance(exc, (APITimeoutError, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, RateLimitError) or getattr(exc, "status_code", None) == 429:
+        return "rate_limited"
+    return "error"
+
+
+def _record_call(
+    *,
+    call: str,
+    route: str,
+    template: Optional[str],
+    started: float,
+    outcome: str,
+    usage: Any = None,
+    finish_reason: Optional[str] = None,
+    ttft: Optional[float] = None,
+) -> None:
+    """Feed one upstream call into the /metrics histograms and counters."""
+    model = settings.openai_model
+    labels = {"call": call, "route": route, "template": _template_label(template), "model": model}
+    _llm_latency.observe(time.perf_counter() - started, outcome=outcome, **labels)
+    _llm_requests.inc(outcome=outcome, finish_reason=finish_reason or "none", **labels)
+    if ttft is not None:
+        _llm_ttft.observe(ttft, **labels)
+    if usage is None:
+        return
+
+    prompt_tokens = int(getattr(usage, "prompt_tokens", 0) or 0)
+    completion_tokens = int(getattr(usage, "completion_tokens", 0) or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = int(getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+
+    _llm_tokens.inc(prompt_tokens, kind="prompt", **labels)
+    _llm_tokens.inc(completion_tokens, kind="completion", **labels)
+    if cached_tokens:
+        _llm_tokens.inc(cached_tokens, kind="cached", **labels)
+    _llm_completion_tokens.observe(completion_tokens, call=call, route=route, model=model)
+
+    price = _price_for(model)
+    if price:
+        in_price, cached_price, out_price = price
+        cost = (
+            (prompt_tokens - cached_tokens) * in_price + cached_tokens * cached_price + completion_tokens * out_price
+        ) / 1_000_000
+        _llm_cost.inc(cost, route=route, model=model)
+
+
+def _price_for(model: str) -> Optional[tuple]:
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") bill like their base model.
+    m = (model or "").lower()
+    for name in sorted(_PRICING_PER_1M, key=len, reverse=True):
+        if m == name or m.startswith(name + "-"):
+            return _PRICING_PER_1M[name]
+    return None
+
+
+def _finish_reason(resp: Any) -> Optional[str]:
+    try:
+        return resp.choices[0].finish_reason
+    except Exception:
+        return None
+
+
 def _client() -> OpenAI:
     if not settings.openai_api_key:
         raise HTTPException(
@@ -21,28 +157,59 @@ def _client() -> OpenAI:
     return OpenAI(api_key=settings.openai_api_key, timeout=45.0, max_retries=2)
 
 
-def chat(*, messages: List[Dict[str, str]], system_prompt: str, temperature: float, max_tokens: int) -> str:
+def chat(
+    *,
+    messages: List[Dict[str, str]],
+    system_prompt: str,
+    temperature: float,
+    max_tokens: int,
+    route: str = "chat",
+) -> str:
+    client = _client()
+    started = time.perf_counter()
     try:
-        resp = _client().chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                *messages,
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
-        return (resp.choices[0].message.content or "").strip()
-    except HTTPException:
-        raise
+        with span(f"llm.{route}"):
+            resp = client.chat.completions.create(
+                model=settings.openai_model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    *messages,
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
     except Exception as e:  # pragma: no cover
+        _record_call(call="chat", route=route, template=None, started=started, outcome=_outcome_for(e))
         raise HTTPException(status_code=502, detail=f"Upstream AI error: {e}")
+    _record_call(
+        call="chat",
+        route=route,
+        template=None,
+        started=started,
+        outcome="ok",
+        usage=getattr(resp, "usage", None),
+        finish_reason=_finish_reason(resp),
+    )
+    return (resp.choices[0].message.content or "").strip()
 
 
-def chat_stream(*, messages: List[Dict[str, str]], system_prompt: str, temperature: float, max_tokens: int):
+def chat_stream(
+    *,
+    messages: List[Dict[str, str]],
+    system_prompt: str,
+    temperature: float,
+    max_tokens: int,
+    route: str = "chat_stream",
+):
     """Yield assistant tokens as they stream from OpenAI."""
+    client = _client()
+    started = time.perf_counter()
+    ttft: Optional[float] = None
+    usage: Any = None
+    finish_reason: Optional[str] = None
+    outcome = "ok"
     try:
-        stream = _client().chat.completions.create(
+        stream = client.chat.completions.create(
             model=settings.openai_model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -51,18 +218,40 @@ def chat_stream(*, messages: List[Dict[str, str]], system_prompt: str, temperatu
             temperature=temperature,
             max_tokens=max_tokens,
             stream=True,
+            # Final chunk carries usage (with empty choices).
+            stream_options={"include_usage": True},
         )
         for event in stream:
+            if getattr(event, "usage", None) is not None:
+                usage = event.usage
             try:
-                delta = event.choices[0].delta.content  # type: ignore[attr-defined]
+                choice = event.choices[0]  # type: ignore[attr-defined]
+                delta = choice.delta.content
+                finish_reason = choice.finish_reason or finish_reason
             except Exception:
                 delta = None
             if delta:
+                if ttft is None:
+                    ttft = time.perf_counter() - started
                 yield delta
-    except HTTPException:
+    except GeneratorExit:
+        # Client went away mid-stream.
+        outcome = "cancelled"
         raise
     except Exception as e:  # pragma: no cover
+        outcome = _outcome_for(e)
         raise HTTPException(status_code=502, detail=f"Upstream AI error: {e}")
+    finally:
+        _record_call(
+            call="chat_stream",
+            route=route,
+            template=None,
+            started=started,
+            outcome=outcome,
+            usage=usage,
+            finish_reason=finish_reason,
+            ttft=ttft,
+        )
 
 
 def generate_json(
@@ -72,44 +261,41 @@ def generate_json(
     temperature: float,
     max_tokens: int,
     extra_context: Optional[Dict[str, Any]] = None,
+    route: str = "generate",
+    template: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Generate a JSON object from a prompt.
 
     Uses response_format=json_object when supported.
     Falls back to JSON extraction if model returns text.
+    `route`/`template` only label the call in /metrics.
     """
 
     user_payload: Dict[str, Any] = {"prompt": prompt}
     if extra_context:
         user_payload["context"] = extra_context
 
+    client = _client()
+    started = time.perf_counter()
+    request: Dict[str, Any] = {
+        "model": settings.openai_model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": json.dumps(user_payload)},
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
     try:
-        resp = _client().chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": json.dumps(user_payload)},
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            response_format={"type": "json_object"},
-        )
-        text = (resp.choices[0].message.content or "").strip()
-    except TypeError:
-        # Some models/SDK versions may not support response_format
-        resp = _client().chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": json.dumps(user_payload)},
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
+        with span(f"llm.{route}"):
+            try:
+                resp = client.chat.completions.create(**request, response_format={"type": "json_object"})
+            except TypeError:
+                # Some models/SDK versions may not support response_format
+                resp = client.chat.completions.create(**request)
         text = (resp.choices[0].message.content or "").strip()
-    except HTTPException:
-        raise
     except Exception as e:  # pragma: no cover
+        _record_call(call="generate_json", route=route, template=template, started=started, outcome=_outcome_for(e))
         # Log the actual error for debugging
         import traceback
         error_detail = str(e)
@@ -119,16 +305,40 @@ def generate_json(
         print(f"Model: {settings.openai_model}, API Key set: {bool(settings.openai_api_key)}")
         raise HTTPException(status_code=502, detail=f"Upstream AI error: {error_detail}")
 
+    usage = getattr(resp, "usage", None)
+    finish_reason = _finish_reason(resp)
+
     # Parse JSON
     try:
-        return json.loads(text)
+        data = json.loads(text)
     except json.JSONDecodeError:
         # Best-effort: extract first {...} block
+        data = None
         start = text.find("{")
         end = text.rfind("}")
         if start != -1 and end != -1 and end > start:
             try:
-                return json.loads(text[start : end + 1])
+                data = json.loads(text[start : end + 1])
             except Exception:
                 pass
+    if data is None:
+        _record_call(
+            call="generate_json",
+            route=route,
+            template=template,
+            started=started,
+            outcome="invalid_json",
+            usage=usage,
+            finish_reason=finish_reason,
+        )
         raise HTTPException(status_code=502, detail="AI returned non-JSON output.")
+    _record_call(
+        call="generate_json",
+        route=route,
+        template=template,
+        started=started,
+        outcome="ok",
+        usage=usage,
+        finish_reason=finish_reason,
+    )
+    return data
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+from app.services.metrics import registry
+from app.services.security import hash_password, verify_password
+from app.settings import settings
+
+T = TypeVar("T")
+
+_HASH_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 12)
+
+_in_flight = registry.gauge(
+    "password_hash_in_flight",
+    "PBKDF2 jobs queued or running in the password pool.",
+)
+_duration = registry.histogram(
+    "password_hash_seconds",
+    "Time from submit to result for PBKDF2 jobs, including queue wait (op=hash|verify).",
+    ("op",),
+    _HASH_BUCKETS,
+)
+_rejected = registry.counter(
+    "password_hash_rejected_total",
+    "PBKDF2 jobs refused before queueing (reason=queue_full|per_ip|per_email).",
+    ("reason",),
+)
+
+
+class PasswordPoolBusy(RuntimeError):
+    """Raised instead of queueing when a limit is hit; `reason` is the metric label."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class PasswordPool:
+    """PBKDF2 hashing on a dedicated process pool.
+
+    Hashes never run on the request thread pool, so a login burst queues here
+    instead of starving unrelated endpoints. Admission is bounded three ways:
+    total jobs in flight, and concurrent jobs per client IP and per email. Over a
+    limit the caller gets PasswordPoolBusy immediately rather than a long wait.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, per_ip: int, per_email: int):
+        self._workers = max(1, workers)
+        self._queue_limit = max(1, queue_limit)
+        self._per_ip = per_ip
+        self._per_email = per_email
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._total = 0
+        self._by_ip: Dict[str, int] = {}
+        self._by_email: Dict[str, int] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs threads (uvicorn, flushers) is unsafe.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _discard(self, broken: ProcessPoolExecutor) -> None:
+        """Forget a pool whose worker died so the next job builds a new one."""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        # A worker killed mid-job (OOM, segfault) breaks the whole pool; replace it once.
+        for attempt in (0, 1):
+            pool = self._pool()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+            except BrokenProcessPool as e:
+                self._discard(pool)
+                print(f"⚠️ password pool broken, restarting it: {type(e).__name__}: {e}")
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+    def start(self) -> None:
+        """Spawn the workers up front so the first login doesn't pay for it."""
+        pool = self._pool()
+        for _ in range(self._workers):
+            pool.submit(os.getpid)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _acquire_key(counts: Dict[str, int], key: str, limit: int) -> bool:
+        if not key or limit <= 0:
+            return True
+        if counts.get(key, 0) >= limit:
+            return False
+        counts[key] = counts.get(key, 0) + 1
+        return True
+
+    @staticmethod
+    def _release_key(counts: Dict[str, int], key: str, limit: int) -> None:
+        if not key or limit <= 0:
+            return
+        n = counts.get(key, 0) - 1
+        if n > 0:
+            counts[key] = n
+        else:
+            counts.pop(key, None)
+
+    @contextmanager
+    def _admit(self, ip: str, email: str) -> Iterator[None]:
+        with self._lock:
+            if self._total >= self._queue_limit:
+                reason = "queue_full"
+            elif not self._acquire_key(self._by_ip, ip, self._per_ip):
+                reason = "per_ip"
+            elif not self._acquire_key(self._by_email, email, self._per_email):
+                self._release_key(self._by_ip, ip, self._per_ip)
+                reason = "per_email"
+            else:
+                reason = ""
+                self._total += 1
+        if reason:
+            _rejected.inc(reason=reason)
+            raise PasswordPoolBusy(reason)
+        _in_flight.inc()
+        try:
+            yield
+        finally:
+            _in_flight.dec()
+            with self._lock:
+                self._total -= 1
+                self._release_key(self._by_ip, ip, self._per_ip)
+                self._release_key(self._by_email, email, self._per_email)
+
+    async def hash(self, password: str, *, ip: str = "", email: str = "") -> str:
+        with self._admit(ip, (email or "").lower()):
+            started = time.perf_counter()
+            try:
+                return await self._run(hash_password, password)
+            finally:
+                _duration.observe(time.perf_counter() - started, op="hash")
+
+    async def verify(self, password: str, stored: str, *, ip: str = "", email: str = "") -> bool:
+        with self._admit(ip, (email or "").lower()):
+            started = time.perf_counter()
+            try:
+                return await self._run(verify_password, password, stored)
+            finally:
+                _duration.observe(time.perf_counter() - started, op="verify")
+
+
+password_pool = PasswordPool(
+    workers=settings.password_hash_workers or min(4, os.cpu_count() or 1),
+    queue_limit=settings.password_hash_queue_limit,
+    per_ip=settings.password_hash_per_ip,
+    per_email=settings.password_hash_per_email,
+)
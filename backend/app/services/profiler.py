@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+# A thread whose innermost Python frame is one of these is parked, not working.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # concurrent.futures idle worker
+    ("_base.py", "result"),
+    ("socket.py", "accept"),
+}
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_label(code, lineno: Optional[int]) -> str:
+    filename = os.path.basename(code.co_filename)
+    if lineno is None:
+        return f"{code.co_name} ({filename})"
+    return f"{code.co_name} ({filename}:{lineno})"
+
+
+def sample_stacks(
+    seconds: float,
+    *,
+    hz: float = 100.0,
+    include_idle: bool = False,
+    with_lines: bool = False,
+) -> Tuple[Dict[str, int], int]:
+    """Sample every thread's Python stack for `seconds` and count collapsed stacks.
+
+    Returns ({"thread;outer;...;leaf": samples}, number of sampling rounds). Only
+    one profile runs at a time; nothing runs between profiles.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        own = threading.get_ident()
+        interval = 1.0 / max(1.0, min(hz, 1000.0))
+        counts: Counter = Counter()
+        names: Dict[int, str] = {}
+        rounds = 0
+        deadline = time.perf_counter() + seconds
+        next_tick = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                leaf = frame.f_code
+                if not include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                    continue
+                stack = []
+                f = frame
+                while f is not None:
+                    stack.append(_frame_label(f.f_code, f.f_lineno if with_lines else None))
+                    f = f.f_back
+                stack.append(names.get(tid, f"thread-{tid}"))
+                counts[";".join(reversed(stack))] += 1
+            del frames
+            rounds += 1
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (GIL contention); don't try to catch up in a burst.
+                next_tick = time.perf_counter()
+        return dict(counts), rounds
+    finally:
+        _busy.release()
+
+
+def collapsed(counts: Dict[str, int]) -> str:
+    """Brendan Gregg's folded format, ready for flamegraph.pl / speedscope."""
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]))
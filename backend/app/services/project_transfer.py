@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import io
+import re
+import sys
+import time
+import zipfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from app.services import json_body
+
+# Bulk export/import of projects. One NDJSON line is one project:
+#   {"id", "name", "description", "version", "created_at", "updated_at",
+#    "files": [{"path", "content"}], ...}
+# Everything here works on one project at a time, so memory is bounded by the
+# largest project, not by how many there are.
+
+# Projects inserted per transaction on import.
+IMPORT_BATCH = 50
+# A single line (project) larger than this is rejected rather than buffered.
+MAX_LINE_BYTES = 64 * 1024 * 1024
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+def ndjson_chunks(projects: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    for proj in projects:
+        yield json_body.dumps(proj) + b"\n"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file that hands back what was written since the last drain()."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _zip_name(part: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9._-]+", "_", part or "").strip("._-")
+
+
+def _zip_path(path: str) -> str:
+    # Stored paths are user input; never let one climb out of its project folder.
+    return "/".join(p for p in path.replace("\\", "/").split("/") if p not in ("", ".", ".."))
+
+
+def zip_chunks(projects: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """A zip with one `<name>-<id>/` folder per project (its files plus project.json), written incrementally.
+
+    ZipFile writes to an unseekable sink in streaming mode (sizes go in data
+    descriptors), so each project's compressed bytes are yielded as soon as it
+    is written; only the central directory accumulates until the end.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for proj in projects:
+            folder = f"{_zip_name(proj.get('name')) or 'project'}-{_zip_name(str(proj.get('id')))}"
+            for f in proj.get("files") or []:
+                path = _zip_path(str(f.get("path") or ""))
+                if path:
+                    zf.writestr(f"{folder}/{path}", f.get("content") or "")
+            meta = {k: v for k, v in proj.items() if k != "files"}
+            zf.writestr(f"{folder}/project.json", json_body.dumps(meta))
+            yield sink.drain()
+    yield sink.drain()
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes], max_line: int = MAX_LINE_BYTES) -> AsyncIterator[bytes]:
+    """Non-empty lines of an NDJSON byte stream, buffering at most one line."""
+    buf = bytearray()
+    async for chunk in chunks:
+        buf += chunk
+        start = 0
+        while True:
+            end = buf.find(b"\n", start)
+            if end < 0:
+                break
+            line = bytes(buf[start:end]).strip()
+            start = end + 1
+            if line:
+                yield line
+        del buf[:start]
+        if len(buf) > max_line:
+            raise LineTooLong(f"line longer than {max_line} bytes")
+    if buf.strip():
+        yield bytes(buf).strip()
+
+
+def _timestamp(v: Any) -> Optional[datetime]:
+    if v is None:
+        return None
+    if not isinstance(v, str):
+        raise ValueError("timestamps must be ISO strings")
+    return datetime.fromisoformat(v)
+
+
+def parse_project(line: bytes) -> Dict[str, Any]:
+    """One exported project line -> import_projects input. Raises ValueError when malformed."""
+    rec = json_body.loads(line)
+    if not isinstance(rec, dict):
+        raise ValueError("expected a JSON object")
+    name = rec.get("name")
+    files = rec.get("files")
+    description = rec.get("description")
+    if not isinstance(name, str) or not name:
+        raise ValueError("'name' must be a non-empty string")
+    if not isinstance(files, list):
+        raise ValueError("'files' must be a list")
+    if description is not None and not isinstance(description, str):
+        raise ValueError("'description' must be a string")
+    out_files = []
+    for f in files:
+        if not isinstance(f, dict) or not isinstance(f.get("path"), str) or not isinstance(f.get("content"), str):
+            raise ValueError("each file needs string 'path' and 'content'")
+        out_files.append({"path": f["path"], "content": f["content"]})
+    return {
+        "name": name,
+        "description": description,
+        "files": out_files,
+        "created_at": _timestamp(rec.get("created_at")),
+        "updated_at": _timestamp(rec.get("updated_at")),
+    }
+
+
+class Progress:
+    """Periodic "label: N projects, X MiB, R/s" lines for long-running transfers (admin scripts)."""
+
+    def __init__(self, label: str, total: Optional[int] = None, every_seconds: float = 2.0, out: TextIO = sys.stderr):
+        self.label = label
+        self.total = total
+        self.projects = 0
+        self.bytes = 0
+        self._every = every_seconds
+        self._out = out
+        self._start = self._last = time.monotonic()
+
+    def add(self, projects: int = 1, nbytes: int = 0) -> None:
+        self.projects += projects
+        self.bytes += nbytes
+        now = time.monotonic()
+        if now - self._last >= self._every:
+            self._last = now
+            self._print(now)
+
+    def done(self) -> None:
+        self._print(time.monotonic(), final=True)
+
+    def _print(self, now: float, final: bool = False) -> None:
+        elapsed = max(now - self._start, 1e-9)
+        count = f"{self.projects}/{self.total}" if self.total is not None else str(self.projects)
+        line = (
+            f"{self.label}: {count} projects, {self.bytes / (1024 * 1024):.1f} MiB, "
+            f"{self.projects / elapsed:.0f}/s"
+        )
+        if final:
+            line += f" (done in {elapsed:.1f}s)"
+        print(line, file=self._out, flush=True)
@@ -3,7 +3,12 @@ from __future__ import annotations
 import base64
 import hashlib
 import hmac
+import json
 import secrets
+import time
+from typing import Any, Dict, Optional
+
+from app.settings import settings
 
 
 _PBKDF2_NAME = "pbkdf2_sha256"
@@ -45,3 +50,67 @@ def _pad_b64(s: str) -> str:
     # urlsafe_b64decode requires proper padding.
     return s + "=" * (-len(s) % 4)
 
+
+_ephemeral_signing_key: Optional[bytes] = None
+
+
+def require_signing_secret() -> None:
+    """Refuse to start signed auth sessions without a shared key (call at startup)."""
+    if settings.auth_session_mode == "signed" and not settings.session_signing_secret:
+        raise RuntimeError(
+            "AUTH_SESSION_MODE=signed requires SESSION_SIGNING_SECRET; a per-process key would log "
+            "users out on every restart and fail across workers."
+        )
+
+
+def _signing_key() -> bytes:
+    global _ephemeral_signing_key
+    if settings.session_signing_secret:
+        return settings.session_signing_secret.encode("utf-8")
+    require_signing_secret()
+    if _ephemeral_signing_key is None:
+        _ephemeral_signing_key = secrets.token_bytes(32)
+        print(
+            "⚠️ SESSION_SIGNING_SECRET is not set; using a per-process key. Signed tokens will not "
+            "verify across workers or restarts."
+        )
+    return _ephemeral_signing_key
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def sign_token(purpose: str, claims: Dict[str, Any], ttl_seconds: int) -> str:
+    """HMAC-SHA256-signed, expiring token: <b64url(json claims)>.<b64url(mac)>.
+
+    `purpose` is bound into the signed claims so a token minted for one use
+    (e.g. a plugin capability) is never accepted for another.
+    """
+    body = dict(claims)
+    body["p"] = purpose
+    body["exp"] = int(time.time()) + int(ttl_seconds)
+    payload = _b64(json.dumps(body, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    mac = hmac.new(_signing_key(), payload.encode("ascii"), hashlib.sha256).digest()
+    return f"{payload}.{_b64(mac)}"
+
+
+def verify_token(token: str, purpose: str) -> Optional[Dict[str, Any]]:
+    """Claims of a valid, unexpired token for `purpose`; None otherwise. Constant-time MAC check."""
+    try:
+        payload, mac_b64 = (token or "").split(".", 1)
+        mac = base64.urlsafe_b64decode(_pad_b64(mac_b64))
+    except Exception:
+        return None
+    expected = hmac.new(_signing_key(), payload.encode("ascii", "replace"), hashlib.sha256).digest()
+    if not hmac.compare_digest(mac, expected):
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(_pad_b64(payload)))
+    except Exception:
+        return None
+    if not isinstance(claims, dict) or claims.get("p") != purpose:
+        return None
+    if int(claims.get("exp") or 0) <= time.time():
+        return None
+    return claims
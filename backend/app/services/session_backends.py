@@ -0,0 +1,504 @@
+from __future__ import annotations
+
+import heapq
+import os
+import select
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+from app.services.metrics import registry
+
+
+class SessionBackend:
+    """Byte-level key/value storage with per-key expiry.
+
+    Every backend has the same TTL semantics: a value is visible until
+    `time.time() >= expires_at`, and `get` never returns an expired value even if
+    it has not been reaped yet.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, refs: Sequence[str] = ()) -> None:
+        """Store `value`; `refs` are keys it points at, which budget eviction must keep while it lives."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str, ttl_seconds: float) -> int:
+        """Atomically add 1 to the counter at `key` (0 if absent or expired) and return it; expiry becomes now + ttl."""
+        raise NotImplementedError
+
+    def touch(self, key: str, ttl_seconds: float) -> bool:
+        """Push `key`'s expiry out to now + ttl_seconds; False if it is not (or no longer) stored."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+_evictions = registry.counter(
+    "session_store_evictions_total",
+    "Session store entries dropped before expiry to stay under SESSION_STORE_MAX_BYTES.",
+)
+
+
+class _Item:
+    __slots__ = ("expires_at", "value", "queued_at", "refs")
+
+    def __init__(self, expires_at: float, value: bytes, queued_at: float, refs: Tuple[str, ...]):
+        self.expires_at = expires_at
+        self.value = value
+        # Deadline of this key's one live heap entry; <= expires_at (touch only moves expires_at).
+        self.queued_at = queued_at
+        self.refs = refs
+
+
+class _Shard:
+    __slots__ = ("lock", "items", "heap", "nbytes")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # Insertion/access ordered: the front is the least recently used entry.
+        self.items: "OrderedDict[str, _Item]" = OrderedDict()
+        # (deadline, key); an entry is live only while it matches items[key].queued_at,
+        # anything else is stale (overwrite/delete) and is skipped when popped.
+        self.heap: List[Tuple[float, str]] = []
+        self.nbytes = 0
+
+
+class MemoryBackend(SessionBackend):
+    """Process-local store, lock-striped across shards.
+
+    Expiry is tracked per shard in a min-heap holding one live entry per key:
+    `get` is a dict lookup that never scans, `touch` moves the deadline in place
+    (the entry is re-queued when it surfaces early), and each `set` reaps at most
+    `reap_batch` entries off the heap top, so reaping cost is amortized O(log n).
+    With `max_bytes` set, each shard also evicts least-recently-used values to
+    stay within its share of the budget, skipping keys that a live value lists
+    in its `refs`. Sessions die with the process; use SQLite/Redis for more than
+    one worker.
+    """
+
+    def __init__(self, shards: int = 16, reap_batch: int = 8, max_bytes: int = 0):
+        n = 1
+        while n < max(1, shards):
+            n <<= 1
+        self._mask = n - 1
+        self._shards = [_Shard() for _ in range(n)]
+        self._reap_batch = max(1, reap_batch)
+        self._shard_budget = max(0, max_bytes) // n
+        # key -> number of live values listing it in their refs. Lock order: shard, then this.
+        self._refs: Dict[str, int] = {}
+        self._refs_lock = threading.Lock()
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) & self._mask]
+
+    def _drop(self, shard: _Shard, key: str) -> None:
+        # Caller holds shard.lock.
+        item = shard.items.pop(key, None)
+        if item is None:
+            return
+        shard.nbytes -= len(item.value)
+        if item.refs:
+            with self._refs_lock:
+                for ref in item.refs:
+                    left = self._refs.get(ref, 0) - 1
+                    if left > 0:
+                        self._refs[ref] = left
+                    else:
+                        self._refs.pop(ref, None)
+
+    def _reap_shard(self, shard: _Shard, now: float, limit: Optional[int]) -> int:
+        # Caller holds shard.lock.
+        heap, items = shard.heap, shard.items
+        reaped = 0
+        while heap and heap[0][0] <= now and (limit is None or reaped < limit):
+            deadline, key = heapq.heappop(heap)
+            reaped += 1
+            item = items.get(key)
+            if item is None or item.queued_at != deadline:
+                continue
+            if item.expires_at <= now:
+                self._drop(shard, key)
+            else:
+                # Touched since it was queued: re-queue at the new deadline.
+                item.queued_at = item.expires_at
+                heapq.heappush(heap, (item.expires_at, key))
+        return reaped
+
+    def _reap(self, now: float) -> int:
+        """Reap everything expired in every shard (maintenance / benchmarks only)."""
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                total += self._reap_shard(shard, now, None)
+        return total
+
+    def _evict(self, shard: _Shard, keep: str) -> int:
+        # Caller holds shard.lock. Referenced keys rotate to the back instead of going.
+        evicted = 0
+        skipped = 0
+        while shard.nbytes > self._shard_budget and skipped < len(shard.items):
+            key = next(iter(shard.items))
+            with self._refs_lock:
+                pinned = key == keep or key in self._refs
+            if pinned:
+                shard.items.move_to_end(key)
+                skipped += 1
+                continue
+            self._drop(shard, key)
+            evicted += 1
+        return evicted
+
+    def __len__(self) -> int:
+        return sum(len(s.items) for s in self._shards)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in self._shards)
+
+    def get(self, key: str) -> Optional[bytes]:
+        shard = self._shard(key)
+        with shard.lock:
+            item = shard.items.get(key)
+            if item is None:
+                return None
+            if item.expires_at <= time.time():
+                self._drop(shard, key)
+                return None
+            if self._shard_budget:
+                shard.items.move_to_end(key)
+            return item.value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, refs: Sequence[str] = ()) -> None:
+        now = time.time()
+        exp = now + ttl_seconds
+        refs = tuple(refs)
+        if refs:
+            # Counted before the old value's refs are released, so a ref kept across
+            # the overwrite never drops to zero.
+            with self._refs_lock:
+                for ref in refs:
+                    self._refs[ref] = self._refs.get(ref, 0) + 1
+        shard = self._shard(key)
+        with shard.lock:
+            self._put(shard, key, value, exp, refs, now)
+
+    def _put(self, shard: _Shard, key: str, value: bytes, exp: float, refs: Tuple[str, ...], now: float) -> None:
+        # Caller holds shard.lock.
+        old = shard.items.get(key)
+        self._drop(shard, key)
+        if old is not None and old.queued_at <= exp:
+            # The queued entry fires no later than the new deadline; keep it.
+            queued_at = old.queued_at
+        else:
+            queued_at = exp
+            heapq.heappush(shard.heap, (exp, key))
+        shard.items[key] = _Item(exp, value, queued_at, refs)
+        shard.nbytes += len(value)
+        self._reap_shard(shard, now, self._reap_batch)
+        if self._shard_budget and shard.nbytes > self._shard_budget:
+            # Never evict the value just written, even if it alone exceeds the budget.
+            evicted = self._evict(shard, key)
+            if evicted:
+                _evictions.inc(evicted)
+
+    def delete(self, key: str) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            self._drop(shard, key)
+
+    def incr(self, key: str, ttl_seconds: float) -> int:
+        now = time.time()
+        shard = self._shard(key)
+        with shard.lock:
+            item = shard.items.get(key)
+            n = int(item.value) + 1 if item is not None and item.expires_at > now else 1
+            self._put(shard, key, str(n).encode("ascii"), now + ttl_seconds, (), now)
+            return n
+
+    def touch(self, key: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        shard = self._shard(key)
+        with shard.lock:
+            item = shard.items.get(key)
+            if item is None or item.expires_at <= now:
+                return False
+            item.expires_at = max(item.expires_at, now + ttl_seconds)
+            shard.items.move_to_end(key)
+            return True
+
+
+class SqliteBackend(SessionBackend):
+    """SQLite file in WAL mode, shared by every worker on one host.
+
+    One connection per thread; readers never block the (single) writer.
+    """
+
+    _PURGE_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS roblox_sessions ("
+            " sid TEXT PRIMARY KEY, expires_at REAL NOT NULL, data BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_roblox_sessions_expires_at ON roblox_sessions(expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float) -> None:
+        if now - self._last_purge < self._PURGE_INTERVAL_SECONDS:
+            return
+        if not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            conn.execute("DELETE FROM roblox_sessions WHERE expires_at <= ?", (now,))
+        finally:
+            self._purge_lock.release()
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT data FROM roblox_sessions WHERE sid = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, refs: Sequence[str] = ()) -> None:
+        # Nothing is evicted early here, so refs need no tracking.
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO roblox_sessions (sid, expires_at, data) VALUES (?, ?, ?)",
+            (key, now + ttl_seconds, sqlite3.Binary(value)),
+        )
+        self._maybe_purge(conn, now)
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM roblox_sessions WHERE sid = ?", (key,))
+
+    def incr(self, key: str, ttl_seconds: float) -> int:
+        now = time.time()
+        conn = self._conn()
+        # The write lock is taken up front, so concurrent increments serialize.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM roblox_sessions WHERE sid = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            n = int(bytes(row[0])) + 1 if row else 1
+            conn.execute(
+                "INSERT OR REPLACE INTO roblox_sessions (sid, expires_at, data) VALUES (?, ?, ?)",
+                (key, now + ttl_seconds, sqlite3.Binary(str(n).encode("ascii"))),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return n
+
+    def touch(self, key: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE roblox_sessions SET expires_at = MAX(expires_at, ?) WHERE sid = ? AND expires_at > ?",
+            (now + ttl_seconds, key, now),
+        )
+        return cur.rowcount > 0
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisError(RuntimeError):
+    pass
+
+
+class RedisBackend(SessionBackend):
+    """Minimal RESP2 client (GET / SET PX / DEL / PEXPIRE, MULTI-wrapped INCR) over a plain socket.
+
+    Speaks only the protocol, so it works against Redis, Valkey, KeyDB or any
+    local stand-in. Expiry is delegated to the server via `SET ... PX`.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "vibe:session:", timeout: float = 2.0):
+        u = urlparse(url)
+        self._host = u.hostname or "127.0.0.1"
+        self._port = u.port or 6379
+        self._password = unquote(u.password) if u.password else None
+        self._username = unquote(u.username) if u.username else None
+        path = (u.path or "").strip("/")
+        self._db = int(path) if path.isdigit() else 0
+        self._prefix = key_prefix
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> Tuple[socket.socket, Any]:
+        sock = socket.create_connection((self._host, self._port), timeout=self._timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        rfile = sock.makefile("rb")
+        self._local.conn = (sock, rfile)
+        if self._password:
+            auth = ["AUTH", self._username, self._password] if self._username else ["AUTH", self._password]
+            self._roundtrip(sock, rfile, auth)
+        if self._db:
+            self._roundtrip(sock, rfile, ["SELECT", str(self._db)])
+        return sock, rfile
+
+    def _drop(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn[1].close()
+                conn[0].close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _encode(args: List[Any]) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+            out.append(b"$%d\r\n" % len(b))
+            out.append(b)
+            out.append(b"\r\n")
+        return b"".join(out)
+
+    @classmethod
+    def _read_reply(cls, rfile: Any) -> Any:
+        line = rfile.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = rfile.read(n + 2)
+            if len(data) != n + 2:
+                raise ConnectionError("redis connection closed")
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [cls._read_reply(rfile) for _ in range(n)]
+        raise RedisError(f"unexpected reply type {kind!r}")
+
+    def _roundtrip(self, sock: socket.socket, rfile: Any, args: List[Any]) -> Any:
+        sock.sendall(self._encode(args))
+        return self._read_reply(rfile)
+
+    def _conn(self) -> Tuple[socket.socket, Any]:
+        conn = getattr(self._local, "conn", None)
+        # RESP2 servers never write unprompted, so a readable idle socket has been
+        # closed (idle timeout, proxy, restart): reconnect before sending anything.
+        if conn is not None and (conn[0].fileno() < 0 or select.select([conn[0]], [], [], 0)[0]):
+            self._drop()
+            conn = None
+        return conn if conn is not None else self._connect()
+
+    def _send(self, commands: List[List[Any]], retry: bool) -> List[Any]:
+        """Send `commands` in one write and read their replies.
+
+        A failed connect or send is retried once. A failure after the commands
+        went out is only retried when `retry` is set: a timed-out INCR may
+        already have been applied.
+        """
+        for attempt in (0, 1):
+            sent = False
+            try:
+                sock, rfile = self._conn()
+                sock.sendall(b"".join(self._encode(c) for c in commands))
+                sent = True
+                return [self._read_reply(rfile) for _ in commands]
+            except (OSError, ConnectionError):
+                self._drop()
+                if attempt or (sent and not retry):
+                    raise
+            except RedisError:
+                if len(commands) > 1:
+                    # Replies after the error are still unread; start clean.
+                    self._drop()
+                raise
+
+    def _call(self, *args: Any) -> Any:
+        """One idempotent command (safe to resend if the reply is lost)."""
+        return self._send([list(args)], retry=True)[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._call("GET", self._prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, refs: Sequence[str] = ()) -> None:
+        # refs are not tracked server-side; see backend_from_url about maxmemory.
+        self._call("SET", self._prefix + key, value, "PX", max(1, int(ttl_seconds * 1000)))
+
+    def delete(self, key: str) -> None:
+        self._call("DEL", self._prefix + key)
+
+    def incr(self, key: str, ttl_seconds: float) -> int:
+        # One MULTI block, so the counter never lives on without a TTL; never resent.
+        k = self._prefix + key
+        ms = max(1, int(ttl_seconds * 1000))
+        replies = self._send([["MULTI"], ["INCR", k], ["PEXPIRE", k, ms], ["EXEC"]], retry=False)
+        return int(replies[-1][0])
+
+    def touch(self, key: str, ttl_seconds: float) -> bool:
+        # GT (Redis 7+) would avoid shortening; callers always pass their longest TTL.
+        return bool(self._call("PEXPIRE", self._prefix + key, max(1, int(ttl_seconds * 1000))))
+
+    def close(self) -> None:
+        self._drop()
+
+
+def backend_from_url(url: str, max_bytes: int = 0) -> SessionBackend:
+    """memory:// | sqlite:///relative.db | sqlite:////abs/path.db | redis://[:pw@]host:port/db
+
+    `max_bytes` only bounds the memory backend; for Redis configure maxmemory with
+    an LRU policy (which, unlike the memory backend, may drop a blob a live session
+    still uses; that session then reads as expired), and SQLite lives on disk.
+    """
+    url = (url or "memory://").strip()
+    scheme = url.split(":", 1)[0].lower()
+    if scheme == "memory":
+        return MemoryBackend(max_bytes=max_bytes)
+    if scheme == "sqlite":
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else ""
+        if not path:
+            raise ValueError("SESSION_STORE_URL sqlite form is sqlite:///path/to/sessions.db")
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        return SqliteBackend(path)
+    if scheme in ("redis", "rediss"):
+        if scheme == "rediss":
+            raise ValueError("rediss:// (TLS) is not supported; terminate TLS in a local proxy")
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported SESSION_STORE_URL scheme: {scheme!r}")
@@ -1,45 +1,301 @@
 from __future__ import annotations
 
+import gzip
+import hashlib
+import json
+import struct
+import threading
 import time
 import uuid
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.services import blob_codec
+from app.services.session_backends import SessionBackend, backend_from_url
+from app.services.tracing import traced
+from app.settings import settings
 
-@dataclass
-class SessionItem:
-    created_at: float
-    pack: Dict[str, Any]
+# Session record = 8-byte big-endian expires_at (unix seconds, double) + blob_codec.pack(JSON
+# {"p": parts, "h": content hashes, "f": file paths, "r": lineage root id}). Carrying the deadline in the value lets the
+# hot tier honour the exact TTL no matter which backend (or worker) created it.
+_HEADER = struct.Struct(">d")
+_SESSION_KEY = "s:"
+# File contents live once per distinct content under "b:<sha256>", blob_codec-packed
+# and already encoded as a JSON string literal, shared by every session using them.
+_BLOB_KEY = "b:"
+# Regenerating from a session extends its lineage. "v:<root id>" counts the
+# regenerations (an atomic backend increment, so concurrent ones get distinct
+# versions) and "l:<root id>:<version>" names each version's session, so the
+# Studio plugin can follow a lineage by its original id. The root is version 1.
+_LINEAGE_VERSION_KEY = "v:"
+_LINEAGE_KEY = "l:"
+# Versions whose record is not written yet (or already expired) that head() steps over.
+_HEAD_LOOKBACK = 8
+
+
+def _split_pack(pack: Dict[str, Any]) -> Tuple[List[str], List[bytes]]:
+    """Serialize `pack` to JSON with every file's content cut out.
+
+    Returns (parts, literals) such that parts[0] + literals[0] + parts[1] + ... +
+    parts[-1] is the pack's JSON text; literals are JSON-encoded content strings.
+    """
+    head = {k: v for k, v in pack.items() if k != "files"}
+    files = pack.get("files") or []
+    text = json.dumps(head, ensure_ascii=False, separators=(",", ":"))[:-1]
+    text += ("," if head else "") + '"files":['
+    parts: List[str] = []
+    literals: List[bytes] = []
+    for i, f in enumerate(files):
+        meta = {k: v for k, v in f.items() if k != "content"}
+        text += ("," if i else "") + json.dumps(meta, ensure_ascii=False, separators=(",", ":"))[:-1]
+        text += ("," if meta else "") + '"content":'
+        parts.append(text)
+        literals.append(json.dumps(f.get("content") or "", ensure_ascii=False).encode("utf-8"))
+        text = "}"
+    parts.append(text + "]}")
+    return parts, literals
 
 
 class SessionStore:
-    """In-memory session store for prototype.
+    """Generated-pack sessions keyed by an opaque id.
 
-    For production scale, swap to Redis/Postgres. This is intentionally simple.
+    Packs are stored as compressed bytes in a pluggable backend (memory, SQLite
+    or Redis, see SESSION_STORE_URL) so any worker can serve any session. File
+    contents are deduplicated by content hash, so thousands of sessions built
+    from the same fallback template share one copy of each script.
+
+    Two per-process caches sit in front: a small hot tier of decoded packs for
+    `get`, and a byte-bounded cache of gzipped response bodies keyed by pack
+    digest for `get_bytes`. Packs are never updated in place, so neither can go stale.
     """
 
-    def __init__(self, ttl_seconds: int = 60 * 60 * 2):
+    def __init__(
+        self,
+        backend: Optional[SessionBackend] = None,
+        ttl_seconds: int = 60 * 60 * 2,
+        hot_size: int = 256,
+        gzip_cache_bytes: int = 32 * 1024 * 1024,
+    ):
         self._ttl = ttl_seconds
-        self._items: Dict[str, SessionItem] = {}
+        self._backend = backend if backend is not None else backend_from_url("memory://")
+        self._hot: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._hot_size = max(0, hot_size)
+        self._hot_lock = threading.Lock()
+        self._gz: "OrderedDict[str, bytes]" = OrderedDict()
+        self._gz_budget = max(0, gzip_cache_bytes)
+        self._gz_bytes = 0
+        self._gz_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "SessionStore":
+        return cls(
+            backend=backend_from_url(settings.session_store_url, max_bytes=settings.session_store_max_bytes),
+            ttl_seconds=settings.session_ttl_seconds,
+            hot_size=settings.session_hot_cache_size,
+            gzip_cache_bytes=settings.session_gzip_cache_bytes,
+        )
+
+    def _remember(self, sid: str, expires_at: float, pack: Dict[str, Any]) -> None:
+        if not self._hot_size:
+            return
+        with self._hot_lock:
+            self._hot[sid] = (expires_at, pack)
+            self._hot.move_to_end(sid)
+            while len(self._hot) > self._hot_size:
+                self._hot.popitem(last=False)
 
-    def _gc(self) -> None:
-        now = time.time()
-        expired = [sid for sid, item in self._items.items() if (now - item.created_at) > self._ttl]
-        for sid in expired:
-            self._items.pop(sid, None)
+    def _put_blob(self, digest: str, literal: bytes) -> None:
+        # Blobs live for two session TTLs and are re-extended on every reuse, so a
+        # blob always outlives the sessions referencing it; the memory backend's byte
+        # budget skips blobs a live record lists in its refs.
+        key = _BLOB_KEY + digest
+        if not self._backend.touch(key, 2 * self._ttl):
+            self._backend.set(key, blob_codec.pack(literal), 2 * self._ttl)
 
-    def create(self, pack: Dict[str, Any]) -> str:
-        self._gc()
+    def _load(self, sid: str) -> Optional[Tuple[float, bytes]]:
+        data = self._backend.get(_SESSION_KEY + sid)
+        if data is None or len(data) < _HEADER.size:
+            return None
+        (expires_at,) = _HEADER.unpack_from(data)
+        if expires_at <= time.time():
+            return None
+        return expires_at, data[_HEADER.size:]
+
+    def _record(self, body: bytes) -> Dict[str, Any]:
+        return json.loads(blob_codec.unpack(body))
+
+    def _assemble(self, record: Dict[str, Any]) -> Optional[bytes]:
+        parts: List[str] = record["p"]
+        out = [parts[0].encode("utf-8")]
+        for digest, part in zip(record["h"], parts[1:]):
+            blob = self._backend.get(_BLOB_KEY + digest)
+            if blob is None:
+                return None
+            out.append(blob_codec.unpack(blob))
+            out.append(part.encode("utf-8"))
+        return b"".join(out)
+
+    @traced("session_store.create")
+    def create(self, pack: Dict[str, Any], parent: Optional[str] = None) -> str:
+        """Store `pack`; with `parent`, the new session becomes the head of the parent's lineage."""
         sid = uuid.uuid4().hex
-        self._items[sid] = SessionItem(created_at=time.time(), pack=pack)
+        expires_at = time.time() + self._ttl
+        root = sid
+        if parent:
+            loaded = self._load(parent)
+            if loaded is not None:
+                root = self._record(loaded[1]).get("r") or parent
+        parts, literals = _split_pack(pack)
+        hashes = [hashlib.sha256(literal).hexdigest() for literal in literals]
+        seen = dict(zip(hashes, literals))
+        paths = [str(f.get("path") or "") for f in (pack.get("files") or [])]
+        record = json.dumps(
+            {"p": parts, "h": hashes, "f": paths, "r": root}, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        self._backend.set(
+            _SESSION_KEY + sid,
+            _HEADER.pack(expires_at) + blob_codec.pack(record),
+            self._ttl,
+            refs=[_BLOB_KEY + d for d in seen],
+        )
+        # Blobs go in after the record that pins them, so a byte budget cannot
+        # evict one in between; nobody knows `sid` before we return it.
+        for digest, literal in seen.items():
+            self._put_blob(digest, literal)
+        if root != sid:
+            version = self._backend.incr(_LINEAGE_VERSION_KEY + root, self._ttl) + 1
+            self._backend.set(f"{_LINEAGE_KEY}{root}:{version}", sid.encode("ascii"), self._ttl)
+            # Plugins are bound to the root (or the parent they were downloaded from);
+            # keep those records alive as long as the lineage keeps advancing.
+            self._extend(root, expires_at)
+            if parent and parent != root:
+                self._extend(parent, expires_at)
+        self._remember(sid, expires_at, pack)
         return sid
 
+    @traced("session_store.get")
     def get(self, sid: str) -> Optional[Dict[str, Any]]:
-        self._gc()
-        item = self._items.get(sid)
-        if not item:
+        with self._hot_lock:
+            hit = self._hot.get(sid)
+            if hit is not None:
+                if hit[0] > time.time():
+                    self._hot.move_to_end(sid)
+                    return hit[1]
+                self._hot.pop(sid, None)
+        loaded = self._load(sid)
+        if loaded is None:
+            return None
+        raw = self._assemble(self._record(loaded[1]))
+        if raw is None:
             return None
-        return item.pack
+        pack = json.loads(raw)
+        self._remember(sid, loaded[0], pack)
+        return pack
+
+    @traced("session_store.get_bytes")
+    def get_bytes(self, sid: str, gzipped: bool = False) -> Optional[bytes]:
+        """The pack's JSON body as bytes (gzip-encoded if asked), without building dicts."""
+        loaded = self._load(sid)
+        if loaded is None:
+            return None
+        body = loaded[1]
+        if not gzipped:
+            return self._assemble(self._record(body))
+        digest = hashlib.sha256(body).hexdigest()
+        with self._gz_lock:
+            gz = self._gz.get(digest)
+            if gz is not None:
+                self._gz.move_to_end(digest)
+                return gz
+        raw = self._assemble(self._record(body))
+        if raw is None:
+            return None
+        gz = gzip.compress(raw, compresslevel=6, mtime=0)
+        if len(gz) <= self._gz_budget:
+            with self._gz_lock:
+                if digest not in self._gz:
+                    self._gz[digest] = gz
+                    self._gz_bytes += len(gz)
+                    while self._gz_bytes > self._gz_budget:
+                        _, old = self._gz.popitem(last=False)
+                        self._gz_bytes -= len(old)
+        return gz
+
+    def _extend(self, sid: str, expires_at: float) -> None:
+        data = self._backend.get(_SESSION_KEY + sid)
+        if data is None or len(data) < _HEADER.size:
+            return
+        digests = set(self._record(data[_HEADER.size:])["h"])
+        self._backend.set(
+            _SESSION_KEY + sid,
+            _HEADER.pack(expires_at) + data[_HEADER.size:],
+            self._ttl,
+            refs=[_BLOB_KEY + d for d in digests],
+        )
+        # Its blobs must outlive the record again (see _put_blob).
+        for digest in digests:
+            self._backend.touch(_BLOB_KEY + digest, 2 * self._ttl)
+
+    def _lineage(self, root: str) -> Optional[Tuple[str, int]]:
+        """(session id, version) of the newest live session in `root`'s lineage, if it was regenerated."""
+        data = self._backend.get(_LINEAGE_VERSION_KEY + root)
+        if data is None:
+            return None
+        newest = int(data) + 1
+        for version in range(newest, max(1, newest - _HEAD_LOOKBACK), -1):
+            sid = self._backend.get(f"{_LINEAGE_KEY}{root}:{version}")
+            if sid is not None and self._load(sid.decode("ascii")) is not None:
+                return sid.decode("ascii"), version
+        return None
+
+    def head(self, sid: str) -> Optional[Tuple[str, int]]:
+        """(newest session id, version) of the lineage `sid` belongs to; version 1 is the root."""
+        loaded = self._load(sid)
+        if loaded is None:
+            return None
+        root = self._record(loaded[1]).get("r") or sid
+        head = self._lineage(root)
+        if head is None:
+            # Never regenerated (or every newer version expired): the session is its own head.
+            return sid, 1
+        return head
+
+    @traced("session_store.manifest")
+    def manifest(self, sid: str) -> Optional[Dict[str, Any]]:
+        """Per-file content hashes of the newest session in `sid`'s lineage."""
+        head = self.head(sid)
+        if head is None:
+            return None
+        head_sid, version = head
+        loaded = self._load(head_sid)
+        if loaded is None:
+            return None
+        record = self._record(loaded[1])
+        paths = record.get("f")
+        if paths is None:
+            raw = self._assemble(record)
+            if raw is None:
+                return None
+            paths = [str(f.get("path") or "") for f in json.loads(raw).get("files") or []]
+        return {
+            "session_id": head_sid,
+            "root_id": record.get("r") or head_sid,
+            "version": version,
+            "files": [{"path": p, "hash": h} for p, h in zip(paths, record["h"])],
+        }
+
+    def get_file(self, digest: str) -> Optional[str]:
+        """A file's content by content hash (see `manifest`)."""
+        blob = self._backend.get(_BLOB_KEY + digest)
+        if blob is None:
+            return None
+        return json.loads(blob_codec.unpack(blob))
+
+    def delete(self, sid: str) -> None:
+        # Blobs are shared and simply expire; only the session record goes.
+        with self._hot_lock:
+            self._hot.pop(sid, None)
+        self._backend.delete(_SESSION_KEY + sid)
 
 
-session_store = SessionStore()
+session_store = SessionStore.from_settings()
@@ -3,10 +3,16 @@ from __future__ import annotations
 from typing import Any, Dict
 
 
-def generate_import_plugin_rbxmx(*, base_url: str, session_id: str, plugin_name: str = "VibeCodingImporter") -> str:
+def generate_import_plugin_rbxmx(
+    *, base_url: str, session_id: str, token: str = "", plugin_name: str = "VibeCodingImporter"
+) -> str:
     """Generate a text .rbxmx plugin that imports a session pack into Studio.
 
-    This is a best-effort approach: users still need HttpService enabled.
+    The plugin syncs incrementally: it reads the session manifest (per-file content
+    hashes, ETag-cached), fetches and rewrites only changed scripts, and can
+    long-poll for newer regenerations to auto-sync. Requests carry `token`, a signed
+capability scoped to this session, since Studio has no site cookie. Users still
+need HttpService enabled.
     """
 
     base_url = (base_url or "").rstrip("/")
@@ -16,7 +22,7 @@ def generate_import_plugin_rbxmx(*, base_url: str, session_id: str, plugin_name:
     # The script uses HttpService to fetch the pack and writes scripts into correct services.
 
     lua = f'''-- Vibe Coding Importer Plugin
--- Auto-imports a generated pack into Roblox Studio.
+-- Imports a generated pack into Roblox Studio and keeps it in sync with regenerations.
 -- Requirements: Game Settings -> Security -> Enable Studio Access to API Services + Http Requests.
 
 local HttpService = game:GetService("HttpService")
@@ -24,6 +30,8 @@ local Selection = game:GetService("Selection")
 
 local BASE_URL = {base_url!r}
 local SESSION_ID = {session_id!r}
+-- Signed, expiring capability for this session only; download a fresh plugin when it expires.
+local TOKEN = {token!r}
 
 local function ensureFolder(parent, name)
     local f = parent:FindFirstChild(name)
@@ -98,38 +106,143 @@ local function importFile(path, content)
     return s
 end
 
-local function fetchPack()
-    local url = BASE_URL .. "/api/roblox/sessions/" .. SESSION_ID
-    local ok, body = pcall(function()
-        return HttpService:GetAsync(url)
+local ROOTS = {{ ServerScriptService = true, ReplicatedStorage = true, StarterPlayer = true }}
+
+local function findScript(path)
+    local parts = splitPath((string.gsub(path or "", "\\\\", "/")))
+    if #parts < 2 or not ROOTS[parts[1]] then return nil end
+    local node = game:GetService(parts[1])
+    for i = 2, #parts - 1 do
+        node = node:FindFirstChild(parts[i])
+        if not node then return nil end
+    end
+    return node:FindFirstChild((parts[#parts]:gsub("%.lua$", "")))
+end
+
+-- Sync state survives Studio restarts: which content hash each path was last written with.
+local SETTINGS_KEY = "VibeCoding_" .. SESSION_ID
+local state = plugin:GetSetting(SETTINGS_KEY) or {{}}
+local hashes = state.hashes or {{}}
+local version = state.version or 0
+local etag = state.etag
+
+local function saveState()
+    plugin:SetSetting(SETTINGS_KEY, {{ hashes = hashes, version = version, etag = etag }})
+end
+
+local function request(path, headers)
+    local sep = string.find(path, "?", 1, true) and "&" or "?"
+    local url = BASE_URL .. path .. sep .. "token=" .. HttpService:UrlEncode(TOKEN)
+    local ok, res = pcall(function()
+        return HttpService:RequestAsync({{ Url = url, Method = "GET", Headers = headers or {{}} }})
+    end)
+    if not ok then
+        return nil, tostring(res)
+    end
+    return res
+end
+
+local SESSION_PATH = "/api/roblox/sessions/" .. SESSION_ID
+
+-- Fetch the manifest and rewrite only scripts whose hash changed (or that are missing here).
+-- `revalidate` skips If-None-Match so deleted scripts are restored even when nothing is new.
+-- Returns the number of scripts written, or nil on failure.
+local syncing = false
+local function sync(revalidate)
+    if syncing then return 0 end
+    syncing = true
+    local ok, result = pcall(function()
+        local headers = {{}}
+        if etag and not revalidate then
+            headers["If-None-Match"] = etag
+        end
+        local res, err = request(SESSION_PATH .. "/manifest", headers)
+        if not res then error(err) end
+        if res.StatusCode == 304 then return 0 end
+        if not res.Success then error("manifest HTTP " .. tostring(res.StatusCode)) end
+
+        local manifest = HttpService:JSONDecode(res.Body)
+        local written = {{}}
+        for _, f in ipairs(manifest.files or {{}}) do
+            if hashes[f.path] ~= f.hash or not findScript(f.path) then
+                local fr, ferr = request(SESSION_PATH .. "/files/" .. f.hash)
+                if not fr or not fr.Success then
+                    error("fetch " .. tostring(f.path) .. ": " .. tostring(ferr or fr.StatusCode))
+                end
+                local s = importFile(f.path, fr.Body)
+                if s then
+                    hashes[f.path] = f.hash
+                    table.insert(written, s)
+                end
+            end
+        end
+        version = manifest.version or version
+        etag = res.Headers["etag"] or res.Headers["ETag"]
+        saveState()
+        if #written > 0 then
+            Selection:Set(written)
+        end
+        return #written
     end)
+    syncing = false
     if not ok then
-        error("VibeCodingImporter: failed to fetch pack. Check HttpService + URL.\n" .. tostring(body))
+        warn("VibeCodingImporter: sync failed. Check HttpService + URL.\n" .. tostring(result))
+        return nil
     end
-    local decoded = HttpService:JSONDecode(body)
-    return decoded
+    return result
 end
 
 local toolbar = plugin:CreateToolbar("Vibe Coding")
 local button = toolbar:CreateButton("Import", "Import latest Vibe Coding pack into this place", "")
+local autoButton = toolbar:CreateButton("Auto-sync", "Import new regenerations automatically while Studio is open", "")
 
 button.Click:Connect(function()
-    local pack = fetchPack()
-    local files = pack.files or {{}}
-    local created = {{}}
-    for _, f in ipairs(files) do
-        if type(f) == "table" then
-            local s = importFile(f.path, f.content)
-            if s then table.insert(created, s) end
+    local n = sync(true)
+    if n then
+        print("✅ Vibe Coding: " .. tostring(n) .. " scripts updated (version " .. tostring(version) .. ")")
+    end
+end)
+
+-- Auto-sync: long-poll the server for a newer version, then sync just the changes.
+local autoSync = plugin:GetSetting(SETTINGS_KEY .. "_auto") == true
+local looping = false
+
+local function autoLoop()
+    if looping then return end
+    looping = true
+    while autoSync do
+        local res = request(SESSION_PATH .. "/wait?timeout=25&version=" .. tostring(version))
+        if res and res.StatusCode == 200 then
+            local n = sync(false)
+            if n == nil then
+                task.wait(5)
+            elseif n > 0 then
+                print("🔄 Vibe Coding: synced " .. tostring(n) .. " scripts (version " .. tostring(version) .. ")")
+            end
+        elseif not res or res.StatusCode ~= 204 then
+            task.wait(5)
         end
     end
+    looping = false
+end
 
-    if #created > 0 then
-        Selection:Set(created)
+autoButton:SetActive(autoSync)
+autoButton.Click:Connect(function()
+    autoSync = not autoSync
+    plugin:SetSetting(SETTINGS_KEY .. "_auto", autoSync)
+    autoButton:SetActive(autoSync)
+    if autoSync then
+        task.spawn(autoLoop)
     end
+end)
 
-    print("✅ Vibe Coding: imported " .. tostring(#created) .. " scripts")
+plugin.Unloading:Connect(function()
+    autoSync = false
 end)
+
+if autoSync then
+    task.spawn(autoLoop)
+end
 '''
 
     # RBXMX XML wrapper (Script inside a Model)
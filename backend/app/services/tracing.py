@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import functools
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Trace:
+    """Stage timings for one HTTP request.
+
+    Spans are appended from whichever thread runs the handler; list.append is
+    atomic, and the middleware only reads after the handler has returned.
+    """
+
+    __slots__ = ("method", "path", "started", "spans")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        # (name, offset from request start, duration) in seconds
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        out: Dict[str, Tuple[float, int]] = {}
+        for name, _start, dur in self.spans:
+            total, n = out.get(name, (0.0, 0))
+            out[name] = (total + dur, n + 1)
+        return out
+
+    def server_timing(self) -> str:
+        parts = []
+        for name, (total, n) in self.totals().items():
+            entry = f"{name};dur={total * 1000:.1f}"
+            if n > 1:
+                entry += f';desc="x{n}"'
+            parts.append(entry)
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def as_log(self, *, status: int, route: Optional[str] = None) -> str:
+        return json.dumps(
+            {
+                "event": "slow_request",
+                "method": self.method,
+                "path": self.path,
+                "route": route,
+                "status": status,
+                "total_ms": round(self.elapsed() * 1000, 1),
+                "stages": [
+                    {"name": name, "start_ms": round(start * 1000, 1), "dur_ms": round(dur * 1000, 1)}
+                    for name, start, dur in sorted(self.spans, key=lambda s: s[1])
+                ],
+            }
+        )
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("vibe_trace", default=None)
+
+
+def start_trace(method: str, path: str) -> Tuple[Trace, Any]:
+    trace = Trace(method, path)
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Any) -> None:
+    _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+class span:
+    """Time a block as a named stage of the current request (no-op outside a request)."""
+
+    __slots__ = ("name", "_trace", "_t0")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._trace: Optional[Trace] = None
+        self._t0 = 0.0
+
+    def __enter__(self) -> "span":
+        self._trace = _current.get()
+        if self._trace is not None:
+            self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        trace = self._trace
+        if trace is not None:
+            end = time.perf_counter()
+            trace.spans.append((self.name, self._t0 - trace.started, end - self._t0))
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator form of `span` for functions that are a stage on their own."""
+
+    def deco(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return deco
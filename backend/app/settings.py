@@ -18,19 +18,85 @@ class Settings(BaseSettings):
 
     cors_origins: str = Field(default="*", alias="CORS_ORIGINS")
     database_url: str = Field(default="sqlite:///./vibe_coding.db", alias="DATABASE_URL")
+    # SQL connection pool (per worker process). Requests wait up to DB_POOL_TIMEOUT seconds for a connection.
+    db_pool_size: int = Field(default=8, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=8, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30.0, alias="DB_POOL_TIMEOUT")
+    # MongoDB client pool (per worker process); requests wait MONGO_WAIT_QUEUE_TIMEOUT_MS for a connection.
+    mongo_max_pool_size: int = Field(default=100, alias="MONGO_MAX_POOL_SIZE")
+    mongo_min_pool_size: int = Field(default=0, alias="MONGO_MIN_POOL_SIZE")
+    mongo_max_idle_time_ms: int = Field(default=60_000, alias="MONGO_MAX_IDLE_TIME_MS")
+    mongo_wait_queue_timeout_ms: int = Field(default=10_000, alias="MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    mongo_server_selection_timeout_ms: int = Field(default=5_000, alias="MONGO_SERVER_SELECTION_TIMEOUT_MS")
+    # SQLite file databases only: set on every new connection. WAL lets readers run alongside the
+    # writer; busy_timeout makes writers queue instead of failing with "database is locked".
+    sqlite_journal_mode: str = Field(default="wal", alias="SQLITE_JOURNAL_MODE")
+    sqlite_synchronous: str = Field(default="normal", alias="SQLITE_SYNCHRONOUS")
+    sqlite_busy_timeout_ms: int = Field(default=5000, alias="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_mmap_bytes: int = Field(default=256 * 1024 * 1024, alias="SQLITE_MMAP_BYTES")
+    # Saved versions kept per project (0 = keep all). Versions share file content, so each costs little.
+    project_history_limit: int = Field(default=100, alias="PROJECT_HISTORY_LIMIT")
     auth_session_ttl_seconds: int = Field(default=60 * 60 * 24 * 7, alias="AUTH_SESSION_TTL_SECONDS")  # 7 days
     auth_cookie_name: str = Field(default="vibe_session", alias="AUTH_COOKIE_NAME")
     auth_cookie_secure: bool = Field(default=False, alias="AUTH_COOKIE_SECURE")  # set True behind HTTPS
     auth_cookie_samesite: str = Field(default="lax", alias="AUTH_COOKIE_SAMESITE")  # "lax" | "strict" | "none"
+    # Per-worker session->user cache (0 disables) and write-behind interval for last_seen_at.
+    auth_cache_ttl_seconds: float = Field(default=30.0, alias="AUTH_CACHE_TTL_SECONDS")
+    auth_cache_max_entries: int = Field(default=10_000, alias="AUTH_CACHE_MAX_ENTRIES")
+    auth_last_seen_flush_seconds: float = Field(default=30.0, alias="AUTH_LAST_SEEN_FLUSH_SECONDS")
+    # "db": the cookie is an opaque id looked up in auth_sessions.
+    # "signed": the cookie is an HMAC-signed claim (SESSION_SIGNING_SECRET) checked without DB I/O;
+    # logout propagates to other workers through a revocation list synced every few seconds.
+    # Claims older than AUTH_CLAIMS_MAX_AGE_SECONDS are re-checked against the DB (via the auth cache),
+    # so profile changes and deleted users take effect without waiting for the cookie to expire.
+    auth_session_mode: str = Field(default="db", alias="AUTH_SESSION_MODE")
+    auth_claims_max_age_seconds: float = Field(default=300.0, alias="AUTH_CLAIMS_MAX_AGE_SECONDS")
+    auth_revocation_sync_seconds: float = Field(default=5.0, alias="AUTH_REVOCATION_SYNC_SECONDS")
+    # PBKDF2 runs in a process pool off the request threads. 0 workers = min(4, CPUs).
+    password_hash_workers: int = Field(default=0, alias="PASSWORD_HASH_WORKERS")
+    password_hash_queue_limit: int = Field(default=64, alias="PASSWORD_HASH_QUEUE_LIMIT")
+    password_hash_per_ip: int = Field(default=4, alias="PASSWORD_HASH_PER_IP")
+    password_hash_per_email: int = Field(default=2, alias="PASSWORD_HASH_PER_EMAIL")
     
     # Google OAuth
     google_client_id: Optional[str] = Field(default=None, alias="GOOGLE_CLIENT_ID")
     google_client_secret: Optional[str] = Field(default=None, alias="GOOGLE_CLIENT_SECRET")
     google_redirect_uri: Optional[str] = Field(default=None, alias="GOOGLE_REDIRECT_URI")
+    # Endpoints are overridable so tests and local dev can point at a stand-in provider.
+    # The callback verifies the id_token against GOOGLE_CERTS_URL and skips userinfo.
+    google_auth_url: str = Field(default="https://accounts.google.com/o/oauth2/v2/auth", alias="GOOGLE_AUTH_URL")
+    google_token_url: str = Field(default="https://oauth2.googleapis.com/token", alias="GOOGLE_TOKEN_URL")
+    google_certs_url: str = Field(default="https://www.googleapis.com/oauth2/v1/certs", alias="GOOGLE_CERTS_URL")
+    google_userinfo_url: str = Field(
+        default="https://www.googleapis.com/oauth2/v2/userinfo", alias="GOOGLE_USERINFO_URL"
+    )
     
     # Frontend URL for OAuth redirects
     frontend_url: Optional[str] = Field(default=None, alias="FRONTEND_URL")
 
+    # Observability: GET /metrics is served only when this is set, to "Authorization: Bearer <token>".
+    metrics_token: Optional[str] = Field(default=None, alias="METRICS_TOKEN")
+    # Per-request stage timings: JSON log line for slow requests, and (opt-in, since any client can read
+    # it, e.g. whether login ran the password hash) a Server-Timing response header.
+    server_timing_enabled: bool = Field(default=False, alias="SERVER_TIMING_ENABLED")
+    slow_request_ms: int = Field(default=5000, alias="SLOW_REQUEST_MS")
+
+    # Roblox generation sessions (regenerate-by-session_id, Studio plugin fetch).
+    # memory:// (single worker) | sqlite:///./sessions.db (all workers on one host) | redis://host:6379/0
+    session_store_url: str = Field(default="memory://", alias="SESSION_STORE_URL")
+    session_ttl_seconds: int = Field(default=60 * 60 * 2, alias="SESSION_TTL_SECONDS")
+    session_hot_cache_size: int = Field(default=256, alias="SESSION_HOT_CACHE_SIZE")
+    # Memory backend budget (0 = unbounded); least recently used entries are evicted first.
+    session_store_max_bytes: int = Field(default=256 * 1024 * 1024, alias="SESSION_STORE_MAX_BYTES")
+    session_gzip_cache_bytes: int = Field(default=32 * 1024 * 1024, alias="SESSION_GZIP_CACHE_BYTES")
+
+    # HMAC key for signed tokens (Studio plugin capability URLs). Must be shared by all workers.
+    session_signing_secret: Optional[str] = Field(default=None, alias="SESSION_SIGNING_SECRET")
+    plugin_token_ttl_seconds: int = Field(default=60 * 60 * 8, alias="PLUGIN_TOKEN_TTL_SECONDS")
+
+    # Admin/debug endpoints (e.g. /debug/profile) are served only when this is set, to "Authorization: Bearer <token>".
+    admin_token: Optional[str] = Field(default=None, alias="ADMIN_TOKEN")
+
     def cors_origin_list(self) -> List[str]:
         v = (self.cors_origins or "").strip()
         if v == "" or v == "*":
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the pure-Python code that runs on every request.
+
+Usage (from backend/):
+    python -m benchmarks.bench_hot_paths                      # run everything
+    python -m benchmarks.bench_hot_paths -k broken_pack       # substring filter
+    python -m benchmarks.bench_hot_paths --json base.json     # save a baseline
+    python -m benchmarks.bench_hot_paths --compare base.json  # diff against it
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import itertools
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# app.config (used by app.core.openai_client) requires a key at import time.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.fixtures import PACKS, huge_pack, pack_bytes, project_rows, raw_model_output, stored_project  # noqa: E402
+from benchmarks.harness import BenchResult, bench, print_table, read_json, write_json  # noqa: E402
+
+
+# A case is (name, build); build() makes its fixtures and returns (fn, setup).
+# Fixtures are only built for the cases selected with -k, and shared ones
+# (the 100k-session backends, the stored packs) are built once.
+Case = Tuple[str, Callable[[], Tuple[Callable[[], object], Optional[Callable[[], None]]]]]
+
+
+@functools.lru_cache(maxsize=None)
+def _pack_inputs(size: str) -> Dict[str, Any]:
+    from app.core.openai_client import _clean_json_content
+
+    pack = PACKS[size]()
+    raw = raw_model_output(pack)
+    return {
+        "files": pack["files"],
+        "joined": "\n".join(f["content"] for f in pack["files"]),
+        "raw": raw,
+        "cleaned": _clean_json_content(raw),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _payload() -> bytes:
+    return json.dumps(PACKS["small"]()).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=None)
+def _live_backend(n: int) -> Tuple[Any, Iterator[str]]:
+    from app.services.session_backends import MemoryBackend
+
+    backend = MemoryBackend()
+    keys = [uuid.uuid4().hex for _ in range(n)]
+    for k in keys:
+        backend.set(k, _payload(), 3600)
+    return backend, itertools.cycle(keys)
+
+
+@functools.lru_cache(maxsize=None)
+def _store() -> Tuple[Any, str]:
+    from app.services.session_backends import MemoryBackend
+    from app.services.session_store import SessionStore
+
+    store = SessionStore(backend=MemoryBackend(), hot_size=0)
+    return store, store.create(PACKS["typical"]())
+
+
+@functools.lru_cache(maxsize=None)
+def _stored_pack(label: str) -> Tuple[Dict[str, Any], List[Tuple[str, str, bytes]]]:
+    pack = huge_pack() if label == "0.7MB" else huge_pack(files=200, repeat=10)
+    return stored_project(pack)
+
+
+def _cases() -> List[Case]:
+    from app.api.models import ProjectFile, ProjectInfo, ProjectListResponse, ProjectSummary
+    from app.api.routes import _compact_base_files, _files_body, _looks_like_broken_studio_pack, _zip_bytes
+    from app.core.openai_client import _clean_json_content, _fix_control_characters_in_json
+    from app.core.prompt_builder import PromptBuilder
+    from app.database.repository import stored_text
+    from app.services.security import hash_password, verify_password
+    from app.services.session_backends import MemoryBackend
+
+    cases: List[Case] = []
+    builder = PromptBuilder()
+
+    for size in PACKS:
+
+        def inputs(size=size) -> Dict[str, Any]:
+            return _pack_inputs(size)
+
+        cases += [
+            (f"broken_pack[{size}]", lambda i=inputs: (lambda f=i()["files"]: _looks_like_broken_studio_pack(f), None)),
+            (
+                f"validate_script_safety[{size}]",
+                lambda i=inputs: (lambda s=i()["joined"]: builder.validate_script_safety(s), None),
+            ),
+            (
+                f"compact_base_files[{size}]",
+                lambda i=inputs: (lambda f=i()["files"]: _compact_base_files(f, "make coins spin"), None),
+            ),
+            (f"zip_bytes[{size}]", lambda i=inputs: (lambda f=i()["files"]: _zip_bytes("Pack", f), None)),
+            (f"clean_json_content[{size}]", lambda i=inputs: (lambda r=i()["raw"]: _clean_json_content(r), None)),
+            (
+                f"fix_control_chars[{size}]",
+                lambda i=inputs: (lambda c=i()["cleaned"]: _fix_control_characters_in_json(c), None),
+            ),
+        ]
+
+    # Latency must stay flat as live sessions grow: get never scans and set only
+    # reaps a bounded batch off the expiry heap. Values are shared bytes so 100k
+    # sessions stay cheap to hold.
+    for n in (1_000, 10_000, 100_000):
+
+        def get_case(n=n):
+            backend, probe = _live_backend(n)
+            return lambda: backend.get(next(probe)), None
+
+        def set_case(n=n):
+            backend, probe = _live_backend(n)
+            payload = _payload()
+            return lambda: backend.set(next(probe), payload, 3600), None
+
+        cases += [(f"session_get[{n} live]", get_case), (f"session_set[{n} live]", set_case)]
+
+    # Reaping churn: every write lands on an expired heap top.
+    def churn_case():
+        churn = MemoryBackend()
+        payload = _payload()
+        for _ in range(100_000):
+            churn.set(uuid.uuid4().hex, payload, -1)
+        return lambda: churn.set(uuid.uuid4().hex, payload, -1), None
+
+    cases.append(("session_set[100000 expired]", churn_case))
+
+    def store_case(op: str):
+        def build():
+            store, sid = _store()
+            typical = PACKS["typical"]()
+            return {
+                "create": lambda: store.create(typical),
+                "get": lambda: store.get(sid),
+                "get_bytes": lambda: store.get_bytes(sid),
+                "get_gzip": lambda: store.get_bytes(sid, gzipped=True),
+            }[op], None
+
+        return build
+
+    cases += [
+        ("session_store_create[typical]", store_case("create")),
+        ("session_store_get[typical, cold]", store_case("get")),
+        ("session_store_get_bytes[typical]", store_case("get_bytes")),
+        ("session_store_get_bytes[typical, gzip]", store_case("get_gzip")),
+    ]
+
+    for n in (10, 100):
+
+        def summary_case(n=n):
+            rows = project_rows(projects=n, pack=PACKS["typical"]())
+
+            def convert() -> ProjectListResponse:
+                return ProjectListResponse(projects=[ProjectSummary(**p) for p in rows], next_cursor=None)
+
+            return convert, None
+
+        cases.append((f"project_summary_list[{n} projects]", summary_case))
+
+    # GET /api/projects/{id} on multi-MB projects: the response_model path (dicts ->
+    # ProjectFile -> ProjectInfo -> validate -> JSON, as FastAPI renders it) against
+    # the streamed body. Both start from stored, compressed rows.
+    for label in ("0.7MB", "3MB"):
+
+        def via_model_case(label=label):
+            head, files = _stored_pack(label)
+
+            def via_model() -> bytes:
+                info = ProjectInfo(
+                    **head,
+                    files=[ProjectFile(path=p, content=stored_text(c, d)) for p, c, d in files],
+                )
+                body = ProjectInfo.model_validate(info).model_dump(mode="json")
+                return json.dumps(body, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+            return via_model, None
+
+        def streamed_case(label=label):
+            head, files = _stored_pack(label)
+            return lambda: b"".join(_files_body(head, files)), None
+
+        cases += [
+            (f"project_body[{label}, response_model]", via_model_case),
+            (f"project_body[{label}, streamed]", streamed_case),
+        ]
+
+    def verify_case():
+        stored = hash_password("correct horse battery staple")
+        return lambda: verify_password("correct horse battery staple", stored), None
+
+    cases += [
+        ("hash_password", lambda: (lambda: hash_password("correct horse battery staple"), None)),
+        ("verify_password", verify_case),
+    ]
+    return cases
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    ap.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run (default 0.2)")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (default 5)")
+    ap.add_argument("--json", dest="json_out", help="write results to this file")
+    ap.add_argument("--compare", help="baseline JSON written by a previous --json run")
+    args = ap.parse_args(argv)
+
+    for size, make in PACKS.items():
+        pack = make()
+        print(f"fixture {size}: {len(pack['files'])} files, {pack_bytes(pack) / 1024:.1f} KiB")
+    print()
+
+    results: List[BenchResult] = []
+    for name, build in _cases():
+        if args.filter and args.filter not in name:
+            continue
+        fn, setup = build()
+        # PBKDF2 is ~100ms/op; don't let it dominate the run.
+        slow = name.endswith("_password")
+        results.append(
+            bench(
+                name,
+                fn,
+                min_time=args.min_time,
+                repeat=2 if slow else args.repeat,
+                setup=setup,
+            )
+        )
+        print(f"  done {name}", file=sys.stderr)
+
+    baseline = read_json(args.compare) if args.compare else None
+    print_table(results, baseline)
+    if args.json_out:
+        write_json(args.json_out, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Tuple
+
+from app.services.fallback_templates import (
+    coin_collector_pack,
+    obby_pack,
+    runner_pack,
+    seasonal_collector_pack_ai,
+    tycoon_pack,
+)
+
+
+def small_pack() -> Dict[str, Any]:
+    """Two short server scripts (~3 KB) - a minimal obby."""
+    return obby_pack("")
+
+
+def typical_pack() -> Dict[str, Any]:
+    """What a first-pass AI generation usually looks like: 4-5 files, ~8 KB."""
+    return seasonal_collector_pack_ai("")
+
+
+def huge_pack(*, files: int = 60, repeat: int = 8) -> Dict[str, Any]:
+    """A regenerate-after-many-edits pack: `files` scripts of ~`repeat` x 2 KB each."""
+    sources: List[Dict[str, str]] = []
+    for builder in (coin_collector_pack, seasonal_collector_pack_ai, obby_pack, runner_pack, tycoon_pack):
+        sources.extend(builder("")["files"])
+    out: List[Dict[str, str]] = []
+    for i in range(files):
+        src = sources[i % len(sources)]
+        head, _, name = src["path"].rpartition("/")
+        out.append({"path": f"{head}/Module{i:03d}_{name}", "content": src["content"] * repeat})
+    pack = typical_pack()
+    pack["title"] = "Huge Pack"
+    pack["files"] = out
+    return pack
+
+
+PACKS = {
+    "small": small_pack,
+    "typical": typical_pack,
+    "huge": huge_pack,
+}
+
+
+def pack_bytes(pack: Dict[str, Any]) -> int:
+    return sum(len(f["content"]) for f in pack["files"])
+
+
+def raw_model_output(pack: Dict[str, Any]) -> str:
+    """Model output as it sometimes arrives: fenced in markdown with raw newlines inside strings."""
+    body = json.dumps(pack, indent=2).replace("\\n", "\n").replace("\\t", "\t")
+    return f"Here is your game:\n```json\n{body}\n```\n"
+
+
+def project_rows(*, projects: int, pack: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rows shaped like `database.list_project_summaries` output."""
+    total = sum(len((f.get("content") or "").encode("utf-8")) for f in pack["files"])
+    return [
+        {
+            "id": str(i + 1),
+            "name": f"Project {i + 1}",
+            "description": pack.get("description"),
+            "file_count": len(pack["files"]),
+            "total_bytes": total,
+            "created_at": "2026-01-01T00:00:00",
+            "updated_at": "2026-01-02T00:00:00",
+        }
+        for i in range(projects)
+    ]
+
+
+def stored_project(pack: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[str, str, bytes]]]:
+    """`pack` as `database.get_project_stored` returns it: metadata plus blob_codec-encoded files."""
+    from app.services import blob_codec
+
+    head = {
+        "id": "1",
+        "name": pack.get("title") or "Project",
+        "description": pack.get("description"),
+        "version": 7,
+        "created_at": "2026-01-01T00:00:00",
+        "updated_at": "2026-01-02T00:00:00",
+    }
+    files = sorted((f["path"], *blob_codec.encode_text(f["content"])) for f in pack["files"])
+    return head, files
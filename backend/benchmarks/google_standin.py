@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Google's OAuth endpoints, for exercising the login flow
+without network access (manual testing, load tests).
+
+It issues real RS256 id_tokens signed with a throwaway key and serves the
+matching certificates, so the backend's local verification runs unchanged.
+
+Usage (from backend/):
+    uvicorn benchmarks.google_standin:app --port 8765
+    # then start the backend with:
+    GOOGLE_CLIENT_ID=standin GOOGLE_CLIENT_SECRET=standin \\
+    GOOGLE_AUTH_URL=http://127.0.0.1:8765/auth \\
+    GOOGLE_TOKEN_URL=http://127.0.0.1:8765/token \\
+    GOOGLE_CERTS_URL=http://127.0.0.1:8765/certs
+
+Every code exchanges for the user named by the `login_hint` passed to /auth
+(default standin@example.com). Rotate the signing key with POST /rotate.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import secrets
+import time
+import uuid
+from typing import Dict, Tuple
+from urllib.parse import urlencode
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import FastAPI, Form, HTTPException
+from fastapi.responses import JSONResponse, RedirectResponse
+from google.auth import crypt, jwt
+
+ISSUER = "https://accounts.google.com"
+
+app = FastAPI(title="Google OAuth stand-in")
+
+_keys: Dict[str, Tuple[crypt.RSASigner, str]] = {}
+_current_kid = ""
+_codes: Dict[str, str] = {}
+
+
+def _new_key() -> str:
+    """Generate a signing key and its self-signed certificate; returns the key id."""
+    global _current_kid
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "google-standin")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=30))
+        .sign(key, hashes.SHA256())
+    )
+    pem_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    kid = hashlib.sha1(pem_key).hexdigest()
+    _keys[kid] = (crypt.RSASigner.from_string(pem_key, key_id=kid), cert.public_bytes(serialization.Encoding.PEM).decode())
+    # Like Google, keep publishing the previous key so tokens already issued still verify.
+    for old in list(_keys)[:-2]:
+        del _keys[old]
+    _current_kid = kid
+    return kid
+
+
+_new_key()
+
+
+@app.get("/auth")
+def auth(redirect_uri: str, state: str = "", login_hint: str = "standin@example.com"):
+    code = secrets.token_urlsafe(16)
+    _codes[code] = login_hint
+    query = {"code": code, **({"state": state} if state else {})}
+    return RedirectResponse(f"{redirect_uri}?{urlencode(query)}", status_code=302)
+
+
+@app.post("/token")
+def token(code: str = Form(...), client_id: str = Form(...), grant_type: str = Form("authorization_code")):
+    # Codes are not single-use here so load tests can replay one.
+    email = _codes.get(code) or ("%s@example.com" % code if code.startswith("load-") else None)
+    if email is None:
+        raise HTTPException(status_code=400, detail="invalid_grant")
+    now = int(time.time())
+    claims = {
+        "iss": ISSUER,
+        "aud": client_id,
+        "sub": str(uuid.uuid5(uuid.NAMESPACE_URL, email).int)[:21],
+        "email": email,
+        "email_verified": True,
+        "name": email.split("@")[0],
+        "picture": "",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    signer = _keys[_current_kid][0]
+    return {
+        "access_token": secrets.token_urlsafe(24),
+        "id_token": jwt.encode(signer, claims).decode(),
+        "expires_in": 3600,
+        "token_type": "Bearer",
+        "scope": "openid email profile",
+    }
+
+
+@app.get("/certs")
+def certs():
+    body = {kid: pem for kid, (_, pem) in _keys.items()}
+    return JSONResponse(body, headers={"Cache-Control": "public, max-age=300"})
+
+
+@app.post("/rotate")
+def rotate():
+    return {"kid": _new_key()}
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class BenchResult:
+    name: str
+    ops_per_sec: float
+    mean_us: float
+    stdev_us: float
+    loops: int
+    peak_alloc_bytes: int  # transient peak allocated during a single op
+    retained_bytes: int  # bytes still referenced after a single op (return value, caches, leaks)
+
+
+def _calibrate(fn: Callable[[], Any], min_time: float) -> int:
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time or loops >= 1_000_000:
+            return loops
+        # Aim a bit above min_time so repeats don't need re-calibration.
+        loops = max(loops * 2, int(loops * (min_time * 1.2) / max(dt, 1e-9)))
+
+
+def _measure_alloc(fn: Callable[[], Any]) -> tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        out = fn()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del out
+    return max(0, peak - before), max(0, after - before)
+
+
+def bench(
+    name: str,
+    fn: Callable[[], Any],
+    *,
+    min_time: float = 0.2,
+    repeat: int = 5,
+    setup: Optional[Callable[[], None]] = None,
+) -> BenchResult:
+    """Time `fn` (best of `repeat` calibrated runs) and measure its allocations.
+
+    `setup` runs before every timed run (not per op), e.g. to refill a store.
+    """
+    if setup:
+        setup()
+    fn()  # warm up caches / lazy imports
+    loops = _calibrate(fn, min_time)
+
+    per_op: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            dt = time.perf_counter() - t0
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        per_op.append(dt / loops)
+
+    if setup:
+        setup()
+    peak, retained = _measure_alloc(fn)
+
+    best = min(per_op)
+    return BenchResult(
+        name=name,
+        ops_per_sec=1.0 / best if best > 0 else float("inf"),
+        mean_us=statistics.mean(per_op) * 1e6,
+        stdev_us=(statistics.stdev(per_op) * 1e6) if len(per_op) > 1 else 0.0,
+        loops=loops,
+        peak_alloc_bytes=peak,
+        retained_bytes=retained,
+    )
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def print_table(results: List[BenchResult], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    name_w = max([len(r.name) for r in results] + [9])
+    header = f"{'benchmark':<{name_w}}  {'ops/sec':>12}  {'mean':>11}  {'± stdev':>9}  {'peak alloc':>10}  {'retained':>9}"
+    if baseline:
+        header += f"  {'vs base':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = (
+            f"{r.name:<{name_w}}  {r.ops_per_sec:>12,.1f}  {r.mean_us:>9.1f}us  {r.stdev_us:>7.1f}us"
+            f"  {_fmt_bytes(r.peak_alloc_bytes):>10}  {_fmt_bytes(r.retained_bytes):>9}"
+        )
+        if baseline:
+            base = baseline.get(r.name)
+            if base and base.get("ops_per_sec"):
+                line += f"  {r.ops_per_sec / float(base['ops_per_sec']):>7.2f}x"
+            else:
+                line += f"  {'new':>8}"
+        print(line)
+
+
+def write_json(path: str, results: List[BenchResult]) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({r.name: asdict(r) for r in results}, fh, indent=2, sort_keys=True)
+
+
+def read_json(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
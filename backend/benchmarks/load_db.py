@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Mixed read/write load against the SQL repository, per SQLite profile.
+
+Worker threads play the request threadpool: each operation opens its own
+session like a request does. Reads (open a project, list projects, auth
+session lookup) and writes (partial file save, login) are mixed by weight.
+Every profile gets a fresh database file with the same data.
+
+Usage (from backend/):
+    python -m benchmarks.load_db                          # both profiles, 8 threads, 5 s each
+    python -m benchmarks.load_db --threads 32 --seconds 10 --write-ratio 0.5
+    python -m benchmarks.load_db --profile production --json load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.fixtures import typical_pack  # noqa: E402
+
+# pragmas passed to create_sql_engine: {} keeps SQLite's defaults (rollback
+# journal, synchronous=FULL, only the driver's busy wait); None = SQLITE_* settings.
+PROFILES: Dict[str, Any] = {"default": {}, "production": None}
+
+
+def _setup(path: str, pragmas: Any, *, projects: int) -> Tuple[Any, str, List[str], List[str]]:
+    from app.database.database import create_sql_engine
+    from app.database.sql_repository import SqlRepository
+
+    repo = SqlRepository(create_sql_engine(f"sqlite:///{path}", pragmas=pragmas), history_limit=20)
+    repo.init()
+    files = typical_pack()["files"]
+    now = datetime.utcnow()
+    gen = repo.session()
+    db = next(gen)
+    try:
+        user = repo.create_user(db, email="load@example.com", name="load", password_hash="x")
+        ids = [
+            repo.save_project(db, user_id=user["id"], name=f"p{i}", files=files, description=None, now=now)
+            for i in range(projects)
+        ]
+        sids = []
+        for i in range(50):
+            sid = f"load-{i}"
+            repo.create_session(db, sid=sid, user_id=user["id"], now=now, expires_at=now + timedelta(days=1))
+            sids.append(sid)
+    finally:
+        gen.close()
+    return repo, user["id"], ids, sids
+
+
+def _operations(repo: Any, user_id: str, ids: List[str], sids: List[str]) -> Dict[str, Callable[[Any, random.Random], Any]]:
+    def open_project(db: Any, rng: random.Random) -> Any:
+        return repo.get_project(db, rng.choice(ids), user_id)
+
+    def list_projects(db: Any, rng: random.Random) -> Any:
+        return repo.list_project_summaries(db, user_id, 50)
+
+    def auth_lookup(db: Any, rng: random.Random) -> Any:
+        return repo.get_session(db, rng.choice(sids), datetime.utcnow())
+
+    def save_file(db: Any, rng: random.Random) -> Any:
+        content = f"-- edit {rng.random()}\n" * 40
+        return repo.write_project_files(
+            db,
+            rng.choice(ids),
+            user_id,
+            upserts={"src/server/Edited.server.lua": content},
+            deletes=[],
+            replace=False,
+            base_version=None,
+            meta={},
+            now=datetime.utcnow(),
+        )
+
+    def login(db: Any, rng: random.Random) -> Any:
+        now = datetime.utcnow()
+        sid = f"load-{rng.getrandbits(64):x}"
+        return repo.create_session(db, sid=sid, user_id=user_id, now=now, expires_at=now + timedelta(hours=1))
+
+    return {
+        "open_project": open_project,
+        "list_projects": list_projects,
+        "auth_lookup": auth_lookup,
+        "save_file": save_file,
+        "login": login,
+    }
+
+
+_READS = {"open_project": 5, "list_projects": 2, "auth_lookup": 3}
+_WRITES = {"save_file": 4, "login": 1}
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+def run_profile(
+    name: str, pragmas: Any, *, threads: int, seconds: float, write_ratio: float, projects: int
+) -> Dict[str, Any]:
+    tmp = tempfile.mkdtemp(prefix="load_db_")
+    repo, user_id, ids, sids = _setup(os.path.join(tmp, "load.db"), pragmas, projects=projects)
+    ops = _operations(repo, user_id, ids, sids)
+    latencies: Dict[str, List[float]] = {"read": [], "write": []}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        mine: Dict[str, List[float]] = {"read": [], "write": []}
+        mine_errors: Dict[str, int] = {}
+        while time.perf_counter() < stop_at:
+            kind = "write" if rng.random() < write_ratio else "read"
+            weights = _WRITES if kind == "write" else _READS
+            op = rng.choices(list(weights), weights=list(weights.values()))[0]
+            gen = repo.session()
+            db = next(gen)
+            t0 = time.perf_counter()
+            try:
+                ops[op](db, rng)
+                mine[kind].append(time.perf_counter() - t0)
+            except Exception as e:
+                key = f"{op}: {type(e).__name__}: {str(e).splitlines()[0][:60]}"
+                mine_errors[key] = mine_errors.get(key, 0) + 1
+            finally:
+                gen.close()
+        with lock:
+            for k, v in mine.items():
+                latencies[k].extend(v)
+            for k, n in mine_errors.items():
+                errors[k] = errors.get(k, 0) + n
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    repo.engine.dispose()
+
+    reads, writes = latencies["read"], latencies["write"]
+    return {
+        "profile": name,
+        "threads": threads,
+        "ops_per_sec": (len(reads) + len(writes)) / elapsed,
+        "reads_per_sec": len(reads) / elapsed,
+        "writes_per_sec": len(writes) / elapsed,
+        "read_p50_ms": _pct(reads, 0.50),
+        "read_p99_ms": _pct(reads, 0.99),
+        "write_p50_ms": _pct(writes, 0.50),
+        "write_p99_ms": _pct(writes, 0.99),
+        "write_mean_ms": statistics.mean(writes) * 1000 if writes else 0.0,
+        "errors": errors,
+    }
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    header = (
+        f"{'profile':<11}  {'ops/s':>8}  {'reads/s':>8}  {'writes/s':>8}  {'read p50':>9}  {'read p99':>9}"
+        f"  {'write p50':>9}  {'write p99':>9}  {'errors':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['profile']:<11}  {r['ops_per_sec']:>8,.0f}  {r['reads_per_sec']:>8,.0f}  {r['writes_per_sec']:>8,.0f}"
+            f"  {r['read_p50_ms']:>7.2f}ms  {r['read_p99_ms']:>7.2f}ms"
+            f"  {r['write_p50_ms']:>7.2f}ms  {r['write_p99_ms']:>7.2f}ms  {sum(r['errors'].values()):>6}"
+        )
+    for r in results:
+        for err, n in sorted(r["errors"].items()):
+            print(f"  {r['profile']}: {n} x {err}")
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profile", choices=sorted(PROFILES), action="append", help="default: all profiles")
+    ap.add_argument("--threads", type=int, default=8, help="concurrent workers (default 8)")
+    ap.add_argument("--seconds", type=float, default=5.0, help="duration per profile (default 5)")
+    ap.add_argument("--write-ratio", type=float, default=0.3, help="share of operations that write (default 0.3)")
+    ap.add_argument("--projects", type=int, default=200, help="projects in the fixture database (default 200)")
+    ap.add_argument("--json", dest="json_out", help="write results to this file")
+    args = ap.parse_args(argv)
+
+    results = []
+    for name in args.profile or list(PROFILES):
+        print(f"  running {name}", file=sys.stderr)
+        results.append(
+            run_profile(
+                name,
+                PROFILES[name],
+                threads=args.threads,
+                seconds=args.seconds,
+                write_ratio=args.write_ratio,
+                projects=args.projects,
+            )
+        )
+    print_results(results)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Redis server, for exercising the redis:// session store
+without a real server (manual testing, check_session_backends.py).
+
+It speaks RESP2 and implements only what RedisBackend sends: PING, AUTH,
+SELECT, GET, SET (with EX/PX), DEL, INCR, EXPIRE/PEXPIRE, TTL/PTTL and
+MULTI/EXEC/DISCARD, with per-key expiry in milliseconds like Redis. Data lives in memory and dies
+with the process.
+
+Usage (from backend/):
+    python -m benchmarks.redis_standin --port 6390
+    # then start the backend with:
+    SESSION_STORE_URL=redis://127.0.0.1:6390/0
+"""
+
+from __future__ import annotations
+
+import argparse
+import socketserver
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class _Store:
+    def __init__(self) -> None:
+        # Reentrant: EXEC holds it across the queued commands.
+        self.lock = threading.RLock()
+        # db index -> key -> (value, expires_at_ms or None)
+        self.dbs: Dict[int, Dict[bytes, Tuple[bytes, Optional[int]]]] = {}
+
+    def db(self, index: int) -> Dict[bytes, Tuple[bytes, Optional[int]]]:
+        return self.dbs.setdefault(index, {})
+
+    @staticmethod
+    def live(db: Dict[bytes, Tuple[bytes, Optional[int]]], key: bytes) -> Optional[Tuple[bytes, Optional[int]]]:
+        # Caller holds the lock.
+        item = db.get(key)
+        if item is not None and item[1] is not None and item[1] <= int(time.time() * 1000):
+            del db[key]
+            return None
+        return item
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _error(msg: str) -> bytes:
+    return b"-ERR " + msg.encode("utf-8") + b"\r\n"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "RedisStandin"
+
+    def _read_command(self) -> Optional[List[bytes]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command (redis-cli / telnet).
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            n = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(n + 2)[:-2])
+        return args
+
+    def handle(self) -> None:
+        self.db_index = 0
+        self.authed = self.server.password is None
+        self.queued: Optional[List[Tuple[str, List[bytes]]]] = None
+        while True:
+            try:
+                args = self._read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            cmd = args[0].upper().decode("ascii", "replace")
+            if self.queued is not None and cmd not in ("MULTI", "EXEC", "DISCARD"):
+                self.queued.append((cmd, args[1:]))
+                reply = b"+QUEUED\r\n"
+            else:
+                reply = self._transaction(cmd)
+                if reply is None:
+                    reply = self._run(cmd, args[1:])
+            self.wfile.write(reply)
+            self.wfile.flush()
+
+    def _transaction(self, cmd: str) -> Optional[bytes]:
+        if cmd == "MULTI":
+            if self.queued is not None:
+                return _error("MULTI calls can not be nested")
+            self.queued = []
+            return b"+OK\r\n"
+        if cmd == "DISCARD":
+            if self.queued is None:
+                return _error("DISCARD without MULTI")
+            self.queued = None
+            return b"+OK\r\n"
+        if cmd == "EXEC":
+            if self.queued is None:
+                return _error("EXEC without MULTI")
+            queued, self.queued = self.queued, None
+            with self.server.store.lock:
+                replies = [self._run(c, a) for c, a in queued]
+            return b"*%d\r\n" % len(replies) + b"".join(replies)
+        return None
+
+    def _run(self, cmd: str, args: List[bytes]) -> bytes:
+        try:
+            return self._dispatch(cmd, args)
+        except (ValueError, IndexError):
+            return _error("syntax error")
+
+    def _dispatch(self, cmd: str, args: List[bytes]) -> bytes:
+        store = self.server.store
+        if cmd == "AUTH":
+            if self.server.password is None:
+                return _error("AUTH <password> called without any password configured")
+            if args[-1].decode("utf-8") != self.server.password:
+                return b"-WRONGPASS invalid username-password pair\r\n"
+            self.authed = True
+            return b"+OK\r\n"
+        if not self.authed:
+            return b"-NOAUTH Authentication required.\r\n"
+        if cmd == "PING":
+            return b"+PONG\r\n"
+        if cmd == "SELECT":
+            self.db_index = int(args[0])
+            return b"+OK\r\n"
+        now_ms = int(time.time() * 1000)
+        with store.lock:
+            db = store.db(self.db_index)
+            if cmd == "GET":
+                item = store.live(db, args[0])
+                return _bulk(item[0] if item else None)
+            if cmd == "SET":
+                expires: Optional[int] = None
+                opts = [a.upper() for a in args[2:]]
+                for i, opt in enumerate(opts):
+                    if opt == b"PX":
+                        expires = now_ms + int(args[2 + i + 1])
+                    elif opt == b"EX":
+                        expires = now_ms + int(args[2 + i + 1]) * 1000
+                db[args[0]] = (args[1], expires)
+                return b"+OK\r\n"
+            if cmd == "DEL":
+                n = 0
+                for key in args:
+                    if store.live(db, key) is not None:
+                        del db[key]
+                        n += 1
+                return b":%d\r\n" % n
+            if cmd == "INCR":
+                item = store.live(db, args[0])
+                try:
+                    n = int(item[0]) + 1 if item else 1
+                except ValueError:
+                    return _error("value is not an integer or out of range")
+                db[args[0]] = (str(n).encode("ascii"), item[1] if item else None)
+                return b":%d\r\n" % n
+            if cmd in ("EXPIRE", "PEXPIRE"):
+                item = store.live(db, args[0])
+                if item is None:
+                    return b":0\r\n"
+                ms = int(args[1]) * (1000 if cmd == "EXPIRE" else 1)
+                db[args[0]] = (item[0], now_ms + ms)
+                return b":1\r\n"
+            if cmd in ("TTL", "PTTL"):
+                item = store.live(db, args[0])
+                if item is None:
+                    return b":-2\r\n"
+                if item[1] is None:
+                    return b":-1\r\n"
+                left = item[1] - now_ms
+                return b":%d\r\n" % (left if cmd == "PTTL" else left // 1000)
+        return _error(f"unknown command '{cmd}'")
+
+
+class RedisStandin(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, password: Optional[str] = None):
+        super().__init__((host, port), _Handler)
+        self.password = password
+        self.store = _Store()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+
+def start(port: int = 0, password: Optional[str] = None) -> RedisStandin:
+    """Serve on a background thread; stop with .shutdown() and .server_close()."""
+    server = RedisStandin(port=port, password=password)
+    threading.Thread(target=server.serve_forever, name="redis-standin", daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6390)
+    ap.add_argument("--password", help="require AUTH with this password")
+    args = ap.parse_args(argv)
+    server = RedisStandin(args.host, args.port, args.password)
+    print(f"  serving {server.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Check that every MongoDB query the backend makes is served by an index.
+Usage: python check_mongo_indexes.py [MONGODB_URL]
+If no URL is given, DATABASE_URL is used. Needs a running mongod.
+
+The indexes are created in a scratch database (<name>_index_check, dropped
+afterwards) and filled with a little data. Each query shape of
+MongoRepository then goes through explain(). A shape fails if its winning
+plan scans the collection (COLLSCAN) or, for sorted queries, sorts in memory.
+"""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from app.database.database import mongo_client_options
+    from app.database.mongo_repository import MongoRepository
+    from app.settings import settings
+except ImportError as e:
+    print(f"[ERROR] Import error: {e}")
+    print("Make sure you're in the backend directory and dependencies are installed.")
+    sys.exit(1)
+
+
+def plan_stages(plan: Any) -> Set[str]:
+    """Every "stage" named anywhere in an explain() plan (classic and SBE layouts)."""
+    found: Set[str] = set()
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            found.add(plan["stage"])
+        for v in plan.values():
+            found |= plan_stages(v)
+    elif isinstance(plan, list):
+        for v in plan:
+            found |= plan_stages(v)
+    return found
+
+
+def seed(repo: MongoRepository, db: Any) -> Dict[str, Any]:
+    from bson import ObjectId
+
+    now = datetime.utcnow()
+    user = repo.create_user(db, email="index-check@example.com", name="check", password_hash="x")
+    files = [{"path": f"src/Module{i}.lua", "content": f"local CoinCollected{i} = {i}\n" * 20} for i in range(5)]
+    pids = [
+        repo.save_project(db, user_id=user["id"], name=f"p{i}", files=files, description=None, now=now)
+        for i in range(3)
+    ]
+    repo.write_project_files(
+        db, pids[0], user["id"], upserts={"src/Module0.lua": "changed"}, deletes=[], replace=False,
+        base_version=None, meta={}, now=now,
+    )
+    repo.create_session(db, sid="check-sid", user_id=user["id"], now=now, expires_at=now + timedelta(days=1))
+    repo.delete_session(db, "check-sid", now)
+    repo.save_draft(db, {"prompt": "p", "result": {}, "created_at": now.isoformat()})
+    first = db["project_files"].find_one({"project_id": pids[0]})
+    return {"user_id": user["id"], "pid": pids[0], "oid": ObjectId(pids[0]), "hash": first["hash"], "now": now}
+
+
+def shapes(s: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Collection, filter and sort of each query MongoRepository makes; sorted ones must not sort in memory."""
+    uid, pid, oid, h, now = s["user_id"], s["pid"], s["oid"], s["hash"], s["now"]
+    newest = [("updated_at", -1), ("_id", -1)]
+    return [
+        {"name": "users by email", "coll": "users", "filter": {"email": "index-check@example.com"}},
+        {"name": "users by google_id", "coll": "users", "filter": {"google_id": "g-1"}},
+        {"name": "revocations since", "coll": "auth_revocations",
+         "filter": {"expires_at": {"$gt": now}, "revoked_at": {"$gt": now - timedelta(minutes=1)}}},
+        {"name": "drafts newest", "coll": "drafts", "filter": {}, "sort": [("created_at", -1)], "limit": 20},
+        {"name": "project owned", "coll": "projects", "filter": {"_id": oid, "user_id": uid}},
+        {"name": "project list", "coll": "projects", "filter": {"user_id": uid}, "sort": newest, "limit": 50},
+        {"name": "project list after cursor", "coll": "projects",
+         "filter": {"user_id": uid, "updated_at": {"$lte": now},
+                    "$or": [{"updated_at": {"$lt": now}}, {"_id": {"$lt": oid}}]},
+         "sort": newest, "limit": 50},
+        {"name": "project keys (export)", "coll": "projects", "filter": {"user_id": uid, "_id": {"$gt": oid}},
+         "sort": [("_id", 1)], "limit": 100},
+        {"name": "files of project", "coll": "project_files", "filter": {"project_id": pid}, "sort": [("path", 1)]},
+        {"name": "files at paths", "coll": "project_files",
+         "filter": {"project_id": pid, "path": {"$in": ["src/Module0.lua", "src/Module1.lua"]}}},
+        {"name": "files by hash (gc)", "coll": "project_files", "filter": {"hash": {"$in": [h]}}},
+        {"name": "versions of project", "coll": "project_versions", "filter": {"project_id": pid},
+         "sort": [("version", -1)], "limit": 50},
+        {"name": "version", "coll": "project_versions", "filter": {"project_id": pid, "version": 1}},
+        {"name": "pruned versions", "coll": "project_versions", "filter": {"project_id": pid, "version": {"$lte": 1}}},
+        {"name": "versions by hash (gc)", "coll": "project_versions", "filter": {"files.hash": {"$in": [h]}}},
+        {"name": "blobs by hash", "coll": "project_blobs", "filter": {"_id": {"$in": [h]}}},
+        {"name": "blob text search", "coll": "project_blobs",
+         "filter": {"$text": {"$search": '"coin" "collected0"'}, "_id": {"$in": [h]}}},
+    ]
+
+
+def check(db: Any, shape: Dict[str, Any]) -> Optional[str]:
+    """None if the shape is index-backed, else why not."""
+    cursor = db[shape["coll"]].find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    if shape.get("limit"):
+        cursor = cursor.limit(shape["limit"])
+    stages = plan_stages(cursor.explain().get("queryPlanner", {}).get("winningPlan"))
+    if "COLLSCAN" in stages:
+        return f"collection scan ({', '.join(sorted(stages))})"
+    if shape.get("sort") and "SORT" in stages:
+        return f"in-memory sort ({', '.join(sorted(stages))})"
+    return None
+
+
+def main() -> int:
+    url = sys.argv[1] if len(sys.argv) > 1 else settings.database_url
+    if not url.startswith(("mongodb://", "mongodb+srv://")):
+        print(f"[ERROR] Not a MongoDB URL: {url}")
+        return 2
+    from pymongo.errors import PyMongoError
+
+    target = MongoRepository(url, client_options=mongo_client_options())
+    try:
+        name = f"{target.db.name}_index_check"
+        repo = MongoRepository(url, client_options=mongo_client_options(), database=name)
+        repo.db.client.drop_database(name)
+    except PyMongoError as e:
+        print(f"[ERROR] Cannot reach MongoDB: {type(e).__name__}: {str(e).splitlines()[0][:200]}")
+        return 2
+    try:
+        repo.init()
+        db = repo.db
+        failures = 0
+        for shape in shapes(seed(repo, db)):
+            problem = check(db, shape)
+            if problem:
+                failures += 1
+                print(f"[FAIL] {shape['name']}: {problem}")
+            else:
+                print(f"[OK] {shape['name']}")
+        if failures:
+            print(f"\n{failures} query shape(s) not index-backed")
+        else:
+            print("\nAll query shapes use indexes")
+        return 1 if failures else 0
+    finally:
+        repo.db.client.drop_database(name)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Check that project writes only make a version when a file actually changes,
+and that concurrent writes of the same content keep every file readable.
+Usage: python check_project_versions.py [DATABASE_URL]
+
+Without a URL the checks run against a scratch SQLite file. A MongoDB URL
+uses a scratch database (<name>_version_check, dropped afterwards) and needs
+a running mongod. Each check saves a project, repeats writes that change
+nothing (identical saves, empty patches, deleting a missing path, restoring
+the current files) and asserts the version history only grows on real edits.
+The concurrency checks have threads edit one project at once (the counters
+and the newest snapshot must still match its files), and threads store the same new content in several
+projects at once while another project holding it is deleted (which
+garbage-collects its blobs).
+"""
+
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from app.database.database import create_sql_engine, mongo_client_options
+    from app.database.mongo_repository import MongoRepository
+    from app.database.repository import Repository
+    from app.database.sql_repository import SqlRepository
+except ImportError as e:
+    print(f"[ERROR] Import error: {e}")
+    print("Make sure you're in the backend directory and dependencies are installed.")
+    sys.exit(1)
+
+FILES = [{"path": "src/a.lua", "content": "print(1)\n"}, {"path": "src/b.lua", "content": "print(2)\n"}]
+
+
+class Project:
+    """One scratch project and helpers to write it; the clock ticks a second per write."""
+
+    def __init__(self, repo: Repository, db: Any, user_id: str, name: str):
+        self.repo, self.db, self.user_id = repo, db, user_id
+        self.now = datetime(2024, 1, 1)
+        self.id = repo.save_project(db, user_id=user_id, name=name, files=FILES, description=None, now=self.now)
+
+    def _tick(self) -> datetime:
+        self.now += timedelta(seconds=1)
+        return self.now
+
+    def save(self, files: List[Dict[str, str]], name: str = "p", description: Any = None) -> Dict[str, Any]:
+        return self.repo.write_project_files(
+            self.db,
+            self.id,
+            self.user_id,
+            upserts={f["path"]: f["content"] for f in files},
+            deletes=[],
+            replace=True,
+            base_version=None,
+            meta={"name": name, "description": description},
+            now=self._tick(),
+        )
+
+    def patch(self, upserts: Dict[str, str], deletes: List[str]) -> Dict[str, Any]:
+        return self.repo.write_project_files(
+            self.db,
+            self.id,
+            self.user_id,
+            upserts=upserts,
+            deletes=deletes,
+            replace=False,
+            base_version=None,
+            meta={},
+            now=self._tick(),
+        )
+
+    def restore(self, version: int) -> Dict[str, Any]:
+        return self.repo.restore_project_version(
+            self.db, self.id, self.user_id, version, base_version=None, now=self._tick()
+        )
+
+    def versions(self) -> List[int]:
+        return [v["version"] for v in self.repo.list_project_versions(self.db, self.id, self.user_id, 100)]
+
+
+def check_identical_saves(p: Project) -> None:
+    first = p.save(FILES)
+    for _ in range(5):
+        again = p.save(FILES)
+        assert again["version"] == first["version"], f"identical save made version {again['version']}"
+        assert again["updated_at"] == first["updated_at"], "identical save moved updated_at"
+    assert p.versions() == [1], f"versions {p.versions()}"
+
+
+def check_noop_patches(p: Project) -> None:
+    for upserts, deletes in (({}, []), ({}, ["missing.lua"]), ({"src/a.lua": FILES[0]["content"]}, [])):
+        res = p.patch(upserts, deletes)
+        assert res["version"] == 1, f"patch {upserts or deletes or 'empty'} made version {res['version']}"
+    assert p.versions() == [1], f"versions {p.versions()}"
+
+
+def check_real_edits(p: Project) -> None:
+    assert p.patch({"src/a.lua": "print(3)\n"}, [])["version"] == 2
+    assert p.patch({}, ["src/b.lua"])["version"] == 3
+    res = p.save(FILES)
+    assert res["version"] == 4 and res["file_count"] == 2, res
+    assert p.versions() == [4, 3, 2, 1], f"versions {p.versions()}"
+
+
+def check_metadata_only(p: Project) -> None:
+    before = p.save(FILES)
+    res = p.save(FILES, name="renamed", description="now with a description")
+    assert res["version"] == before["version"], "renaming made a version"
+    assert res["updated_at"] != before["updated_at"], "renaming did not move updated_at"
+    project = p.repo.get_project(p.db, p.id, p.user_id)
+    assert project["name"] == "renamed", project
+
+
+def check_restores(p: Project) -> None:
+    p.patch({"src/a.lua": "print(3)\n"}, [])
+    assert p.restore(2)["version"] == 2, "restoring the current files made a version"
+    assert p.restore(1)["version"] == 3
+    assert p.restore(1)["version"] == 3, "restoring the same version twice made a version"
+    assert p.versions() == [3, 2, 1], f"versions {p.versions()}"
+
+
+def _in_session(repo: Repository, fn: Callable[[Any], Any], errors: List[str]) -> None:
+    gen = repo.session()
+    db = next(gen)
+    try:
+        fn(db)
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {str(e).splitlines()[0][:120]}")
+    finally:
+        gen.close()
+
+
+def check_concurrent_edits(p: Project) -> None:
+    repo, user_id = p.repo, p.user_id
+    writers, edits = 8, 20
+    errors: List[str] = []
+
+    def edit(i: int) -> None:
+        for k in range(edits):
+            # Every edit changes something: a new content, or deleting the file just written.
+            upserts = {} if k % 5 == 4 else {f"src/w{i}.lua": f"-- writer {i} edit {k}\n"}
+            deletes = [f"src/w{i}.lua"] if k % 5 == 4 else []
+            _in_session(
+                repo,
+                lambda db: repo.write_project_files(
+                    db, p.id, user_id, upserts=upserts, deletes=deletes, replace=False,
+                    base_version=None, meta={}, now=datetime.utcnow(),
+                ),
+                errors,
+            )
+
+    with ThreadPoolExecutor(writers) as pool:
+        list(pool.map(edit, range(writers)))
+    assert not errors, f"{len(errors)} of {writers * edits} edits failed, e.g. {errors[0]}"
+    version, refs = p.repo.get_project_manifest(p.db, p.id, user_id)
+    assert version == 1 + writers * edits, f"version {version} after {writers * edits} edits"
+    summary = next(s for s in repo.list_project_summaries(p.db, user_id, 100) if s["id"] == p.id)
+    assert summary["file_count"] == len(refs), f"file_count {summary['file_count']} for {len(refs)} files"
+    assert summary["total_bytes"] == sum(f["size"] for f in refs), "total_bytes does not match the files"
+    newest = repo.get_version_files(p.db, p.id, user_id, version) or []
+    assert [(f["path"], f["hash"]) for f in newest] == [(f["path"], f["hash"]) for f in refs], (
+        "newest snapshot does not match the files"
+    )
+
+
+def check_concurrent_writes(p: Project) -> None:
+    repo, user_id = p.repo, p.user_id
+    ids = [
+        repo.save_project(p.db, user_id=user_id, name=f"{p.id}-{i}", files=FILES, description=None, now=p.now)
+        for i in range(8)
+    ]
+    errors: List[str] = []
+
+    def write(pid: str, content: str) -> None:
+        _in_session(
+            repo,
+            lambda db: repo.write_project_files(
+                db, pid, user_id, upserts={"src/shared.lua": content}, deletes=[], replace=False,
+                base_version=None, meta={}, now=datetime.utcnow(),
+            ),
+            errors,
+        )
+
+    def churn(content: str) -> None:
+        def run(db: Any) -> None:
+            files = [{"path": "src/shared.lua", "content": content}]
+            for _ in range(5):
+                pid = repo.save_project(db, user_id=user_id, name="churn", files=files, description=None, now=p.now)
+                repo.delete_project(db, pid, user_id)
+
+        _in_session(repo, run, errors)
+
+    rounds = 30
+    with ThreadPoolExecutor(len(ids) + 1) as pool:
+        for r in range(rounds):
+            content = f"-- shared {p.id} {r}\n"
+            jobs = [pool.submit(write, pid, content) for pid in ids] + [pool.submit(churn, content)]
+            for job in jobs:
+                job.result()
+    assert not errors, f"{len(errors)} of {rounds * (len(ids) + 1)} jobs failed, e.g. {errors[0]}"
+    for pid in ids:
+        project = repo.get_project(p.db, pid, user_id)
+        files = {f["path"]: f["content"] for f in project["files"]}
+        assert files.get("src/shared.lua") == f"-- shared {p.id} {rounds - 1}\n", f"project {pid} lost its file"
+        for v in repo.list_project_versions(p.db, pid, user_id, 100):
+            refs = repo.get_version_files(p.db, pid, user_id, v["version"]) or []
+            stored = repo.get_blobs_stored(p.db, [f["hash"] for f in refs])
+            missing = [f["path"] for f in refs if f["hash"] not in stored]
+            assert not missing, f"project {pid} version {v['version']} has no content for {missing}"
+
+
+CHECKS: List[Callable[[Project], None]] = [
+    check_identical_saves,
+    check_noop_patches,
+    check_real_edits,
+    check_metadata_only,
+    check_restores,
+    check_concurrent_edits,
+    check_concurrent_writes,
+]
+
+
+def main() -> int:
+    url = sys.argv[1] if len(sys.argv) > 1 else ""
+    cleanup: Callable[[], None] = lambda: None
+    if url.startswith(("mongodb://", "mongodb+srv://")):
+        target = MongoRepository(url, client_options=mongo_client_options())
+        name = f"{target.db.name}_version_check"
+        repo: Repository = MongoRepository(
+            url, history_limit=20, client_options=mongo_client_options(), database=name
+        )
+        repo.db.client.drop_database(name)
+        cleanup = lambda: repo.db.client.drop_database(name)
+    else:
+        url = url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='version_check_'), 'check.db')}"
+        repo = SqlRepository(create_sql_engine(url), history_limit=20)
+    repo.init()
+    gen = repo.session()
+    db = next(gen)
+    failures = 0
+    try:
+        user = repo.create_user(db, email=f"version-check-{os.getpid()}@example.com", name="check", password_hash="x")
+        for check in CHECKS:
+            try:
+                check(Project(repo, db, user["id"], check.__name__))
+                print(f"[OK] {check.__name__}")
+            except AssertionError as e:
+                failures += 1
+                print(f"[FAIL] {check.__name__}: {e or 'assertion failed'}")
+    finally:
+        gen.close()
+        cleanup()
+    if failures:
+        print(f"\n{failures} check(s) failed")
+    else:
+        print("\nProject versions only grow on real edits")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Check that every session store backend honours the same contract.
+Usage: python check_session_backends.py [REDIS_URL]
+
+Runs one set of get/set/delete/touch/expiry assertions, plus a SessionStore
+round trip, against memory://, a scratch sqlite:// file and redis://. Without
+a REDIS_URL the Redis backend talks to benchmarks/redis_standin.py on a free
+local port (with a password and a non-zero database, so AUTH and SELECT are
+exercised too). Keys use a random prefix or fresh session ids; anything not
+deleted afterwards expires within two minutes.
+"""
+
+import os
+import secrets
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from app.services.session_backends import (
+        MemoryBackend,
+        RedisBackend,
+        SessionBackend,
+        backend_from_url,
+    )
+except ImportError as e:
+    print(f"[ERROR] Import error: {e}")
+    print("Make sure you're in the backend directory and dependencies are installed.")
+    sys.exit(1)
+
+# Short enough to keep the run quick, long enough for a slow CI box.
+EXPIRY = 0.3
+
+
+def check_roundtrip(b: SessionBackend, p: str) -> None:
+    assert b.get(p + "missing") is None
+    b.set(p + "a", b"one", 60)
+    assert b.get(p + "a") == b"one"
+    b.set(p + "a", b"\x00two\r\n", 60)
+    assert b.get(p + "a") == b"\x00two\r\n", "overwrite / binary-safe value"
+    b.set(p + "empty", b"", 60)
+    assert b.get(p + "empty") == b""
+
+
+def check_delete(b: SessionBackend, p: str) -> None:
+    b.set(p + "d", b"x", 60)
+    b.delete(p + "d")
+    assert b.get(p + "d") is None
+    b.delete(p + "never-set")
+
+
+def check_expiry(b: SessionBackend, p: str) -> None:
+    b.set(p + "short", b"x", EXPIRY)
+    b.set(p + "long", b"y", 60)
+    assert b.get(p + "short") == b"x"
+    time.sleep(EXPIRY + 0.2)
+    assert b.get(p + "short") is None, "value visible after its TTL"
+    assert b.get(p + "long") == b"y"
+    b.set(p + "short", b"again", 60)
+    assert b.get(p + "short") == b"again", "expired key can be set again"
+
+
+def check_touch(b: SessionBackend, p: str) -> None:
+    assert b.touch(p + "missing", 60) is False
+    b.set(p + "t", b"x", EXPIRY)
+    assert b.touch(p + "t", 60) is True
+    time.sleep(EXPIRY + 0.2)
+    assert b.get(p + "t") == b"x", "touch did not extend the TTL"
+    b.set(p + "gone", b"x", EXPIRY)
+    time.sleep(EXPIRY + 0.2)
+    assert b.touch(p + "gone", 60) is False, "touch revived an expired value"
+    assert b.get(p + "gone") is None
+
+
+def check_incr(b: SessionBackend, p: str) -> None:
+    assert b.incr(p + "n", 60) == 1
+    assert b.incr(p + "n", 60) == 2
+    b.set(p + "n2", b"x", 60)
+    b.delete(p + "n2")
+    assert b.incr(p + "n2", EXPIRY) == 1
+    time.sleep(EXPIRY + 0.2)
+    assert b.incr(p + "n2", 60) == 1, "counter survived its TTL"
+    with ThreadPoolExecutor(8) as pool:
+        seen = list(pool.map(lambda _: b.incr(p + "n", 60), range(200)))
+    assert sorted(seen) == list(range(3, 203)), "concurrent increments collided"
+
+
+def check_reconnect(b: SessionBackend, p: str) -> None:
+    if not isinstance(b, RedisBackend):
+        return
+    b.set(p + "r", b"x", 60)
+    sock, _ = b._local.conn
+    sock.close()
+    assert b.get(p + "r") == b"x", "no reconnect after the connection dropped"
+    # A connection the other end has closed is replaced before INCR goes out.
+    n = b.incr(p + "n", 60)
+    b._local.conn[0].shutdown(socket.SHUT_RD)
+    assert b.incr(p + "n", 60) == n + 1, "INCR not resent on a fresh connection"
+
+
+def check_memory_bounds(b: SessionBackend, p: str) -> None:
+    if not isinstance(b, MemoryBackend):
+        return
+    mem = MemoryBackend(shards=1)
+    for i in range(100):
+        mem.set(p + str(i), b"x", 60)
+    for _ in range(100):
+        for i in range(100):
+            mem.touch(p + str(i), 60)
+        mem.set(p + "w", b"x", 60)
+    assert len(mem._shards[0].heap) <= len(mem), "touch grows the expiry heap"
+    # A byte budget must not evict a blob that a live value refers to.
+    mem = MemoryBackend(shards=1, max_bytes=4096)
+    mem.set(p + "blob", b"b" * 1024, 60)
+    mem.set(p + "rec", b"r", 60, refs=[p + "blob"])
+    for i in range(20):
+        assert mem.get(p + "rec") is not None, "recently used value evicted"
+        mem.set(p + f"fill{i}", b"f" * 1024, 60)
+    assert mem.get(p + "blob") is not None, "referenced blob evicted"
+    mem.delete(p + "rec")
+    for i in range(20):
+        mem.set(p + f"more{i}", b"f" * 1024, 60)
+    assert mem.get(p + "blob") is None, "unreferenced blob never evicted"
+
+
+def check_session_store(b: SessionBackend, p: str) -> None:
+    from app.services.session_store import SessionStore
+
+    store = SessionStore(backend=b, ttl_seconds=60, hot_size=0)
+    pack = {"name": "check", "files": [{"path": "a.lua", "content": "print(1)"}, {"path": "b.lua", "content": "x"}]}
+    root = store.create(pack)
+    assert store.get(root) == pack
+    child = store.create({**pack, "name": "check 2"}, parent=root)
+    assert store.head(root) == (child, 2), "lineage head not advanced"
+    assert store.manifest(root)["session_id"] == child
+    assert store.get_bytes(child, gzipped=True)
+    # Concurrent regenerates from one root must each get their own version.
+    with ThreadPoolExecutor(8) as pool:
+        sids = list(pool.map(lambda i: store.create({**pack, "name": f"v{i}"}, parent=root), range(16)))
+    head_sid, version = store.head(root)
+    assert version == 18 and head_sid in sids, f"lineage head lost an update: v{version}"
+    store.delete(child)
+    store.delete(root)
+    assert store.get(root) is None
+
+
+CHECKS: List[Callable[[SessionBackend, str], None]] = [
+    check_roundtrip,
+    check_delete,
+    check_expiry,
+    check_touch,
+    check_incr,
+    check_reconnect,
+    check_memory_bounds,
+    check_session_store,
+]
+
+
+def run(name: str, backend: SessionBackend) -> int:
+    prefix = f"check-{secrets.token_hex(4)}:"
+    failures = 0
+    try:
+        for check in CHECKS:
+            try:
+                check(backend, prefix)
+                print(f"[OK] {name}: {check.__name__}")
+            except AssertionError as e:
+                failures += 1
+                print(f"[FAIL] {name}: {check.__name__}: {e or 'assertion failed'}")
+            except Exception as e:
+                failures += 1
+                print(f"[FAIL] {name}: {check.__name__}: {type(e).__name__}: {e}")
+    finally:
+        for suffix in ("a", "empty", "d", "short", "long", "t", "gone", "n", "n2", "r"):
+            try:
+                backend.delete(prefix + suffix)
+            except Exception:
+                pass
+        backend.close()
+    return failures
+
+
+def main() -> int:
+    standin = None
+    if len(sys.argv) > 1:
+        redis_url = sys.argv[1]
+    else:
+        from benchmarks import redis_standin
+
+        standin = redis_standin.start(password=secrets.token_hex(8))
+        redis_url = standin.url[: -len("/0")] + "/1"
+
+    tmp = tempfile.mkdtemp(prefix="session_check_")
+    backends: List[Tuple[str, str]] = [
+        ("memory", "memory://"),
+        ("sqlite", f"sqlite:///{os.path.join(tmp, 'sessions.db')}"),
+        ("redis" if standin is None else "redis (stand-in)", redis_url),
+    ]
+    failures = 0
+    try:
+        for name, url in backends:
+            try:
+                backend = backend_from_url(url)
+            except Exception as e:
+                failures += 1
+                print(f"[FAIL] {name}: {type(e).__name__}: {e}")
+                continue
+            failures += run(name, backend)
+    finally:
+        if standin is not None:
+            standin.shutdown()
+            standin.server_close()
+    if failures:
+        print(f"\n{failures} check(s) failed")
+    else:
+        print("\nAll session backends behave the same")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
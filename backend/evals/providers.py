@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class CallRecord:
+    kind: str  # generate | repair | mvp_retry | regenerate | other
+    latency_s: float
+    prompt_tokens: int
+    completion_tokens: int
+    text: str
+
+
+@dataclass
+class CallLog:
+    calls: List[CallRecord] = field(default_factory=list)
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+
+def _classify(messages: List[Dict[str, Any]]) -> str:
+    # Imported lazily so the routes module (and settings) load after env overrides.
+    from app.api import routes
+
+    system = str(messages[0].get("content") or "") if messages else ""
+    if system == routes._REPAIR_SYSTEM_PROMPT:
+        return "repair"
+    if system == routes._REGENERATE_SYSTEM_PROMPT:
+        return "regenerate"
+    if system == routes._ROBLOX_SYSTEM_PROMPT:
+        user = str(messages[-1].get("content") or "")
+        return "mvp_retry" if "mvp_regen_from_scratch" in user else "generate"
+    return "other"
+
+
+def _approx_tokens(text: str) -> int:
+    # ~4 chars/token is close enough for relative comparisons when usage is missing.
+    return max(1, len(text) // 4)
+
+
+class _RecordingCompletions:
+    def __init__(self, inner: Any, log: CallLog):
+        self._inner = inner
+        self._log = log
+
+    def create(self, **kwargs: Any) -> Any:
+        t0 = time.perf_counter()
+        resp = self._inner.chat.completions.create(**kwargs)
+        dt = time.perf_counter() - t0
+        text = (resp.choices[0].message.content or "") if getattr(resp, "choices", None) else ""
+        usage = getattr(resp, "usage", None)
+        messages = list(kwargs.get("messages") or [])
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        self._log.calls.append(
+            CallRecord(
+                kind=_classify(messages),
+                latency_s=dt,
+                prompt_tokens=int(prompt_tokens if prompt_tokens is not None else _approx_tokens(json.dumps(messages))),
+                completion_tokens=int(completion_tokens if completion_tokens is not None else _approx_tokens(text)),
+                text=text,
+            )
+        )
+        return resp
+
+
+class RecordingClient:
+    """Wraps an OpenAI-compatible client and records every chat.completions.create call."""
+
+    def __init__(self, inner: Any, log: CallLog):
+        self.chat = SimpleNamespace(completions=_RecordingCompletions(inner, log))
+
+
+class MockOpenAI:
+    """Offline stand-in for the OpenAI client.
+
+    Answers generation calls with the template's fallback pack, corrupted at the
+    configured rates so repair/fallback paths get exercised. Deterministic per seed.
+    """
+
+    def __init__(
+        self,
+        *,
+        seed: int = 0,
+        broken_rate: float = 0.25,
+        invalid_rate: float = 0.05,
+        repair_success_rate: float = 0.8,
+        latency_ms: float = 0.0,
+        ms_per_output_token: float = 0.0,
+    ):
+        self._rng = random.Random(seed)
+        self.broken_rate = broken_rate
+        self.invalid_rate = invalid_rate
+        self.repair_success_rate = repair_success_rate
+        self.latency_ms = latency_ms
+        self.ms_per_output_token = ms_per_output_token
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _good_pack(self, template: str, prompt: str) -> Dict[str, Any]:
+        from app.api import routes
+
+        # The eval runner wraps _pick_template_pack to tag real fallbacks; answer with the untagged pack.
+        pick = getattr(routes._pick_template_pack, "_eval_original", routes._pick_template_pack)
+        return pick(template, prompt)
+
+    @staticmethod
+    def _broken(pack: Dict[str, Any]) -> Dict[str, Any]:
+        bad = dict(pack)
+        bad["files"] = list(pack["files"]) + [
+            {
+                "path": "StarterGui/ScoreUI.lua",
+                "content": "local player = game.Players.LocalPlayer\nlocal score = player.leaderstats.Score\nprint(score.Value)\n",
+            }
+        ]
+        return bad
+
+    def _create(self, **kwargs: Any) -> Any:
+        messages = list(kwargs.get("messages") or [])
+        kind = _classify(messages)
+        try:
+            payload = json.loads(str(messages[-1].get("content") or "{}"))
+        except json.JSONDecodeError:
+            payload = {}
+        context = payload.get("context") or {}
+        template = str(context.get("template") or "")
+        prompt = str(context.get("original_prompt") or payload.get("prompt") or "")
+
+        roll = self._rng.random()
+        if kind == "repair":
+            ok = roll < self.repair_success_rate
+            out = self._good_pack(template, prompt) if ok else self._broken(self._good_pack(template, prompt))
+        elif roll < self.invalid_rate:
+            out = {"title": "Oops", "files": []}
+        elif roll < self.invalid_rate + self.broken_rate:
+            out = self._broken(self._good_pack(template, prompt))
+        else:
+            out = self._good_pack(template, prompt)
+
+        text = json.dumps(out)
+        completion_tokens = _approx_tokens(text)
+        delay_ms = self.latency_ms + self.ms_per_output_token * completion_tokens
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")],
+            usage=SimpleNamespace(
+                prompt_tokens=_approx_tokens(json.dumps(messages)),
+                completion_tokens=completion_tokens,
+                total_tokens=None,
+            ),
+        )
+
+
+def install(provider: str, log: CallLog, *, mock: Optional[MockOpenAI] = None) -> None:
+    """Route `openai_service` through a recording client for `provider` ("mock" | "openai")."""
+    from app.services import openai_service
+    from app.settings import settings
+
+    if provider == "mock":
+        inner: Any = mock or MockOpenAI()
+        # The generate route refuses to call the model without a key.
+        settings.openai_api_key = settings.openai_api_key or "sk-mock"
+        openai_service._client = lambda: RecordingClient(inner, log)  # type: ignore[assignment]
+        return
+
+    if provider == "openai":
+        real_client = openai_service._client
+        openai_service._client = lambda: RecordingClient(real_client(), log)  # type: ignore[assignment]
+        return
+
+    raise ValueError(f"unknown provider: {provider}")
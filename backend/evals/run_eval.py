@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Offline quality-and-latency evaluation for /api/roblox/generate.
+
+Replays a versioned prompt corpus through the real route logic (validation,
+repair, MVP retry, fallback) against a mock or real model and reports, per
+template: first-pass validity, repair rate, fallback rate, tokens and wall time.
+
+Usage (from backend/):
+    python -m evals.run_eval                                  # mock provider, corpus v1
+    python -m evals.run_eval --provider openai --repeat 3     # real model (uses OPENAI_API_KEY)
+    python -m evals.run_eval --json results.json              # save for later comparison
+    python -m evals.run_eval --compare results.json           # diff against a previous run
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from evals.providers import CallLog, MockOpenAI, install  # noqa: E402
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+# Appended to every fallback pack's notes so fallbacks are detectable in the response.
+_FALLBACK_MARKER = "__eval_fallback__"
+_EVAL_USER = {"id": "eval", "email": "eval@localhost", "name": "eval", "avatar_url": None}
+
+
+@dataclass
+class CaseResult:
+    case_id: str
+    template: str
+    first_pass_valid: bool
+    repaired: bool
+    fallback: bool
+    error: Optional[str]
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    wall_s: float
+
+
+def load_corpus(version: str) -> Dict[str, Any]:
+    path = Path(version) if version.endswith(".json") else CORPUS_DIR / f"{version}.json"
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _tag_fallbacks() -> None:
+    from app.api import routes
+
+    original = routes._pick_template_pack
+    if getattr(original, "_eval_original", None) is not None:
+        return
+
+    @functools.wraps(original)
+    def tagged(template: str, prompt: str) -> Dict[str, Any]:
+        pack = original(template, prompt)
+        pack["notes"] = list(pack.get("notes") or []) + [_FALLBACK_MARKER]
+        return pack
+
+    tagged._eval_original = original  # type: ignore[attr-defined]
+    routes._pick_template_pack = tagged  # type: ignore[assignment]
+
+
+def _first_pass_valid(text: str) -> bool:
+    from app.api.routes import _looks_like_broken_studio_pack
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return False
+    files = data.get("files") if isinstance(data, dict) else None
+    if not isinstance(files, list):
+        return False
+    # Same normalization the generate route applies before its heuristics.
+    norm = []
+    for f in files:
+        if not isinstance(f, dict):
+            continue
+        path = str(f.get("path") or "").strip()
+        content = str(f.get("content") or "").strip()
+        if path and len(content) >= 50:
+            norm.append({"path": path, "content": content})
+    return bool(norm) and not _looks_like_broken_studio_pack(norm)
+
+
+def run_case(case: Dict[str, Any], log: CallLog) -> CaseResult:
+    from fastapi import HTTPException
+
+    from app.api.models import RobloxGenerateRequest
+    from app.api.routes import roblox_generate
+
+    template = str(case.get("template") or "")
+    prompt = str(case["prompt"])
+    req = RobloxGenerateRequest(prompt=prompt, template=template, require_ai=False)
+
+    log.reset()
+    error: Optional[str] = None
+    resp = None
+    t0 = time.perf_counter()
+    # The route logs with print(); keep the report readable.
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            resp = roblox_generate(req, user=_EVAL_USER)
+        except HTTPException as e:
+            error = str(e.detail)
+    wall = time.perf_counter() - t0
+
+    calls = list(log.calls)
+    first = next((c for c in calls if c.kind == "generate"), None)
+    is_fallback = resp is not None and _FALLBACK_MARKER in resp.notes
+    return CaseResult(
+        case_id=str(case["id"]),
+        template=template or "(free-form)",
+        first_pass_valid=bool(first and _first_pass_valid(first.text)),
+        repaired=any(c.kind == "repair" for c in calls),
+        fallback=is_fallback or error is not None,
+        error=error,
+        llm_calls=len(calls),
+        prompt_tokens=sum(c.prompt_tokens for c in calls),
+        completion_tokens=sum(c.completion_tokens for c in calls),
+        wall_s=wall,
+    )
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[idx]
+
+
+def summarize(results: List[CaseResult]) -> Dict[str, Dict[str, float]]:
+    by_template: Dict[str, List[CaseResult]] = {}
+    for r in results:
+        by_template.setdefault(r.template, []).append(r)
+    by_template["ALL"] = list(results)
+
+    out: Dict[str, Dict[str, float]] = {}
+    for template, rs in by_template.items():
+        n = len(rs)
+        walls = [r.wall_s for r in rs]
+        out[template] = {
+            "runs": n,
+            "first_pass_valid": sum(r.first_pass_valid for r in rs) / n,
+            "repair_rate": sum(r.repaired for r in rs) / n,
+            "fallback_rate": sum(r.fallback for r in rs) / n,
+            "llm_calls": statistics.mean(r.llm_calls for r in rs),
+            "prompt_tokens": statistics.mean(r.prompt_tokens for r in rs),
+            "completion_tokens": statistics.mean(r.completion_tokens for r in rs),
+            "wall_p50_s": _pct(walls, 0.5),
+            "wall_p95_s": _pct(walls, 0.95),
+        }
+    return out
+
+
+def print_summary(summary: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None) -> None:
+    cols = [
+        ("runs", "runs", "{:>4.0f}"),
+        ("first_pass_valid", "1st-pass", "{:>8.0%}"),
+        ("repair_rate", "repair", "{:>6.0%}"),
+        ("fallback_rate", "fallback", "{:>8.0%}"),
+        ("llm_calls", "calls", "{:>5.2f}"),
+        ("prompt_tokens", "in tok", "{:>7.0f}"),
+        ("completion_tokens", "out tok", "{:>7.0f}"),
+        ("wall_p50_s", "p50 s", "{:>6.2f}"),
+        ("wall_p95_s", "p95 s", "{:>6.2f}"),
+    ]
+    name_w = max(len(t) for t in summary) + 1
+    print(f"{'template':<{name_w}} " + " ".join(f"{label:>{len(fmt.format(0))}}" for _, label, fmt in cols))
+    for template in sorted(summary, key=lambda t: (t == "ALL", t)):
+        row = summary[template]
+        print(f"{template:<{name_w}} " + " ".join(fmt.format(row[key]) for key, _, fmt in cols))
+        base = (baseline or {}).get(template)
+        if base:
+            deltas = []
+            for key, label, _ in cols[1:]:
+                d = row[key] - float(base.get(key, 0.0))
+                if abs(d) > 1e-9:
+                    deltas.append(f"{label} {d:+.2f}")
+            if deltas:
+                print(f"{'':<{name_w}}   vs base: " + ", ".join(deltas))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", default="v1", help="corpus version under evals/corpus/ or a path to a .json file")
+    ap.add_argument("--provider", choices=["mock", "openai"], default="mock")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per prompt (default 1)")
+    ap.add_argument("-k", "--filter", default="", help="only run cases whose id or template contains this")
+    ap.add_argument("--seed", type=int, default=0, help="mock provider seed")
+    ap.add_argument("--mock-broken-rate", type=float, default=0.25)
+    ap.add_argument("--mock-invalid-rate", type=float, default=0.05)
+    ap.add_argument("--mock-repair-success", type=float, default=0.8)
+    ap.add_argument("--mock-latency-ms", type=float, default=0.0, help="fixed latency per mock call")
+    ap.add_argument("--mock-ms-per-token", type=float, default=0.0, help="extra mock latency per output token")
+    ap.add_argument("--json", dest="json_out", help="write per-case results and summary here")
+    ap.add_argument("--compare", help="previous --json output to diff the summary against")
+    args = ap.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    log = CallLog()
+    mock = None
+    if args.provider == "mock":
+        mock = MockOpenAI(
+            seed=args.seed,
+            broken_rate=args.mock_broken_rate,
+            invalid_rate=args.mock_invalid_rate,
+            repair_success_rate=args.mock_repair_success,
+            latency_ms=args.mock_latency_ms,
+            ms_per_output_token=args.mock_ms_per_token,
+        )
+    install(args.provider, log, mock=mock)
+    _tag_fallbacks()
+
+    from app.settings import settings
+
+    cases = [
+        c
+        for c in corpus["cases"]
+        if not args.filter or args.filter in c["id"] or args.filter in str(c.get("template") or "")
+    ]
+    model = "mock" if args.provider == "mock" else settings.openai_model
+    print(f"corpus {corpus['version']} ({len(cases)} prompts x {args.repeat}), provider={args.provider}, model={model}")
+
+    results: List[CaseResult] = []
+    for _ in range(max(1, args.repeat)):
+        for case in cases:
+            r = run_case(case, log)
+            results.append(r)
+            status = "ok" if r.first_pass_valid else ("repaired" if r.repaired and not r.fallback else "fallback" if r.fallback else "invalid")
+            print(f"  {r.case_id:<22} {status:<9} calls={r.llm_calls} {r.wall_s:6.2f}s", file=sys.stderr)
+
+    summary = summarize(results)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh).get("summary")
+    print()
+    print_summary(summary, baseline)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "corpus_version": corpus["version"],
+                    "provider": args.provider,
+                    "model": model,
+                    "summary": summary,
+                    "cases": [asdict(r) for r in results],
+                },
+                fh,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
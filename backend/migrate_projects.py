@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Bulk export/import of projects, and copying them between database backends.
+Usage:
+  python migrate_projects.py export DATABASE_URL out.ndjson
+  python migrate_projects.py import DATABASE_URL in.ndjson
+  python migrate_projects.py copy --from SQLITE_URL --to MONGODB_URL
+
+Files are NDJSON, one project per line (the same format as
+GET /api/projects/export), plus an "owner" email so projects land with the
+same account on import. Owners missing on the target are created without a
+password; signing in with Google under the same email links the account.
+`copy` also carries password hashes across. Version history is not copied:
+each project starts at version 1 on the target.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from app.database.database import iter_projects, make_repository
+    from app.database.repository import Repository
+    from app.services import json_body, project_transfer
+except ImportError as e:
+    print(f"[ERROR] Import error: {e}")
+    print("Make sure you're in the backend directory and dependencies are installed.")
+    sys.exit(1)
+
+
+def _open(url: str) -> Repository:
+    repo = make_repository(url)
+    repo.init()
+    return repo
+
+
+def _session(repo: Repository):
+    gen = repo.session()
+    return gen, next(gen)
+
+
+class OwnerMap:
+    """Source owner (id or email) -> user id on the target, creating missing users once."""
+
+    def __init__(self, target: Repository, source: Optional[Repository] = None):
+        self.target = target
+        self.source = source
+        self._ids: Dict[str, str] = {}
+        self._emails: Dict[str, str] = {}
+        self.created = 0
+
+    def by_email(self, db: Any, email: str, name: Optional[str] = None, password_hash: str = "") -> str:
+        email = (email or "").lower().strip()
+        if not email:
+            raise ValueError("project has no owner email")
+        if email not in self._ids:
+            user = self.target.get_user_by_email(db, email)
+            if user is None:
+                user = self.target.create_user(db, email=email, name=name, password_hash=password_hash)
+                self.created += 1
+            self._ids[email] = user["id"]
+        return self._ids[email]
+
+    def email_of(self, source_owner: str) -> Dict[str, Any]:
+        """{"email", "name", "password_hash"} of a source user id (read from the source)."""
+        if source_owner not in self._emails:
+            gen, db = _session(self.source)
+            try:
+                user = self.source.get_user_by_id(db, source_owner)
+                if user is None:
+                    raise ValueError(f"owner {source_owner} not found on the source")
+                login = self.source.get_password_login(db, user["email"])
+            finally:
+                gen.close()
+            self._emails[source_owner] = {
+                "email": user["email"],
+                "name": user.get("name"),
+                "password_hash": login[1] if login else "",
+            }
+        return self._emails[source_owner]
+
+
+def export_projects(url: str, out_path: str) -> None:
+    source = _open(url)
+    owners = OwnerMap(source, source)
+    progress = project_transfer.Progress("export")
+    with open(out_path, "wb") as out:
+        for owner, proj in iter_projects(user_id=None, source=source):
+            proj["owner"] = owners.email_of(owner)["email"]
+            line = json_body.dumps(proj) + b"\n"
+            out.write(line)
+            progress.add(1, len(line))
+    progress.done()
+
+
+def _import_batches(target: Repository, owners: OwnerMap, batches) -> int:
+    """Insert (owner email, project) pairs grouped per owner, one transaction per group."""
+    total = 0
+    for batch in batches:
+        gen, db = _session(target)
+        try:
+            by_owner: Dict[str, List[Dict[str, Any]]] = {}
+            for owner, proj in batch:
+                uid = owners.by_email(db, owner["email"], owner.get("name"), owner.get("password_hash") or "")
+                by_owner.setdefault(uid, []).append(proj)
+            for uid, projects in by_owner.items():
+                total += len(target.import_projects(db, uid, projects, datetime.utcnow()))
+        finally:
+            gen.close()
+    return total
+
+
+def import_projects(url: str, in_path: str, batch_size: int) -> None:
+    target = _open(url)
+    owners = OwnerMap(target)
+    progress = project_transfer.Progress("import")
+
+    def batches():
+        batch = []
+        with open(in_path, "rb") as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json_body.loads(line)
+                    proj = project_transfer.parse_project(line)
+                except ValueError as e:
+                    raise SystemExit(f"[ERROR] {in_path}:{lineno}: {e}")
+                batch.append(({"email": rec.get("owner") or ""}, proj))
+                progress.add(1, len(line))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    n = _import_batches(target, owners, batches())
+    progress.done()
+    print(f"[OK] imported {n} projects ({owners.created} users created)")
+
+
+def copy_projects(src_url: str, dst_url: str, batch_size: int) -> None:
+    source = _open(src_url)
+    target = _open(dst_url)
+    owners = OwnerMap(target, source)
+    progress = project_transfer.Progress("copy")
+
+    def batches():
+        batch = []
+        for owner, proj in iter_projects(user_id=None, source=source):
+            files = proj.get("files") or []
+            proj = {
+                "name": proj["name"],
+                "description": proj.get("description"),
+                "files": [{"path": f["path"], "content": f["content"]} for f in files],
+                "created_at": datetime.fromisoformat(proj["created_at"]),
+                "updated_at": datetime.fromisoformat(proj["updated_at"]),
+            }
+            batch.append((owners.email_of(owner), proj))
+            progress.add(1, sum(len(f["content"].encode("utf-8")) for f in files))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    n = _import_batches(target, owners, batches())
+    progress.done()
+    print(f"[OK] copied {n} projects ({owners.created} users created)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export, import or copy projects between databases.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="write every project to an NDJSON file")
+    p.add_argument("url")
+    p.add_argument("out")
+
+    p = sub.add_parser("import", help="create projects from an NDJSON file")
+    p.add_argument("url")
+    p.add_argument("input")
+    p.add_argument("--batch-size", type=int, default=project_transfer.IMPORT_BATCH)
+
+    p = sub.add_parser("copy", help="copy users' projects from one database to another")
+    p.add_argument("--from", dest="src", required=True)
+    p.add_argument("--to", dest="dst", required=True)
+    p.add_argument("--batch-size", type=int, default=project_transfer.IMPORT_BATCH)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_projects(args.url, args.out)
+    elif args.command == "import":
+        import_projects(args.url, args.input, args.batch_size)
+    else:
+        copy_projects(args.src, args.dst, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import { useMemo, useState } from 'react';
-import { useMutation, useQuery, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { FolderOpen, Pencil, RefreshCw, Search, Trash2, X } from 'lucide-react';
 import { deleteProject, getProject, listProjects, updateProject, type ProjectInfo } from '../../services/api';
 
@@ -14,13 +14,21 @@ function isAuthError(err: any): boolean {
   return status === 401 || status === 403;
 }
 
+function formatBytes(n: number): string {
+  if (n < 1024) return `${n} B`;
+  if (n < 1024 * 1024) return `${(n / 1024).toFixed(1)} KB`;
+  return `${(n / (1024 * 1024)).toFixed(1)} MB`;
+}
+
 export default function ProjectManagerModal({ isOpen, onClose, onLoadProject }: ProjectManagerModalProps) {
   const [query, setQuery] = useState('');
   const queryClient = useQueryClient();
 
-  const projectsQuery = useQuery({
+  const projectsQuery = useInfiniteQuery({
     queryKey: ['projects'],
-    queryFn: listProjects,
+    queryFn: ({ pageParam }) => listProjects(pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? null,
     enabled: isOpen,
     staleTime: 10_000,
   });
@@ -50,7 +58,7 @@ export default function ProjectManagerModal({ isOpen, onClose, onLoadProject }:
 
   const filtered = useMemo(() => {
     const q = query.trim().toLowerCase();
-    const projects = projectsQuery.data?.projects ?? [];
+    const projects = projectsQuery.data?.pages.flatMap((page) => page.projects) ?? [];
     if (!q) return projects;
     return projects.filter((p) => {
       const hay = `${p.name} ${p.description ?? ''} ${p.id}`.toLowerCase();
@@ -104,7 +112,7 @@ export default function ProjectManagerModal({ isOpen, onClose, onLoadProject }:
               ? 'Loading…'
               : authError
                 ? 'Sign in to view your saved projects.'
-                : `${filtered.length} project${filtered.length === 1 ? '' : 's'}`}
+                : `${filtered.length}${projectsQuery.hasNextPage ? '+' : ''} project${filtered.length === 1 ? '' : 's'}`}
           </div>
         </div>
 
@@ -140,7 +148,8 @@ export default function ProjectManagerModal({ isOpen, onClose, onLoadProject }:
                         <div className="text-xs text-[#858585] mt-0.5">No description</div>
                       )}
                       <div className="text-[11px] text-[#858585] mt-1">
-                        {p.files?.length ?? 0} files • Updated {new Date(p.updated_at).toLocaleString()}
+                        {p.file_count} file{p.file_count === 1 ? '' : 's'} • {formatBytes(p.total_bytes)} • Updated{' '}
+                        {new Date(p.updated_at).toLocaleString()}
                       </div>
                     </div>
                     <div className="flex items-center gap-2 whitespace-nowrap">
@@ -179,6 +188,15 @@ export default function ProjectManagerModal({ isOpen, onClose, onLoadProject }:
                   </div>
                 </div>
               ))}
+              {projectsQuery.hasNextPage ? (
+                <button
+                  className="w-full px-4 py-3 text-xs text-[#75beff] hover:bg-[#2a2d2e] disabled:opacity-60"
+                  onClick={() => projectsQuery.fetchNextPage()}
+                  disabled={projectsQuery.isFetchingNextPage}
+                >
+                  {projectsQuery.isFetchingNextPage ? 'Loading…' : 'Load more'}
+                </button>
+              ) : null}
             </div>
           )}
         </div>
@@ -1,9 +1,19 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useMutation, useQueryClient, useQuery } from '@tanstack/react-query';
 import IDELayout from '../components/IDE/IDELayout';
 import PromptPanel from '../components/IDE/PromptPanel';
 import ProjectManagerModal from '../components/IDE/ProjectManagerModal';
-import { generateRobloxGame, regenerateRobloxGame, getProject, replaceProject, saveProject, getMe, type ProjectInfo } from '../services/api';
+import {
+  generateRobloxGame,
+  regenerateRobloxGame,
+  getProject,
+  patchProjectFiles,
+  replaceProject,
+  saveProject,
+  updateProject,
+  getMe,
+  type ProjectInfo,
+} from '../services/api';
 
 /** Storage keys scoped by user so project/AI history persist per account across logout/login */
 function projectFilesKey(userId: string | null | undefined) {
@@ -28,8 +38,14 @@ export default function IDE() {
   const [lastPrompt, setLastPrompt] = useState<string>('');
   const [lastTemplate, setLastTemplate] = useState<string>('');
   const [lastSessionId, setLastSessionId] = useState<string | null>(null);
+  // Files and version as last saved to / loaded from the server; saves send only the difference.
+  const savedRef = useRef<{ name: string; version: number; files: Map<string, string> } | null>(null);
   const queryClient = useQueryClient();
 
+  const rememberSaved = (name: string, version: number, saved: File[]) => {
+    savedRef.current = { name, version, files: new Map(saved.map((f) => [f.path, f.content])) };
+  };
+
   const meQuery = useQuery({
     queryKey: ['me'],
     queryFn: getMe,
@@ -67,6 +83,7 @@ export default function IDE() {
       sessionStorage.removeItem(userId ? `vibe_ai_project_hash_${userId}` : 'vibe_ai_project_hash');
       setCurrentProjectId(null);
       setCurrentProjectName('My Project');
+      savedRef.current = null;
     },
     onSuccess: (data) => {
       if (data.session_id) setLastSessionId(data.session_id);
@@ -195,6 +212,7 @@ export default function IDE() {
       // Clear current project state
       setCurrentProjectId(null);
       setCurrentProjectName('My Project');
+      savedRef.current = null;
       setLastPrompt('');
       setLastTemplate('');
       setLastSessionId(null);
@@ -208,6 +226,7 @@ export default function IDE() {
     onSuccess: (project) => {
       alert('Project saved successfully!');
       if (project?.id) {
+        rememberSaved(project.name, project.version, project.files);
         localStorage.setItem(lastProjectIdKey(userId), project.id);
         setCurrentProjectId(project.id);
       }
@@ -222,11 +241,33 @@ export default function IDE() {
   });
 
   const updateProjectMutation = useMutation({
-    mutationFn: ({ projectId, projectName }: { projectId: string; projectName: string }) =>
-      replaceProject(projectId, { name: projectName, files }),
+    mutationFn: async ({ projectId, projectName }: { projectId: string; projectName: string }) => {
+      const snapshot = files;
+      const saved = savedRef.current;
+      if (!saved) {
+        const project = await replaceProject(projectId, { name: projectName, files: snapshot });
+        return { id: project.id, name: project.name, version: project.version, files: snapshot };
+      }
+      const current = new Map(snapshot.map((f) => [f.path, f.content]));
+      const upsert = snapshot.filter((f) => saved.files.get(f.path) !== f.content);
+      const removed = [...saved.files.keys()].filter((path) => !current.has(path));
+      let version = saved.version;
+      try {
+        if (upsert.length > 0 || removed.length > 0) {
+          version = (await patchProjectFiles(projectId, { base_version: saved.version, upsert, delete: removed })).version;
+        }
+      } catch (err: any) {
+        if (err?.response?.status !== 409) throw err;
+        if (!confirm('This project was changed elsewhere since you opened it. Overwrite it with your version?')) throw err;
+        version = (await replaceProject(projectId, { name: projectName, files: snapshot })).version;
+      }
+      if (projectName !== saved.name) await updateProject(projectId, { name: projectName });
+      return { id: projectId, name: projectName, version, files: snapshot };
+    },
     onSuccess: (project) => {
       alert('Project updated successfully!');
       if (project?.id) {
+        rememberSaved(project.name, project.version, project.files);
         localStorage.setItem(lastProjectIdKey(userId), project.id);
         setCurrentProjectId(project.id);
       }
@@ -331,6 +372,7 @@ export default function IDE() {
         if (nextFiles.length > 0) {
           setFiles(nextFiles);
           localStorage.setItem(projectFilesKey(userId), JSON.stringify(nextFiles));
+          rememberSaved(proj.name, proj.version, nextFiles);
           setCurrentProjectId(proj.id);
           setCurrentProjectName(proj.name || 'My Project');
         }
@@ -372,6 +414,7 @@ export default function IDE() {
           setFiles(nextFiles);
           localStorage.setItem(projectFilesKey(userId), JSON.stringify(nextFiles));
           localStorage.setItem(lastProjectIdKey(userId), project.id);
+          rememberSaved(project.name, project.version, nextFiles);
           setCurrentProjectId(project.id);
           setCurrentProjectName(project.name || 'My Project');
         }}
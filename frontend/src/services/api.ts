@@ -241,6 +241,7 @@ export interface ProjectInfo {
   name: string;
   description?: string | null;
   files: ProjectFile[];
+  version: number;
   created_at: string;
   updated_at: string;
 }
@@ -249,10 +250,36 @@ export interface ProjectSaveRequest {
   name: string;
   files: ProjectFile[];
   description?: string;
+  base_version?: number;
+}
+
+export interface ProjectFilesPatchRequest {
+  base_version?: number;
+  upsert?: ProjectFile[];
+  delete?: string[];
+}
+
+export interface ProjectWriteResult {
+  id: string;
+  version: number;
+  file_count: number;
+  total_bytes: number;
+  updated_at: string;
+}
+
+export interface ProjectSummary {
+  id: string;
+  name: string;
+  description?: string | null;
+  file_count: number;
+  total_bytes: number;
+  created_at: string;
+  updated_at: string;
 }
 
 export interface ProjectListResponse {
-  projects: ProjectInfo[];
+  projects: ProjectSummary[];
+  next_cursor?: string | null;
 }
 
 export interface ProjectUpdateRequest {
@@ -265,8 +292,10 @@ export const saveProject = async (request: ProjectSaveRequest): Promise<ProjectI
   return response.data;
 };
 
-export const listProjects = async (): Promise<ProjectListResponse> => {
-  const response = await api.get<ProjectListResponse>('/api/projects');
+export const listProjects = async (cursor?: string | null, limit = 50): Promise<ProjectListResponse> => {
+  const response = await api.get<ProjectListResponse>('/api/projects', {
+    params: cursor ? { cursor, limit } : { limit },
+  });
   return response.data;
 };
 
@@ -285,8 +314,159 @@ export const replaceProject = async (projectId: string, request: ProjectSaveRequ
   return response.data;
 };
 
+// Writes only the listed files. Fails with 409 if the project moved past base_version.
+export const patchProjectFiles = async (
+  projectId: string,
+  request: ProjectFilesPatchRequest
+): Promise<ProjectWriteResult> => {
+  const response = await api.patch<ProjectWriteResult>(`/api/projects/${projectId}/files`, request);
+  return response.data;
+};
+
+export interface ProjectSearchHit {
+  project_id: string;
+  project_name?: string | null;
+  path: string;
+  line: number;
+  column: number;
+  snippet: string;
+}
+
+export interface ProjectSearchResponse {
+  query: string;
+  results: ProjectSearchHit[];
+  files_searched: number;
+  truncated: boolean;
+}
+
+// Searches every project of the user on the server (q: at least 3 characters).
+// `regex` narrows the lines found for `q`; it does not replace it.
+export const searchProjects = async (
+  q: string,
+  options: { regex?: string; caseSensitive?: boolean; projectId?: string; limit?: number } = {}
+): Promise<ProjectSearchResponse> => {
+  const response = await api.get<ProjectSearchResponse>('/api/projects/search', {
+    params: {
+      q,
+      regex: options.regex || undefined,
+      case_sensitive: options.caseSensitive || undefined,
+      project_id: options.projectId,
+      limit: options.limit,
+    },
+  });
+  return response.data;
+};
+
+export interface ProjectManifest {
+  id: string;
+  version: number;
+  files: { path: string; hash: string; size: number }[];
+}
+
+// Both endpoints send ETags with Cache-Control: no-cache, so the browser's HTTP
+// cache revalidates repeat requests (304, no body) on its own.
+export const getProjectManifest = async (projectId: string): Promise<ProjectManifest> => {
+  const response = await api.get<ProjectManifest>(`/api/projects/${projectId}/manifest`);
+  return response.data;
+};
+
+export const getProjectFile = async (projectId: string, path: string): Promise<string> => {
+  const encoded = path.split('/').map(encodeURIComponent).join('/');
+  const response = await api.get<string>(`/api/projects/${projectId}/files/${encoded}`, {
+    responseType: 'text',
+    transformResponse: (data) => data,
+  });
+  return response.data;
+};
+
+// All of the user's projects as a download (NDJSON re-importable with importProjects).
+export const exportProjects = async (format: 'ndjson' | 'zip' = 'ndjson'): Promise<Blob> => {
+  const response = await api.get<Blob>('/api/projects/export', { params: { format }, responseType: 'blob' });
+  return response.data;
+};
+
+export const importProjects = async (file: Blob): Promise<{ imported: number }> => {
+  const response = await api.post<{ imported: number }>('/api/projects/import', file, {
+    headers: { 'Content-Type': 'application/x-ndjson' },
+  });
+  return response.data;
+};
+
 export const deleteProject = async (projectId: string): Promise<{ ok: boolean }> => {
   const response = await api.delete<{ ok: boolean }>(`/api/projects/${projectId}`);
   return response.data;
 };
 
+export interface ProjectVersionInfo {
+  version: number;
+  file_count: number;
+  total_bytes: number;
+  created_at: string;
+}
+
+export interface ProjectFileChange {
+  path: string;
+  status: 'added' | 'removed' | 'modified';
+  old_size?: number | null;
+  new_size?: number | null;
+  old_content?: string | null;
+  new_content?: string | null;
+}
+
+export interface ProjectVersionDiff {
+  from_version: number;
+  to_version: number;
+  changes: ProjectFileChange[];
+}
+
+export const listProjectVersions = async (projectId: string, limit = 50): Promise<ProjectVersionInfo[]> => {
+  const response = await api.get<{ versions: ProjectVersionInfo[] }>(`/api/projects/${projectId}/versions`, {
+    params: { limit },
+  });
+  return response.data.versions;
+};
+
+export const getProjectVersion = async (
+  projectId: string,
+  version: number
+): Promise<{ version: number; files: ProjectFile[] }> => {
+  const response = await api.get<{ version: number; files: ProjectFile[] }>(
+    `/api/projects/${projectId}/versions/${version}`
+  );
+  return response.data;
+};
+
+export const diffProjectVersions = async (
+  projectId: string,
+  from: number,
+  to: number,
+  content = false
+): Promise<ProjectVersionDiff> => {
+  const response = await api.get<ProjectVersionDiff>(`/api/projects/${projectId}/versions/diff`, {
+    params: { from, to, content },
+  });
+  return response.data;
+};
+
+// Restoring is itself recorded as a new version, so it can be undone the same way.
+export const restoreProjectVersion = async (
+  projectId: string,
+  version: number,
+  baseVersion?: number
+): Promise<ProjectWriteResult> => {
+  const response = await api.post<ProjectWriteResult>(`/api/projects/${projectId}/versions/${version}/restore`, {
+    base_version: baseVersion,
+  });
+  return response.data;
+};
+
+export const forkProjectVersion = async (
+  projectId: string,
+  version: number,
+  name?: string
+): Promise<ProjectWriteResult> => {
+  const response = await api.post<ProjectWriteResult>(`/api/projects/${projectId}/versions/${version}/fork`, {
+    name,
+  });
+  return response.data;
+};